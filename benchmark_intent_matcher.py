@@ -0,0 +1,118 @@
+# benchmark_intent_matcher.py - Accuracy and latency of the rule/template NL-to-SQL tier
+import sqlite3
+import statistics
+import time
+
+from intent_matcher import IntentMatcher, MATCH_CONFIDENCE
+
+DB_PATH = "data/sample.db"
+
+# (question, reference SQL) - None means the tier should defer to the LLM
+CORPUS = [
+    ("Show me all users", "SELECT * FROM users"),
+    ("list users", "SELECT * FROM users"),
+    ("list all orders", "SELECT * FROM orders"),
+    ("How many users are there?", "SELECT COUNT(*) FROM users"),
+    ("count orders", "SELECT COUNT(*) FROM orders"),
+    ("Show users from the USA", "SELECT * FROM users WHERE country = 'USA'"),
+    ("users in UK", "SELECT * FROM users WHERE country = 'UK'"),
+    ("how many users from Canada", "SELECT COUNT(*) FROM users WHERE country = 'Canada'"),
+    ("orders for Laptop", "SELECT * FROM orders WHERE product = 'Laptop'"),
+    ("orders with amount over 100", "SELECT * FROM orders WHERE amount > 100"),
+    ("orders under 50", "SELECT * FROM orders WHERE amount < 50"),
+    ("top 3 orders by amount", "SELECT * FROM orders ORDER BY amount DESC LIMIT 3"),
+    ("cheapest 2 orders", "SELECT * FROM orders ORDER BY amount ASC LIMIT 2"),
+    ("total amount of orders", "SELECT SUM(amount) FROM orders"),
+    ("average order amount", "SELECT AVG(amount) FROM orders"),
+    ("orders per country",
+     "SELECT u.country, COUNT(*) FROM orders o JOIN users u ON u.id = o.user_id GROUP BY u.country"),
+    ("total spend per user",
+     "SELECT o.user_id, u.name, SUM(o.amount) FROM orders o JOIN users u ON u.id = o.user_id GROUP BY o.user_id"),
+    ("revenue by month",
+     "SELECT strftime('%Y-%m', order_date), SUM(amount) FROM orders GROUP BY 1"),
+    ("users by country", "SELECT country, COUNT(*) FROM users GROUP BY country"),
+    ("orders from USA users",
+     "SELECT o.* FROM orders o JOIN users u ON u.id = o.user_id WHERE u.country = 'USA'"),
+    ("show orders with user names",
+     "SELECT o.*, u.name FROM orders o JOIN users u ON u.id = o.user_id"),
+    ("total revenue from UK users",
+     "SELECT SUM(o.amount) FROM orders o JOIN users u ON u.id = o.user_id WHERE u.country = 'UK'"),
+    ("orders by product", "SELECT product, COUNT(*) FROM orders GROUP BY product"),
+    ("top 2 users by total spend",
+     "SELECT u.name, SUM(o.amount) s FROM orders o JOIN users u ON u.id = o.user_id GROUP BY o.user_id ORDER BY s DESC LIMIT 2"),
+    ("Which users signed up most recently and never ordered anything?", None),
+    ("what is the churn risk of our customers", None),
+    ("list users from the US", None),
+    ("users from USA or UK", None),
+    ("laptop orders above 500 last month", None),
+]
+
+
+def result_set(conn, sql):
+    rows = conn.execute(sql).fetchall()
+    return [set(round(v, 2) if isinstance(v, float) else v for v in r) for r in rows]
+
+
+def same_results(conn, got_sql, want_sql):
+    """Compare by values (column names and extra columns are ignored)."""
+    want = result_set(conn, want_sql)
+    got = result_set(conn, got_sql)
+    if len(want) != len(got):
+        return False
+    if "ORDER BY" in want_sql.upper():
+        return all(w <= g for w, g in zip(want, got))
+    remaining = list(got)
+    for w in want:
+        found = next((g for g in remaining if w <= g), None)
+        if found is None:
+            return False
+        remaining.remove(found)
+    return True
+
+
+def run_benchmark(rounds=200):
+    conn = sqlite3.connect(DB_PATH)
+    start = time.perf_counter()
+    matcher = IntentMatcher.from_connection(conn)
+    compile_ms = (time.perf_counter() - start) * 1000
+
+    print("🧪 Intent matcher benchmark")
+    print("=" * 70)
+    print(f"Schema compiled in {compile_ms:.2f} ms")
+
+    correct = 0
+    latencies = []
+    for question, want_sql in CORPUS:
+        timings = []
+        for _ in range(rounds):
+            t0 = time.perf_counter()
+            match = matcher.match(question)
+            timings.append((time.perf_counter() - t0) * 1e6)
+        latencies.extend(timings)
+
+        confident = match is not None and match["confidence"] >= MATCH_CONFIDENCE
+        if want_sql is None:
+            ok = not confident
+        else:
+            try:
+                ok = confident and same_results(conn, match["sql"], want_sql)
+            except sqlite3.Error:
+                ok = False
+        correct += ok
+        label = f"{match['intent']} ({match['confidence']:.2f})" if match else "no match"
+        print(f"{'✅' if ok else '❌'} {question!r:55} {label:22} {statistics.median(timings):7.1f} µs")
+        if not ok and match:
+            print(f"     got: {match['sql']}")
+
+    latencies.sort()
+    print("=" * 70)
+    print(f"Accuracy: {correct}/{len(CORPUS)} ({100 * correct / len(CORPUS):.1f}%)")
+    print(f"Latency: p50 {latencies[len(latencies) // 2]:.1f} µs, "
+          f"p95 {latencies[int(len(latencies) * 0.95)]:.1f} µs, "
+          f"max {latencies[-1]:.1f} µs")
+    conn.close()
+    return correct / len(CORPUS)
+
+
+if __name__ == "__main__":
+    run_benchmark()
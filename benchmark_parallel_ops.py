@@ -0,0 +1,85 @@
+# benchmark_parallel_ops.py - In-process vs process-pool joins and group-bys
+import os
+import random
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import parallel_ops
+import spill_ops
+
+
+def make_data(orders=400_000, users=50_000, seed=42):
+    rng = random.Random(seed)
+    order_rows = [
+        {"id": rng.randint(1, users), "order_id": i, "product": rng.choice(["Laptop", "Mouse", "Monitor", "Keyboard"]),
+         "amount": round(rng.uniform(5, 1500), 2), "country": rng.choice(["USA", "UK", "Canada", "Australia"])}
+        for i in range(orders)
+    ]
+    user_rows = [{"id": i, "name": f"User {i}", "tier": rng.choice(["free", "pro"])} for i in range(1, users + 1)]
+    return order_rows, user_rows
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def run_benchmark(workers=None):
+    workers = workers or max(2, os.cpu_count() or 1)
+    orders, users = make_data()
+    print(f"🧪 Process-pool operators ({len(orders):,} orders, {len(users):,} users, {workers} workers)")
+    print("=" * 70)
+    budget = 1 << 40   # keep the in-process path in memory for a fair comparison
+
+    # Warm the pool so worker start-up is not counted
+    parallel_ops.group_aggregate(orders[:1000], "product", "amount", min_rows=0, workers=workers)
+
+    cases = [
+        ("group_by country,product sum(amount)",
+         lambda: spill_ops.group_aggregate(orders, ["country", "product"], "amount", "sum", budget),
+         lambda: parallel_ops.group_aggregate(orders, ["country", "product"], "amount", "sum", budget,
+                                              min_rows=0, workers=workers)),
+        ("group_by id avg(amount)",
+         lambda: spill_ops.group_aggregate(orders, "id", "amount", "avg", budget),
+         lambda: parallel_ops.group_aggregate(orders, "id", "amount", "avg", budget, min_rows=0, workers=workers)),
+        ("inner join users x orders on id",
+         lambda: spill_ops.join_datasets([users, orders], "id", "inner", budget),
+         lambda: parallel_ops.join_datasets([users, orders], "id", "inner", budget, min_rows=0, workers=workers)),
+        ("left join orders x users on id",
+         lambda: spill_ops.join_datasets([orders, users], "id", "left", budget),
+         lambda: parallel_ops.join_datasets([orders, users], "id", "left", budget, min_rows=0, workers=workers)),
+    ]
+    speedups = []
+    for label, serial, parallel in cases:
+        (expected, _), serial_ms = timed(serial)
+        (result, stats), parallel_ms = timed(parallel)
+        assert result == expected, f"{label}: parallel result differs"
+        speedups.append(serial_ms / parallel_ms)
+        # share + merge is the parent's serial work, the floor under the pool's time
+        print(f"{label:<40} in-process {serial_ms:8.1f} ms | pool {parallel_ms:8.1f} ms "
+              f"({speedups[-1]:4.2f}x, parent {stats['share_ms'] + stats['merge_ms']:.1f} ms, "
+              f"{stats['chunks']} chunks, {stats['shared_bytes'] / 1e6:.1f} MB shared)")
+    print("✅ Parallel results identical to the in-process operators")
+    if min(speedups) > 1.2:
+        print("✅ Pool faster on every case here: set PARALLEL_MIN_ROWS to enable it in the server")
+    else:
+        print(f"⚠️ Pool not faster on every case here (worst {min(speedups):.2f}x): leave PARALLEL_MIN_ROWS unset")
+
+    # A dead worker (e.g. OOM-killed) breaks the pool: that call runs in-process, the next gets a new pool
+    sample = orders[:5000]
+    expected, _ = spill_ops.group_aggregate(sample, "product", "amount")
+    try:
+        parallel_ops._executor(workers).submit(os._exit, 1).result()
+    except BrokenProcessPool:
+        pass
+    result, stats = parallel_ops.group_aggregate(sample, "product", "amount", min_rows=0, workers=workers)
+    assert result == expected and "pool_error" in stats, stats
+    result, stats = parallel_ops.group_aggregate(sample, "product", "amount", min_rows=0, workers=workers)
+    assert result == expected and stats["strategy"] == "process_pool_aggregate", stats
+    parallel_ops.shutdown()
+    print("✅ Recovered from a dead worker process")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,110 @@
+# benchmark_search.py - FTS5 search vs LIKE scans over a large table
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+import search_index
+
+WORDS = ["laptop", "mouse", "monitor", "keyboard", "cable", "dock", "charger", "stand", "webcam", "headset",
+         "wireless", "mechanical", "ultrawide", "portable", "ergonomic", "gaming", "office", "compact"]
+SYLLABLES = ["ka", "lo", "mi", "ren", "tor", "vex", "qua", "sil", "bra", "nu", "pel", "dax", "ori", "fen"]
+DOMAINS = ["example.com", "mail.org", "corp.net", "shop.io"]
+
+
+def build_db(path, rows=200_000, seed=3):
+    rng = random.Random(seed)
+    # Zipf-like vocabulary: a few very common words, a long tail of rare ones
+    vocabulary = WORDS + ["".join(rng.choice(SYLLABLES) for _ in range(3)) for _ in range(5000)]
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE products (id INTEGER PRIMARY KEY, name TEXT, description TEXT, email TEXT, price REAL)")
+    conn.executemany(
+        "INSERT INTO products (name, description, email, price) VALUES (?, ?, ?, ?)",
+        ((" ".join(rng.sample(WORDS, 2)).title() + f" {i}",
+          " ".join(rng.choices(vocabulary, weights, k=12)),
+          f"seller{rng.randint(1, rows // 10)}@{rng.choice(DOMAINS)}",
+          round(rng.uniform(5, 2000), 2)) for i in range(rows))
+    )
+    conn.commit()
+    return conn, vocabulary
+
+
+def timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return result, statistics.median(times)
+
+
+def run_benchmark(rows=200_000, repeat=20):
+    with tempfile.TemporaryDirectory() as tmp:
+        conn, vocabulary = build_db(os.path.join(tmp, "search.db"), rows)
+        rare = vocabulary[-1]
+        print(f"🧪 Full-text search ({rows:,} products)")
+        print("=" * 70)
+        start = time.perf_counter()
+        search_index.create_index(conn, "products", "products", ["name", "description"])
+        search_index.create_index(conn, "sellers", "products", ["email"], mode="substring")
+        print(f"Index build: {time.perf_counter() - start:.1f} s (keyword + trigram)")
+
+        cases = [
+            (f"rare keyword '{rare}'", "products", rare,
+             f"SELECT * FROM products WHERE name LIKE '%{rare}%' OR description LIKE '%{rare}%' LIMIT 21"),
+            ("keyword + id 'webcam 123456'", "products", "webcam 123456",
+             "SELECT * FROM products WHERE (name LIKE '%webcam%' OR description LIKE '%webcam%') "
+             "AND (name LIKE '%123456%' OR description LIKE '%123456%') LIMIT 21"),
+            ("common 'ultrawide monitor'", "products", "ultrawide monitor",
+             "SELECT * FROM products WHERE (name LIKE '%ultrawide%' OR description LIKE '%ultrawide%') "
+             "AND (name LIKE '%monitor%' OR description LIKE '%monitor%') LIMIT 21"),
+            ("substring 'r1234@'", "sellers", "r1234@",
+             "SELECT * FROM products WHERE email LIKE '%r1234@%' LIMIT 21"),
+            ("substring '1234@corp'", "sellers", "1234@corp",
+             "SELECT * FROM products WHERE email LIKE '%1234@corp%' LIMIT 21"),
+        ]
+        for label, index, query, like_sql in cases:
+            page, search_ms = timed(lambda: search_index.search(conn, index, query, limit=20, refresh=False), repeat)
+            _, like_ms = timed(lambda: conn.execute(like_sql).fetchall(), 3)
+            assert page["row_count"] > 0, label
+            # Unranked LIKE returns the first matching rows; both must find the same set when it fits one page
+            if not page["has_more"] and index == "sellers":
+                assert len(conn.execute(like_sql).fetchall()) == page["row_count"], label
+            print(f"{label:<32} search {search_ms:7.3f} ms | LIKE {like_ms:8.2f} ms | "
+                  f"{page['row_count']} rows, ranking: {page['ranking']}")
+
+        # Triggers keep the index in sync with writes to the table
+        with conn:
+            conn.execute("INSERT INTO products (name, description, email, price) "
+                         "VALUES ('Quantum Toaster', 'kitchen appliance', 'chef@kitchen.example', 49.0)")
+            conn.execute("UPDATE products SET name = 'Quantum Blender' WHERE name = 'Quantum Toaster'")
+        assert search_index.search(conn, "products", "quantum blender")["row_count"] == 1
+        assert search_index.search(conn, "products", "quantum toaster")["row_count"] == 0
+        assert search_index.search(conn, "sellers", "@kitchen.ex")["row_count"] == 1
+        print("✅ Indexed search results stay in sync with table writes")
+
+        # File headers need not be identifiers, and a failed rebuild keeps the previous index
+        path = os.path.join(tmp, "catalog.csv")
+        with open(path, "w") as f:
+            f.write("sku,product name\n1,Quantum Kettle\n2,Plain Mug\n")
+        search_index.create_index(conn, "catalog", path)
+        assert search_index.search(conn, "catalog", "kettle", columns=["product name"])["row_count"] == 1
+        with open(path, "w") as f:
+            f.write("sku,price\n1,2\n")   # no longer has the indexed column
+        try:
+            search_index.refresh_index(conn, "catalog")
+            raise AssertionError("rebuild without the indexed column succeeded")
+        except search_index.SearchError:
+            pass
+        os.remove(path)
+        assert search_index.search(conn, "catalog", "kettle")["row_count"] == 1
+        assert [i["rows"] for i in search_index.list_indexes(conn) if i["name"] == "catalog"] == [2]
+        conn.close()
+    print("✅ Failed rebuilds roll back; a deleted file keeps serving its last copy")
+
+
+if __name__ == "__main__":
+    run_benchmark()
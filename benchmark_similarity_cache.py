@@ -0,0 +1,59 @@
+# benchmark_similarity_cache.py - Lookup latency of the paraphrase index at 100k questions
+import random
+import time
+
+from similarity_cache import SimilarityIndex
+
+VERBS = ["show", "list", "display", "give me", "find", "get"]
+SUBJECTS = ["users", "orders", "customers", "products", "invoices", "shipments", "payments", "reviews"]
+FIELDS = ["country", "city", "status", "product", "category", "region", "segment", "channel"]
+METRICS = ["amount", "price", "total", "quantity", "discount", "rating"]
+
+
+def synthetic_question(rng, i):
+    shape = rng.randrange(4)
+    subject = rng.choice(SUBJECTS)
+    if shape == 0:
+        return f"{rng.choice(VERBS)} {subject} where {rng.choice(FIELDS)} is value{i}"
+    if shape == 1:
+        return f"{subject} with {rng.choice(METRICS)} over {rng.randrange(10_000)} in zone{i}"
+    if shape == 2:
+        return f"how many {subject} per {rng.choice(FIELDS)} for tenant{i}"
+    return f"top {rng.randrange(1, 50)} {subject} by {rng.choice(METRICS)} for account{i}"
+
+
+def run_benchmark(size=100_000, lookups=2_000):
+    rng = random.Random(42)
+    index = SimilarityIndex(max_entries=size)
+
+    print(f"🧪 Similarity index benchmark ({size:,} stored questions)")
+    print("=" * 70)
+    questions = [synthetic_question(rng, i) for i in range(size)]
+    start = time.perf_counter()
+    for i, question in enumerate(questions):
+        index.add(question, f"SELECT {i}", schema_version=1)
+    build_s = time.perf_counter() - start
+    print(f"Build: {build_s:.2f} s ({size / build_s:,.0f} questions/sec)")
+
+    def measure(label, probes):
+        timings = []
+        hits = 0
+        for probe in probes:
+            t0 = time.perf_counter()
+            hits += index.lookup(probe, schema_version=1) is not None
+            timings.append((time.perf_counter() - t0) * 1000)
+        timings.sort()
+        print(f"{label:28} hit rate {hits / len(probes):6.1%}  "
+              f"p50 {timings[len(timings) // 2]:.3f} ms  p95 {timings[int(len(timings) * 0.95)]:.3f} ms")
+
+    sample = rng.sample(questions, lookups)
+    measure("exact repeats", sample)
+    measure("filler-word paraphrases", [q.replace("show", "list").replace("display", "give me") + " please" for q in sample])
+    measure("reordered wording", [" ".join(reversed(q.split())) for q in sample])
+    measure("unseen questions", [synthetic_question(rng, size + i) for i in range(lookups)])
+    print("=" * 70)
+    print(index.stats())
+
+
+if __name__ == "__main__":
+    run_benchmark()
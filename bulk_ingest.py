@@ -0,0 +1,298 @@
+# bulk_ingest.py - Batched, resumable loads of CSV/NDJSON/JSON rows into SQLite
+import csv
+import hashlib
+import itertools
+import json
+import os
+import re
+import time
+
+CHECKPOINT_TABLE = "_ingest_checkpoints"
+BATCH_SIZE = 10_000
+IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+CONFLICT_MODES = {"abort": "INSERT", "ignore": "INSERT OR IGNORE", "replace": "INSERT OR REPLACE"}
+
+# Applied for the duration of a load and restored afterwards. Batches commit
+# together with their checkpoint, so a crash loses at most the open batch.
+LOAD_PRAGMAS = {
+    "synchronous": "OFF",
+    "temp_store": "MEMORY",
+    "cache_size": -256 * 1024   # KiB -> 256 MB page cache
+}
+
+
+class IngestError(ValueError):
+    """Raised for an invalid load request (bad table, source or format)."""
+
+
+def _ident(name):
+    if not isinstance(name, str) or not IDENTIFIER.match(name):
+        raise IngestError(f"Invalid identifier: {name!r}")
+    return name
+
+
+def ensure_checkpoints(conn):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {CHECKPOINT_TABLE} (
+            load_id TEXT PRIMARY KEY,
+            table_name TEXT NOT NULL,
+            source TEXT,
+            rows_done INTEGER NOT NULL DEFAULT 0,
+            rows_inserted INTEGER NOT NULL DEFAULT 0,
+            status TEXT NOT NULL,
+            deferred_indexes TEXT,
+            started_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+# ========== SOURCES ==========
+
+def _csv_value(value):
+    return None if value == "" else value
+
+
+def read_csv(path):
+    """Yield rows from a CSV file with a header line (empty fields become NULL)."""
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            yield {k: _csv_value(v) for k, v in row.items()}
+
+
+def read_ndjson(path):
+    """Yield one object per non-blank line."""
+    with open(path) as f:
+        for line_no, line in enumerate(f, 1):
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise IngestError(f"{path}:{line_no}: invalid JSON ({e.msg})")
+
+
+def read_json(path):
+    """Yield the objects of a JSON array (or of the first list value of an object)."""
+    with open(path) as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = next((v for v in data.values() if isinstance(v, list)), [data])
+    if not isinstance(data, list):
+        raise IngestError(f"{path}: expected a JSON array of objects")
+    yield from data
+
+
+READERS = {"csv": read_csv, "ndjson": read_ndjson, "jsonl": read_ndjson, "json": read_json}
+
+
+def open_source(source=None, rows=None, format=None):
+    """Return (row iterator, description, load key) for a file path or inline rows."""
+    if rows is not None:
+        if source:
+            raise IngestError("Pass either a source file or inline rows, not both")
+        key = hashlib.sha1(json.dumps(rows, sort_keys=True, default=str).encode()).hexdigest()
+        return iter(rows), f"inline ({len(rows)} rows)", key
+    if not source:
+        raise IngestError("A source file or inline rows are required")
+    if not os.path.isfile(source):
+        raise IngestError(f"Source file not found: {source}")
+    format = (format or os.path.splitext(source)[1].lstrip(".")).lower()
+    if format not in READERS:
+        raise IngestError(f"Unsupported format: {format} (use csv, ndjson or json)")
+    stat = os.stat(source)
+    key = f"{os.path.abspath(source)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return READERS[format](source), source, hashlib.sha1(key.encode()).hexdigest()
+
+# ========== LOADING ==========
+
+def _table_columns(conn, table):
+    return [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+
+
+def _affinity(value):
+    if isinstance(value, bool) or isinstance(value, int):
+        return "INTEGER"
+    if isinstance(value, float):
+        return "REAL"
+    if isinstance(value, str):
+        for cast, affinity in ((int, "INTEGER"), (float, "REAL")):
+            try:
+                cast(value)
+                return affinity
+            except ValueError:
+                pass
+    return "TEXT"
+
+
+def _deferrable_indexes(conn, table):
+    """Explicit non-unique indexes; unique ones stay so conflicts are still detected."""
+    return [
+        (name, sql) for name, sql in conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+            (table,)
+        )
+        if not re.match(r"\s*CREATE\s+UNIQUE\b", sql, re.I)
+    ]
+
+
+def _rebuild_indexes(conn, indexes):
+    for _, sql in indexes:
+        conn.execute(re.sub(r"^\s*CREATE\s+INDEX\s+(?!IF\b)", "CREATE INDEX IF NOT EXISTS ", sql, flags=re.I))
+
+
+def _set_pragmas(conn, values):
+    previous = {}
+    for pragma, value in values.items():
+        previous[pragma] = conn.execute(f"PRAGMA {pragma}").fetchone()[0]
+        conn.execute(f"PRAGMA {pragma} = {value}")
+    return previous
+
+
+def get_checkpoint(conn, load_id):
+    ensure_checkpoints(conn)
+    row = conn.execute(
+        f"SELECT load_id, table_name, source, rows_done, rows_inserted, status, deferred_indexes, "
+        f"started_at, updated_at FROM {CHECKPOINT_TABLE} WHERE load_id = ?", (load_id,)
+    ).fetchone()
+    if row is None:
+        return None
+    keys = ("load_id", "table", "source", "rows_done", "rows_inserted", "status",
+            "deferred_indexes", "started_at", "updated_at")
+    checkpoint = dict(zip(keys, row))
+    checkpoint["deferred_indexes"] = json.loads(checkpoint["deferred_indexes"] or "[]")
+    return checkpoint
+
+
+def list_checkpoints(conn):
+    ensure_checkpoints(conn)
+    ids = [row[0] for row in conn.execute(f"SELECT load_id FROM {CHECKPOINT_TABLE} ORDER BY updated_at DESC")]
+    return [get_checkpoint(conn, load_id) for load_id in ids]
+
+
+def ingest(conn, table, source=None, rows=None, format=None, columns=None,
+           batch_size=BATCH_SIZE, on_conflict="abort", create_table=False,
+           defer_indexes=True, load_id=None, resume=True):
+    """Load rows into ``table`` in batched transactions and report throughput.
+
+    Progress is checkpointed with every batch under ``load_id`` (derived from
+    the file path, size and mtime, or the inline rows, when not given), so
+    re-running an interrupted load skips the rows already committed. Non-unique
+    indexes on the table are dropped for the load and rebuilt at the end.
+    """
+    table = _ident(table)
+    if on_conflict not in CONFLICT_MODES:
+        raise IngestError(f"on_conflict must be one of {', '.join(CONFLICT_MODES)}")
+    batch_size = max(1, int(batch_size))
+    records, description, source_key = open_source(source, rows, format)
+    load_id = load_id or hashlib.sha1(f"{table}|{source_key}".encode()).hexdigest()[:16]
+
+    if conn.in_transaction:
+        conn.commit()
+    checkpoint = get_checkpoint(conn, load_id)
+    if checkpoint and resume and checkpoint["status"] == "done":
+        return {**checkpoint, "status": "already_loaded", "rows_read": 0}
+    skip = checkpoint["rows_done"] if checkpoint and resume else 0
+    rows_inserted = checkpoint["rows_inserted"] if checkpoint and resume else 0
+    deferred = [tuple(i) for i in checkpoint["deferred_indexes"]] if checkpoint and resume else []
+
+    # Column list comes from the explicit columns, the first row's keys, or the table
+    first = next(records, None)
+    if first is None:
+        raise IngestError(f"No rows in {description}")
+    records = itertools.chain([first], records)
+    if isinstance(first, dict):
+        columns = list(columns or first.keys())
+    elif not columns:
+        raise IngestError("columns are required when rows are arrays")
+    table_columns = _table_columns(conn, table)
+    if not table_columns:
+        if not create_table:
+            raise IngestError(f"Table {table} does not exist (pass create_table to create it)")
+        values = first if isinstance(first, dict) else dict(zip(columns, first))
+        definitions = ", ".join(f'"{_ident(c)}" {_affinity(values.get(c))}' for c in columns)
+        conn.execute(f'CREATE TABLE "{table}" ({definitions})')
+        table_columns = list(columns)
+    target = [c for c in columns if c in table_columns]
+    ignored = [c for c in columns if c not in table_columns]
+    if not target:
+        raise IngestError(f"None of the columns {columns} exist in {table}")
+    positions = [columns.index(c) for c in target]
+
+    def to_tuple(record):
+        if isinstance(record, dict):
+            return tuple(record.get(c) for c in target)
+        return tuple(record[p] if p < len(record) else None for p in positions)
+
+    quoted = ", ".join(f'"{c}"' for c in target)
+    insert_sql = (f'{CONFLICT_MODES[on_conflict]} INTO "{table}" ({quoted}) '
+                  f'VALUES ({", ".join("?" for _ in target)})')
+    save_sql = (f"INSERT INTO {CHECKPOINT_TABLE} (load_id, table_name, source, rows_done, rows_inserted, "
+                f"status, deferred_indexes) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                f"ON CONFLICT(load_id) DO UPDATE SET rows_done = excluded.rows_done, "
+                f"rows_inserted = excluded.rows_inserted, status = excluded.status, "
+                f"deferred_indexes = excluded.deferred_indexes, updated_at = CURRENT_TIMESTAMP")
+
+    def save(rows_done, status):
+        conn.execute(save_sql, (load_id, table, description, rows_done, rows_inserted,
+                                status, json.dumps(deferred)))
+
+    start = time.monotonic()
+    previous_pragmas = _set_pragmas(conn, LOAD_PRAGMAS)
+    rows_done = skip
+    batches = 0
+    index_ms = 0.0
+    try:
+        if defer_indexes:
+            deferred.extend(i for i in _deferrable_indexes(conn, table) if i not in deferred)
+        # The index SQL is saved before the drop so a resumed load can rebuild it
+        save(rows_done, "running")
+        for name, _ in deferred:
+            conn.execute(f'DROP INDEX IF EXISTS "{name}"')
+        conn.commit()
+
+        batch_iter = itertools.islice(records, skip, None)
+        while True:
+            batch = [to_tuple(r) for r in itertools.islice(batch_iter, batch_size)]
+            if not batch:
+                break
+            cursor = conn.executemany(insert_sql, batch)
+            rows_inserted += max(cursor.rowcount, 0)
+            rows_done += len(batch)
+            save(rows_done, "running")
+            conn.commit()
+            batches += 1
+
+        index_start = time.monotonic()
+        _rebuild_indexes(conn, deferred)
+        index_ms = (time.monotonic() - index_start) * 1000
+        save(rows_done, "done")
+        conn.commit()
+    except BaseException:
+        if conn.in_transaction:
+            conn.rollback()
+        # Leave the table queryable; the checkpoint still lists the indexes for a resume
+        _rebuild_indexes(conn, deferred)
+        conn.commit()
+        raise
+    finally:
+        _set_pragmas(conn, previous_pragmas)
+
+    elapsed = time.monotonic() - start
+    loaded = rows_done - skip
+    return {
+        "load_id": load_id,
+        "table": table,
+        "source": description,
+        "status": "done",
+        "columns": target,
+        "ignored_columns": ignored,
+        "resumed_from_row": skip,
+        "rows_read": loaded,
+        "rows_inserted": rows_inserted,
+        "rows_done": rows_done,
+        "batches": batches,
+        "batch_size": batch_size,
+        "deferred_indexes": [name for name, _ in deferred],
+        "index_rebuild_ms": round(index_ms, 2),
+        "elapsed_ms": round(elapsed * 1000, 2),
+        "rows_per_sec": round(loaded / elapsed) if elapsed > 0 else None
+    }
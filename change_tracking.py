@@ -0,0 +1,254 @@
+# change_tracking.py - "Changes since" delta queries resumed from watermark tokens
+import base64
+import json
+import re
+
+CHANGE_LOG_PREFIX = "_changes_"
+DEFAULT_PAGE = 1000
+TOKEN_VERSION = 1
+IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+MODES = ("rowid", "column", "changelog")
+
+
+class ChangeTrackingError(ValueError):
+    """Raised for a bad table, column, mode or watermark."""
+
+
+def _ident(name):
+    if not isinstance(name, str) or not IDENTIFIER.match(name):
+        raise ChangeTrackingError(f"Invalid identifier: {name!r}")
+    return name
+
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+
+
+def _require_rowid(conn, table):
+    try:
+        conn.execute(f'SELECT rowid FROM "{table}" LIMIT 0')
+    except Exception:
+        raise ChangeTrackingError(f"{table} is a WITHOUT ROWID table; use mode 'column'")
+
+# ========== WATERMARKS ==========
+
+def encode_watermark(table, mode, position, column=None):
+    """Opaque, URL-safe token for the last row a client has seen."""
+    payload = {"v": TOKEN_VERSION, "t": table, "m": mode, "p": position}
+    if column:
+        payload["c"] = column
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_watermark(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(raw)
+        if payload.get("v") != TOKEN_VERSION or payload.get("m") not in MODES:
+            raise ValueError
+        return payload
+    except (ValueError, TypeError):
+        raise ChangeTrackingError("Invalid watermark token")
+
+# ========== CHANGE LOG ==========
+
+def change_log_table(table):
+    return f"{CHANGE_LOG_PREFIX}{table}"
+
+
+def has_change_log(conn, table):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (change_log_table(table),)
+    ).fetchone() is not None
+
+
+def enable_change_log(conn, table, backfill=True):
+    """Record inserted/updated/deleted rowids of ``table`` in a trigger-maintained log.
+
+    The log keeps one entry per row; every change moves it to a new, higher
+    ``seq``, so a delta is a range scan on the log's primary key.
+    """
+    table = _ident(table)
+    if not _columns(conn, table):
+        raise ChangeTrackingError(f"Unknown table: {table}")
+    _require_rowid(conn, table)
+    log = change_log_table(table)
+    upsert = f"INSERT OR REPLACE INTO {log} (row_id, op) VALUES"
+    with conn:
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {log} (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                row_id INTEGER NOT NULL UNIQUE,
+                op TEXT NOT NULL
+            )
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {log}__ins AFTER INSERT ON "{table}" BEGIN
+                {upsert} (NEW.rowid, 'upsert');
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {log}__upd AFTER UPDATE ON "{table}" BEGIN
+                INSERT OR REPLACE INTO {log} (row_id, op)
+                    SELECT OLD.rowid, 'delete' WHERE OLD.rowid <> NEW.rowid;
+                {upsert} (NEW.rowid, 'upsert');
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {log}__del AFTER DELETE ON "{table}" BEGIN
+                {upsert} (OLD.rowid, 'delete');
+            END
+        """)
+        if backfill:
+            conn.execute(
+                f'INSERT OR IGNORE INTO {log} (row_id, op) SELECT rowid, \'upsert\' FROM "{table}" ORDER BY rowid'
+            )
+    return describe_change_log(conn, table)
+
+
+def disable_change_log(conn, table):
+    table = _ident(table)
+    log = change_log_table(table)
+    with conn:
+        for suffix in ("ins", "upd", "del"):
+            conn.execute(f"DROP TRIGGER IF EXISTS {log}__{suffix}")
+        conn.execute(f"DROP TABLE IF EXISTS {log}")
+
+
+def describe_change_log(conn, table):
+    log = change_log_table(table)
+    entries, last_seq = conn.execute(f"SELECT COUNT(*), MAX(seq) FROM {log}").fetchone()
+    return {
+        "table": table,
+        "change_log": log,
+        "entries": entries,
+        "watermark": encode_watermark(table, "changelog", [last_seq or 0])
+    }
+
+# ========== DELTA QUERIES ==========
+
+def _integer_primary_key(conn, table):
+    """Name of the INTEGER PRIMARY KEY column (an alias for rowid), if any."""
+    pk = [row for row in conn.execute(f'PRAGMA table_info("{table}")') if row[5]]
+    if len(pk) == 1 and pk[0][2].upper() == "INTEGER":
+        return pk[0][1]
+    return None
+
+
+def _leading_index(conn, table, column):
+    for index in conn.execute(f'PRAGMA index_list("{table}")'):
+        first = conn.execute(f'PRAGMA index_info("{index[1]}")').fetchone()
+        if first and first[2] == column:
+            return index[1]
+    return None
+
+
+def _page(conn, sql, params, limit):
+    cursor = conn.execute(sql, (*params, limit + 1))
+    names = [d[0] for d in cursor.description]
+    rows = [dict(zip(names, row)) for row in cursor.fetchall()]
+    return rows[:limit], len(rows) > limit
+
+
+def _plan(conn, sql, params):
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", (*params, 1))]
+
+
+def changes_since(conn, table=None, watermark=None, mode=None, column=None,
+                  limit=DEFAULT_PAGE, create_index=True):
+    """Return rows of ``table`` changed after ``watermark`` plus the next watermark.
+
+    Modes: ``rowid`` (new rows by rowid), ``column`` (new rows by a monotonic
+    column, ties broken by rowid) and ``changelog`` (inserts, updates and
+    deletes recorded by ``enable_change_log``). Every mode reads a B-tree
+    range from the watermark, so the cost follows the delta, not the table.
+    """
+    position = None
+    if watermark:
+        payload = decode_watermark(watermark)
+        if table and payload["t"] != table:
+            raise ChangeTrackingError(f"Watermark belongs to table {payload['t']}, not {table}")
+        table, mode, column, position = payload["t"], payload["m"], payload.get("c"), payload["p"]
+    table = _ident(table)
+    columns = _columns(conn, table)
+    if not columns:
+        raise ChangeTrackingError(f"Unknown table: {table}")
+    if mode is None:
+        mode = "changelog" if has_change_log(conn, table) else "rowid"
+    if mode not in MODES:
+        raise ChangeTrackingError(f"mode must be one of {', '.join(MODES)}")
+    limit = max(1, int(limit))
+    quoted = ", ".join(f'"{c}"' for c in columns)
+    index_created = None
+    deleted = []
+
+    if mode == "column" and column and column == _integer_primary_key(conn, table):
+        mode, column = "rowid", None   # the INTEGER PRIMARY KEY is the rowid
+    if mode == "rowid":
+        _require_rowid(conn, table)
+        after = position[0] if position else None
+        sql = (f'SELECT rowid AS __rowid, {quoted} FROM "{table}" '
+               f'{"WHERE rowid > ? " if after is not None else ""}ORDER BY rowid LIMIT ?')
+        params = (after,) if after is not None else ()
+        rows, has_more = _page(conn, sql, params, limit)
+        next_position = [rows[-1]["__rowid"]] if rows else position or [0]
+    elif mode == "column":
+        if not column:
+            raise ChangeTrackingError("mode 'column' needs a column (e.g. id or order_date)")
+        column = _ident(column)
+        if column not in columns:
+            raise ChangeTrackingError(f"Unknown column {column} in {table}")
+        _require_rowid(conn, table)
+        if not _leading_index(conn, table, column):
+            if not create_index:
+                raise ChangeTrackingError(f"No index on {table}.{column}; delta queries would scan the table")
+            index_created = f"idx_{table}_{column}"
+            conn.execute(f'CREATE INDEX IF NOT EXISTS "{index_created}" ON "{table}" ("{column}")')
+            conn.commit()
+        if position:
+            where, params = f'("{column}", rowid) > (?, ?)', tuple(position)
+        else:
+            where, params = f'"{column}" IS NOT NULL', ()
+        sql = (f'SELECT rowid AS __rowid, {quoted} FROM "{table}" WHERE {where} '
+               f'ORDER BY "{column}", rowid LIMIT ?')
+        rows, has_more = _page(conn, sql, params, limit)
+        next_position = [rows[-1][column], rows[-1]["__rowid"]] if rows else position
+    else:
+        if not has_change_log(conn, table):
+            raise ChangeTrackingError(f"No change log on {table}; enable it first")
+        log = change_log_table(table)
+        after = position[0] if position else 0
+        row_columns = ", ".join(f't."{c}"' for c in columns)
+        sql = (f'SELECT c.seq AS __seq, c.op AS __op, c.row_id AS __rowid, {row_columns} '
+               f'FROM {log} c LEFT JOIN "{table}" t ON t.rowid = c.row_id '
+               f'WHERE c.seq > ? ORDER BY c.seq LIMIT ?')
+        params = (after,)
+        page, has_more = _page(conn, sql, params, limit)
+        rows = []
+        for row in page:
+            if row["__op"] == "delete":
+                deleted.append(row["__rowid"])
+            else:
+                rows.append(row)
+        next_position = [page[-1]["__seq"]] if page else [after]
+
+    plan = _plan(conn, sql, params)
+    for row in rows:
+        for key in ("__seq", "__op", "__rowid"):
+            row.pop(key, None)
+    result = {
+        "table": table,
+        "mode": mode,
+        "rows": rows,
+        "row_count": len(rows),
+        "has_more": has_more,
+        "watermark": encode_watermark(table, mode, next_position, column) if next_position else watermark,
+        "plan": plan
+    }
+    if mode == "column":
+        result["column"] = column
+        result["index_created"] = index_created
+    if mode == "changelog":
+        result["deleted_rowids"] = deleted
+    return result
@@ -0,0 +1,264 @@
+# db_pool.py - Pooled SQLite connections with a prepared-statement cache
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+POOL_SIZE = 4
+STATEMENT_CACHE_SIZE = 128
+PROGRESS_STEPS = 1000   # SQLite VM instructions between deadline checks
+FETCH_BATCH = 500
+
+
+class QueryAborted(Exception):
+    """A statement was stopped before completing; ``details`` has progress stats."""
+
+    error_type = "aborted"
+
+    def __init__(self, message, details):
+        super().__init__(message)
+        self.details = {"error_type": self.error_type, **details}
+
+
+class QueryTimeout(QueryAborted):
+    error_type = "timeout"
+
+
+class ResultTooLarge(QueryAborted):
+    error_type = "result_too_large"
+
+# ========== STATEMENT CACHE ==========
+
+class StatementCache:
+    """Bounded LRU of SQL texts prepared on one connection.
+
+    sqlite3 keeps the compiled statements itself (``cached_statements``);
+    this mirrors its LRU keyed by SQL text so we can report hit rates.
+    """
+
+    def __init__(self, capacity=STATEMENT_CACHE_SIZE):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def touch(self, sql):
+        """Record a use of ``sql``; return True if it was already prepared."""
+        if sql in self.entries:
+            self.entries.move_to_end(sql)
+            self.hits += 1
+            return True
+        self.misses += 1
+        self.entries[sql] = True
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        return False
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+# ========== CONNECTION POOL ==========
+
+def normalize_params(params):
+    """Accept positional (list/tuple) or named (dict) parameters."""
+    if params is None:
+        return ()
+    if isinstance(params, dict):
+        return params
+    if isinstance(params, (list, tuple)):
+        return tuple(params)
+    raise ValueError("params must be a list (positional) or an object (named)")
+
+
+def _row_size(row):
+    """Rough in-memory size of a result row in bytes."""
+    return sys.getsizeof(row) + sum(sys.getsizeof(v) for v in row.values())
+
+
+class PooledConnection:
+    """A pooled sqlite3 connection plus its statement cache."""
+
+    def __init__(self, db_path, cache_size, timeout_ms=None, max_result_bytes=None):
+        self.conn = sqlite3.connect(
+            db_path,
+            check_same_thread=False,
+            cached_statements=cache_size
+        )
+        self.conn.row_factory = sqlite3.Row
+        self.statements = StatementCache(cache_size)
+        self.timeout_ms = timeout_ms
+        self.max_result_bytes = max_result_bytes
+        self.attached = {}
+        self.last_stats = {}
+
+    def execute(self, sql, params=None, timeout_ms=None, max_result_bytes=None):
+        """Run one statement and return (rows as dicts, statement cache hit).
+
+        The statement is interrupted through SQLite's progress handler once
+        ``timeout_ms`` elapses, and fetching stops once the rows exceed
+        ``max_result_bytes``; both fall back to the pool-wide defaults.
+        """
+        data = []
+        for batch in self.stream(sql, params, timeout_ms, max_result_bytes):
+            data.extend(batch)
+        return data, self.last_stats["cache_hit"]
+
+    def stream(self, sql, params=None, timeout_ms=None, max_result_bytes=None, batch_size=FETCH_BATCH,
+               retain=True):
+        """Yield result rows in batches of dicts under the same limits as ``execute``.
+
+        Pass ``retain=False`` when the caller folds each batch away (e.g. into
+        a sketch) instead of keeping the rows; the result size cap is then
+        not enforced. Progress for the statement is kept in ``last_stats``.
+        """
+        timeout_ms = timeout_ms or self.timeout_ms
+        max_result_bytes = max_result_bytes or self.max_result_bytes
+        start = time.monotonic()
+        deadline = start + timeout_ms / 1000 if timeout_ms else None
+        progress = {"vm_steps": 0, "rows_fetched": 0, "result_bytes": 0}
+        self.last_stats = {"cache_hit": self.statements.touch(sql), **progress}
+
+        def on_progress():
+            progress["vm_steps"] += PROGRESS_STEPS
+            return 1 if deadline is not None and time.monotonic() > deadline else 0
+
+        def stats():
+            return {
+                **progress,
+                "elapsed_ms": round((time.monotonic() - start) * 1000, 2),
+                "timeout_ms": timeout_ms,
+                "max_result_bytes": max_result_bytes
+            }
+
+        self.conn.set_progress_handler(on_progress, PROGRESS_STEPS)
+        cursor = None
+        try:
+            cursor = self.conn.execute(sql, normalize_params(params))
+            if cursor.description:
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    batch = [dict(row) for row in rows]
+                    progress["result_bytes"] += sum(_row_size(item) for item in batch)
+                    progress["rows_fetched"] += len(batch)
+                    if retain and max_result_bytes and progress["result_bytes"] > max_result_bytes:
+                        raise ResultTooLarge(
+                            f"Result exceeded {max_result_bytes} bytes after {progress['rows_fetched']} rows",
+                            stats()
+                        )
+                    yield batch
+            if self.conn.in_transaction:
+                self.conn.commit()
+        except sqlite3.OperationalError as e:
+            self.reset(cursor)
+            if "interrupted" in str(e):
+                if deadline is not None and time.monotonic() > deadline:
+                    raise QueryTimeout(f"Statement exceeded {timeout_ms} ms and was interrupted", stats()) from e
+                raise QueryAborted("Statement was interrupted", stats()) from e
+            raise
+        except BaseException:
+            # Includes GeneratorExit when the consumer stops early
+            self.reset(cursor)
+            raise
+        finally:
+            self.conn.set_progress_handler(None, 0)
+            self.last_stats.update(stats())
+
+    def attach(self, name, path):
+        """ATTACH another database file under ``name`` (once per connection)."""
+        if name not in self.attached:
+            self.conn.execute(f'ATTACH DATABASE ? AS "{name}"', (path,))
+            self.attached[name] = path
+
+    def reset(self, cursor=None):
+        """Return the connection to a clean state after an aborted statement."""
+        if cursor is not None:
+            cursor.close()
+        if self.conn.in_transaction:
+            self.conn.rollback()
+
+    def interrupt(self):
+        """Abort whatever this connection is running (safe from another thread)."""
+        self.conn.interrupt()
+
+    def close(self):
+        self.conn.close()
+
+
+class ConnectionPool:
+    """Fixed-size pool of SQLite connections for one database file."""
+
+    def __init__(self, db_path, size=POOL_SIZE, cache_size=STATEMENT_CACHE_SIZE,
+                 timeout_ms=None, max_result_bytes=None):
+        self.db_path = db_path
+        self.size = size
+        self.cache_size = cache_size
+        self.timeout_ms = timeout_ms
+        self.max_result_bytes = max_result_bytes
+        self._idle = queue.LifoQueue()
+        self._all = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection, creating one lazily up to ``size``."""
+        conn = None
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                if len(self._all) < self.size:
+                    conn = PooledConnection(
+                        self.db_path, self.cache_size, self.timeout_ms, self.max_result_bytes
+                    )
+                    self._all.append(conn)
+            if conn is None:
+                conn = self._idle.get()
+        try:
+            yield conn
+        except Exception:
+            if conn.conn.in_transaction:
+                conn.conn.rollback()
+            raise
+        finally:
+            self._idle.put(conn)
+
+    def execute(self, sql, params=None, timeout_ms=None, max_result_bytes=None):
+        with self.connection() as conn:
+            return conn.execute(sql, params, timeout_ms, max_result_bytes)
+
+    def stats(self):
+        """Aggregate statement-cache stats across pooled connections."""
+        hits = sum(c.statements.hits for c in self._all)
+        misses = sum(c.statements.misses for c in self._all)
+        lookups = hits + misses
+        return {
+            "connections": len(self._all),
+            "pool_size": self.size,
+            "statement_cache_capacity": self.cache_size,
+            "hits": hits,
+            "misses": misses,
+            "evictions": sum(c.statements.evictions for c in self._all),
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0
+        }
+
+    def close(self):
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+            self._all = []
+            self._idle = queue.LifoQueue()
@@ -0,0 +1,486 @@
+# federation.py - Named SQLite databases, ATTACH queries and parallel shard fan-out
+import heapq
+import itertools
+import json
+import os
+import queue
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from db_pool import ConnectionPool
+from sql_guard import split_statement, tokenize_spans
+
+MAX_ATTACHED = 10      # SQLite's default SQLITE_MAX_ATTACHED
+QUEUE_BATCHES = 4      # batches buffered per shard before its producer waits
+AGG_FUNCS = {"COUNT", "SUM", "TOTAL", "MIN", "MAX", "AVG"}
+CLAUSE_WORDS = {"FROM", "WHERE", "GROUP", "HAVING", "ORDER", "LIMIT", "OFFSET", "WINDOW",
+                "UNION", "EXCEPT", "INTERSECT"}
+
+
+class FederationError(ValueError):
+    """Raised for unknown databases or queries that cannot be fanned out."""
+
+# ========== REGISTRY ==========
+
+class DatabaseRegistry:
+    """Named SQLite databases, each with its own connection pool."""
+
+    def __init__(self, **pool_options):
+        self.pool_options = pool_options
+        self.databases = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, path, group=None, pool=None):
+        if not re.match(r"^[A-Za-z_]\w*$", name or ""):
+            raise FederationError(f"Invalid database name: {name!r}")
+        with self._lock:
+            if name in self.databases:
+                self.databases[name]["pool"].close()
+            self.databases[name] = {
+                "path": path,
+                "group": group,
+                "pool": pool or ConnectionPool(path, **self.pool_options)
+            }
+
+    def load_config(self, spec):
+        """Register databases from JSON (inline or a file path).
+
+        Format: {"name": "path.db"} or {"name": {"path": "path.db", "group": "shards"}}
+        """
+        if not spec:
+            return
+        if os.path.exists(spec):
+            with open(spec) as f:
+                config = json.load(f)
+        else:
+            config = json.loads(spec)
+        for name, entry in config.get("databases", config).items():
+            if isinstance(entry, str):
+                entry = {"path": entry}
+            self.register(name, entry["path"], entry.get("group"))
+
+    def get(self, name):
+        if name not in self.databases:
+            raise FederationError(f"Unknown database: {name} (known: {', '.join(self.databases)})")
+        return self.databases[name]
+
+    def pool(self, name):
+        return self.get(name)["pool"]
+
+    def resolve(self, names=None, group=None):
+        """Database names for a fan-out: explicit list, a shard group, or everything."""
+        if names:
+            if names == ["*"]:
+                return list(self.databases)
+            for name in names:
+                self.get(name)
+            return list(names)
+        if group:
+            members = [n for n, db in self.databases.items() if db["group"] == group]
+            if not members:
+                raise FederationError(f"No databases in group: {group}")
+            return members
+        return list(self.databases)
+
+    def describe(self):
+        return [
+            {"name": name, "path": db["path"], "group": db["group"], "pool": db["pool"].stats()}
+            for name, db in self.databases.items()
+        ]
+
+    def execute(self, database, sql, params=None, attach=(), timeout_ms=None):
+        """Run ``sql`` on ``database`` with other registered databases ATTACHed by name."""
+        if len(attach) > MAX_ATTACHED:
+            raise FederationError(f"At most {MAX_ATTACHED} databases can be attached")
+        with self.pool(database).connection() as conn:
+            for other in attach:
+                if other != database:
+                    conn.attach(other, self.get(other)["path"])
+            return conn.execute(sql, params, timeout_ms)
+
+    def close(self):
+        for db in self.databases.values():
+            db["pool"].close()
+
+# ========== QUERY SPLITTING ==========
+
+def _top_level(tokens):
+    """Yield (index, upper word) for tokens outside parentheses."""
+    depth = 0
+    for i, (kind, text, _, _) in enumerate(tokens):
+        if text == "(":
+            depth += 1
+        elif text == ")":
+            depth -= 1
+        elif depth == 0 and kind == "word":
+            yield i, text.upper()
+
+
+def _split_commas(tokens, start, end):
+    """Split tokens[start:end] on top-level commas into (start, end) ranges."""
+    parts = []
+    depth = 0
+    begin = start
+    for i in range(start, end):
+        text = tokens[i][1]
+        if text == "(":
+            depth += 1
+        elif text == ")":
+            depth -= 1
+        elif text == "," and depth == 0:
+            parts.append((begin, i))
+            begin = i + 1
+    parts.append((begin, end))
+    return parts
+
+
+def plan_fan_out(sql):
+    """Split a statement into the per-shard SQL and the merge steps for the parent."""
+    statement, _ = split_statement(sql)
+    tokens = tokenize_spans(statement)
+    top = list(_top_level(tokens))
+    words = [w for _, w in top]
+    compound = any(w in ("UNION", "EXCEPT", "INTERSECT") for w in words)
+
+    def text(start, end):
+        if start >= end:
+            return ""
+        return statement[tokens[start][2]:tokens[end - 1][3]]
+
+    def position(word, after=0):
+        for i, w in top:
+            if w == word and i >= after:
+                return i
+        return None
+
+    order_at = position("ORDER")
+    limit_at = position("LIMIT", order_at or 0)
+    body_end = min(p for p in (order_at, limit_at, len(tokens)) if p is not None)
+    plan = {
+        "body": text(0, body_end),
+        "order_by": [],
+        "order_sql": "",
+        "limit": None,
+        "offset": 0,
+        "aggregate": None,
+        "distinct": False
+    }
+
+    if order_at is not None:
+        order_end = limit_at if limit_at is not None else len(tokens)
+        plan["order_sql"] = text(order_at, order_end)
+        for start, end in _split_commas(tokens, order_at + 2, order_end):
+            term = [t[1] for t in tokens[start:end]]
+            direction = "ASC"
+            if term and term[-1].upper() in ("ASC", "DESC"):
+                direction = term.pop().upper()
+            if not term or any(t.upper() == "NULLS" for t in term) or len(term) not in (1, 3):
+                raise FederationError(f"Unsupported ORDER BY term for fan-out: {text(start, end)}")
+            if len(term) == 3 and term[1] != ".":
+                raise FederationError(f"Unsupported ORDER BY term for fan-out: {text(start, end)}")
+            plan["order_by"].append((term[-1].strip('"`[]'), direction == "DESC"))
+
+    if limit_at is not None:
+        limit_tokens = [t[1] for t in tokens[limit_at + 1:]]
+        try:
+            if "," in limit_tokens:
+                plan["offset"], plan["limit"] = int(limit_tokens[0]), int(limit_tokens[2])
+            else:
+                plan["limit"] = int(limit_tokens[0])
+                if len(limit_tokens) > 1 and limit_tokens[1].upper() == "OFFSET":
+                    plan["offset"] = int(limit_tokens[2])
+        except (IndexError, ValueError):
+            raise FederationError("LIMIT/OFFSET must be integer literals for fan-out")
+
+    if compound or not words or words[0] != "SELECT":
+        return plan
+
+    # Aggregate pushdown: each shard returns partial aggregates per group
+    select_start = 1
+    if tokens[1][1].upper() in ("DISTINCT", "ALL"):
+        plan["distinct"] = tokens[1][1].upper() == "DISTINCT"
+        select_start = 2
+    from_at = position("FROM") or body_end
+    items = []
+    has_agg = False
+    for start, end in _split_commas(tokens, select_start, from_at):
+        item = text(start, end)
+        m = re.match(
+            r"^(COUNT|SUM|TOTAL|MIN|MAX|AVG)\s*\((.*)\)\s*(?:(?:AS\s+)?(\"[^\"]+\"|[A-Za-z_]\w*))?$",
+            item, re.I | re.S
+        )
+        nested = any(
+            t[0] == "word" and t[1].upper() in AGG_FUNCS and i + 1 < end and tokens[i + 1][1] == "("
+            for i, t in enumerate(tokens[start:end], start)
+        )
+        if m and _balanced(m.group(2)):
+            if re.match(r"^\s*DISTINCT\b", m.group(2), re.I):
+                raise FederationError(f"{item} cannot be merged across shards")
+            items.append({"kind": "agg", "func": m.group(1).upper(), "arg": m.group(2).strip(),
+                          "name": (m.group(3) or item).strip('"')})
+            has_agg = True
+        elif nested:
+            raise FederationError(f"Aggregate expression {item!r} cannot be merged; select plain aggregates")
+        else:
+            items.append({"kind": "key", "sql": item})
+    group_at = position("GROUP")
+    if not has_agg:
+        if group_at is not None:
+            plan["distinct"] = True  # GROUP BY without aggregates behaves like DISTINCT
+        return plan
+    if position("HAVING") is not None:
+        raise FederationError("HAVING cannot be pushed down; filter the merged result instead")
+
+    shard_items = []
+    for i, item in enumerate(items):
+        if item["kind"] == "key":
+            shard_items.append(item["sql"])
+        elif item["func"] == "AVG":
+            shard_items.append(f"TOTAL({item['arg']}) AS __p{i}")
+            shard_items.append(f"COUNT({item['arg']}) AS __p{i}_n")
+        else:
+            shard_items.append(f"{item['func']}({item['arg']}) AS __p{i}")
+    plan["aggregate"] = items
+    plan["body"] = "SELECT " + ", ".join(shard_items) + " " + text(from_at, body_end)
+    return plan
+
+
+def _balanced(expr):
+    depth = 0
+    for ch in expr:
+        depth += ch == "("
+        depth -= ch == ")"
+        if depth < 0:
+            return False
+    return depth == 0
+
+# ========== MERGING ==========
+
+def _sql_rank(value):
+    """SQLite sort order: NULL < numbers < text < blobs."""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    return (3, value)
+
+
+class _SortKey:
+    __slots__ = ("values", "desc")
+
+    def __init__(self, values, desc):
+        self.values = values
+        self.desc = desc
+
+    def __lt__(self, other):
+        for a, b, desc in zip(self.values, other.values, self.desc):
+            if a != b:
+                return (a > b) if desc else (a < b)
+        return False
+
+
+def _sort_key(order_by, columns):
+    names = []
+    for name, _ in order_by:
+        if name.isdigit() and 0 < int(name) <= len(columns):
+            name = columns[int(name) - 1]
+        if name not in columns:
+            raise FederationError(f"ORDER BY {name} must name a selected column for fan-out")
+        names.append(name)
+    desc = [d for _, d in order_by]
+    return lambda row: _SortKey([_sql_rank(row[n]) for n in names], desc)
+
+
+def _combine(func, a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    if func in ("COUNT", "SUM", "TOTAL"):
+        return a + b
+    if func == "MIN":
+        return a if _sql_rank(a) <= _sql_rank(b) else b
+    return a if _sql_rank(a) >= _sql_rank(b) else b
+
+
+def merge_aggregates(items, rows):
+    """Fold per-shard partial aggregate rows into final rows."""
+    groups = {}
+    names = None
+    for row in rows:
+        values = list(row.values())
+        columns = list(row.keys())
+        key = []
+        parts = []
+        col = 0
+        out_names = []
+        for i, item in enumerate(items):
+            if item["kind"] == "key":
+                key.append(values[col])
+                out_names.append(columns[col])
+                col += 1
+            elif item["func"] == "AVG":
+                parts.append((values[col], values[col + 1]))
+                out_names.append(item["name"])
+                col += 2
+            else:
+                parts.append(values[col])
+                out_names.append(item["name"])
+                col += 1
+        names = names or out_names
+        key = tuple(key)
+        if key not in groups:
+            groups[key] = parts
+            continue
+        merged = groups[key]
+        p = 0
+        for item in items:
+            if item["kind"] == "key":
+                continue
+            if item["func"] == "AVG":
+                merged[p] = (merged[p][0] + parts[p][0], merged[p][1] + parts[p][1])
+            else:
+                merged[p] = _combine(item["func"], merged[p], parts[p])
+            p += 1
+
+    results = []
+    for key, parts in groups.items():
+        key_iter = iter(key)
+        part_iter = iter(parts)
+        values = []
+        for item in items:
+            if item["kind"] == "key":
+                values.append(next(key_iter))
+            elif item["func"] == "AVG":
+                total, count = next(part_iter)
+                values.append(total / count if count else None)
+            else:
+                values.append(next(part_iter))
+        results.append(dict(zip(names, values)))
+    return results
+
+# ========== FAN-OUT ==========
+
+def fan_out(registry, sql, params=None, databases=None, group=None, timeout_ms=None):
+    """Run ``sql`` on several databases in parallel and merge the results.
+
+    Rows are streamed from each shard; ordered queries are merged with a
+    k-way heap merge, LIMIT (+OFFSET) is pushed down to every shard, and
+    plain aggregates are computed per shard then combined here.
+    """
+    names = registry.resolve(databases, group)
+    plan = plan_fan_out(sql)
+    shard_sql = plan["body"]
+    if not plan["aggregate"]:
+        if plan["order_sql"]:
+            shard_sql += " " + plan["order_sql"]
+        if plan["limit"] is not None and not plan["distinct"]:
+            shard_sql += f" LIMIT {plan['limit'] + plan['offset']}"
+
+    stop = threading.Event()
+    outputs = {name: queue.Queue(QUEUE_BATCHES) for name in names}
+    running = {}
+    shard_stats = {}
+
+    def put(out, item):
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce(name):
+        out = outputs[name]
+        try:
+            with registry.pool(name).connection() as conn:
+                running[name] = conn
+                stream = conn.stream(shard_sql, params, timeout_ms)
+                try:
+                    for batch in stream:
+                        if not put(out, ("rows", batch)):
+                            break
+                finally:
+                    stream.close()
+                    running.pop(name, None)
+                shard_stats[name] = {
+                    k: conn.last_stats.get(k) for k in ("rows_fetched", "elapsed_ms", "vm_steps")
+                }
+            put(out, ("done", None))
+        except Exception as e:
+            put(out, ("error", e))
+
+    def drain(name):
+        out = outputs[name]
+        while True:
+            kind, payload = out.get()
+            if kind == "rows":
+                yield from payload
+            elif kind == "error":
+                raise payload
+            else:
+                return
+
+    with ThreadPoolExecutor(max_workers=len(names)) as executor:
+        for name in names:
+            executor.submit(produce, name)
+        try:
+            streams = [drain(name) for name in names]
+            if plan["aggregate"]:
+                rows = merge_aggregates(plan["aggregate"], itertools.chain(*streams))
+                if plan["order_by"] and rows:
+                    rows.sort(key=_sort_key(plan["order_by"], list(rows[0])))
+                rows = rows[plan["offset"]:]
+                if plan["limit"] is not None:
+                    rows = rows[:plan["limit"]]
+            else:
+                merged = _merge_streams(streams, plan["order_by"])
+                if plan["distinct"]:
+                    merged = _unique(merged)
+                end = plan["limit"] + plan["offset"] if plan["limit"] is not None else None
+                rows = list(itertools.islice(merged, plan["offset"], end))
+        finally:
+            stop.set()
+            for conn in list(running.values()):
+                conn.interrupt()
+
+    return {
+        "databases": names,
+        "shard_sql": shard_sql,
+        "pushdown": {
+            "limit": plan["limit"] is not None and not plan["aggregate"] and not plan["distinct"],
+            "aggregates": bool(plan["aggregate"])
+        },
+        "shards": shard_stats,
+        "result": rows
+    }
+
+
+def _merge_streams(streams, order_by):
+    """Order-preserving k-way merge (or concatenation when unordered)."""
+    if not order_by:
+        yield from itertools.chain(*streams)
+        return
+    iterators = [iter(s) for s in streams]
+    firsts = []
+    for it in iterators:
+        first = next(it, None)
+        if first is not None:
+            firsts.append((first, it))
+    if not firsts:
+        return
+    key = _sort_key(order_by, list(firsts[0][0]))
+    yield from heapq.merge(*(itertools.chain([row], it) for row, it in firsts), key=key)
+
+
+def _unique(rows):
+    seen = set()
+    for row in rows:
+        marker = tuple(row.values())
+        if marker not in seen:
+            seen.add(marker)
+            yield row
@@ -0,0 +1,146 @@
+# http_transport.py - Streamable HTTP/SSE transport so many MCP clients share one server process
+import asyncio
+import contextlib
+import time
+import weakref
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Mount, Route
+
+from mcp.server.sse import SseServerTransport
+from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+
+SESSION_MAX_CONCURRENT = 4
+SESSION_RATE_LIMIT = 50.0     # tool calls per second (token bucket)
+SESSION_BURST = 100
+
+
+class SessionLimitExceeded(Exception):
+    """A session went over its call rate; ``retry_after`` is in seconds."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+# ========== PER-SESSION LIMITS ==========
+
+class _SessionState:
+    def __init__(self, max_concurrent, burst):
+        self.semaphore = asyncio.Semaphore(max_concurrent)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.calls = 0
+        self.rejected = 0
+        self.in_flight = 0
+
+
+class SessionLimiter:
+    """Concurrency and rate limits per MCP session.
+
+    Each session may run ``max_concurrent`` tool calls at once (further
+    calls wait their turn) and refills ``rate`` calls/second up to
+    ``burst``; calls beyond that are rejected with a retry hint. State is
+    keyed weakly by the session object, so it goes away with the session.
+    """
+
+    def __init__(self, max_concurrent=SESSION_MAX_CONCURRENT, rate=SESSION_RATE_LIMIT, burst=SESSION_BURST):
+        self.max_concurrent = max_concurrent
+        self.rate = rate
+        self.burst = burst
+        self.sessions = weakref.WeakKeyDictionary()
+        self.total_calls = 0
+        self.total_rejected = 0
+
+    def _state(self, session):
+        state = self.sessions.get(session)
+        if state is None:
+            state = self.sessions[session] = _SessionState(self.max_concurrent, self.burst)
+        return state
+
+    @contextlib.asynccontextmanager
+    async def limit(self, session):
+        state = self._state(session)
+        now = time.monotonic()
+        state.tokens = min(self.burst, state.tokens + (now - state.updated) * self.rate)
+        state.updated = now
+        if state.tokens < 1:
+            state.rejected += 1
+            self.total_rejected += 1
+            raise SessionLimitExceeded(
+                f"Session rate limit of {self.rate:g} calls/s exceeded",
+                round((1 - state.tokens) / self.rate, 3)
+            )
+        state.tokens -= 1
+        async with state.semaphore:
+            state.calls += 1
+            state.in_flight += 1
+            self.total_calls += 1
+            try:
+                yield state
+            finally:
+                state.in_flight -= 1
+
+    def stats(self):
+        states = list(self.sessions.values())
+        return {
+            "active_sessions": len(states),
+            "in_flight": sum(s.in_flight for s in states),
+            "calls": self.total_calls,
+            "rejected": self.total_rejected,
+            "max_concurrent_per_session": self.max_concurrent,
+            "rate_limit_per_session": self.rate,
+            "burst_per_session": self.burst
+        }
+
+# ========== APP ==========
+
+class _ASGIEndpoint:
+    """Lets Starlette route /mcp itself (a Mount would redirect to /mcp/)."""
+
+    def __init__(self, handler):
+        self.handler = handler
+
+    async def __call__(self, scope, receive, send):
+        await self.handler(scope, receive, send)
+
+
+def build_app(server, stats=None):
+    """Starlette app serving ``server`` over streamable HTTP (/mcp) and SSE (/sse).
+
+    All sessions run in this process, so connection pools and caches held
+    by the server module are shared by every client. ``stats`` is an
+    optional callable whose result is served at /health.
+    """
+    session_manager = StreamableHTTPSessionManager(app=server)
+    sse = SseServerTransport("/messages/")
+
+    async def handle_sse(request):
+        async with sse.connect_sse(request.scope, request.receive, request._send) as (read_stream, write_stream):
+            await server.run(read_stream, write_stream, server.create_initialization_options())
+        return Response()
+
+    async def health(request):
+        return JSONResponse({"status": "ok", **(stats() if stats else {})})
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        async with session_manager.run():
+            yield
+
+    return Starlette(
+        routes=[
+            Route("/mcp", endpoint=_ASGIEndpoint(session_manager.handle_request), methods=["GET", "POST", "DELETE"]),
+            Route("/sse", endpoint=handle_sse, methods=["GET"]),
+            Mount("/messages/", app=sse.handle_post_message),
+            Route("/health", endpoint=health, methods=["GET"])
+        ],
+        lifespan=lifespan
+    )
+
+
+async def serve(server, host="127.0.0.1", port=8000, stats=None):
+    import uvicorn
+
+    config = uvicorn.Config(build_app(server, stats), host=host, port=port, log_level="warning")
+    await uvicorn.Server(config).serve()
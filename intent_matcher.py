@@ -0,0 +1,368 @@
+# intent_matcher.py - Schema-compiled rule/template tier for NL to SQL
+import re
+
+MATCH_CONFIDENCE = 0.75
+MAX_DISTINCT_VALUES = 50
+
+STOPWORDS = {
+    "a", "an", "the", "me", "show", "list", "all", "get", "give", "display", "find",
+    "what", "which", "who", "are", "is", "was", "were", "of", "from", "in", "with",
+    "for", "and", "to", "their", "there", "have", "has", "had", "do", "does", "did",
+    "please", "any", "every", "made", "placed", "by", "per", "each", "that", "those",
+    "these", "on", "at", "based", "records", "rows", "data", "entries", "i", "want",
+    "see", "tell", "you", "can", "return", "fetch", "whose", "where", "them"
+}
+# Connectives the templates cannot express (every filter is ANDed); never stopwords
+DECLINE_WORDS = {"or", "not", "except"}
+
+COUNT_WORDS = {"count", "how", "many", "number"}
+SUM_WORDS = {"total", "sum", "revenue", "spend", "spent", "sales", "spending"}
+AVG_WORDS = {"average", "avg", "mean"}
+MAX_WORDS = {"max", "maximum"}
+MIN_WORDS = {"min", "minimum"}
+TOP_WORDS = {"top", "highest", "largest", "biggest", "most", "expensive", "best"}
+BOTTOM_WORDS = {"lowest", "smallest", "least", "cheapest", "bottom"}
+GROUP_WORDS = {"per", "by", "each"}
+PERIOD_FORMATS = {
+    "day": "%Y-%m-%d", "daily": "%Y-%m-%d",
+    "month": "%Y-%m", "monthly": "%Y-%m",
+    "year": "%Y", "yearly": "%Y"
+}
+COMPARATORS = [
+    ("greater than", ">"), ("more than", ">"), ("at least", ">="), ("over", ">"), ("above", ">"),
+    ("less than", "<"), ("fewer than", "<"), ("at most", "<="), ("under", "<"), ("below", "<"),
+    ("equal to", "="), ("equals", "=")
+]
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10
+}
+DEFAULT_TOP_N = 5
+
+# ========== SCHEMA ==========
+
+def singular(word):
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def tokenize(text):
+    return [t.strip(".") for t in re.findall(r"[a-z0-9_@.']+", text.lower()) if t.strip(".")]
+
+
+def quote(value):
+    if isinstance(value, (int, float)):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def load_schema(conn, max_distinct=MAX_DISTINCT_VALUES, exclude=()):
+    """Read tables, column types, foreign keys and low-cardinality values."""
+    schema = {}
+    tables = [r[0] for r in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+    ) if not r[0].startswith("_") and r[0] not in exclude]
+    for table in tables:
+        columns = {}
+        for row in conn.execute(f'PRAGMA table_info("{table}")'):
+            if row[1].startswith("_"):
+                continue  # bookkeeping columns (e.g. materialized view keys)
+            columns[row[1]] = {"type": (row[2] or "").upper(), "pk": bool(row[5])}
+        foreign_keys = {
+            row[3]: (row[2], row[4]) for row in conn.execute(f'PRAGMA foreign_key_list("{table}")')
+        }
+        values = {}
+        for col, info in columns.items():
+            if "CHAR" in info["type"] or "TEXT" in info["type"] or info["type"] == "":
+                distinct = conn.execute(f'SELECT COUNT(DISTINCT "{col}") FROM "{table}"').fetchone()[0]
+                if 0 < distinct <= max_distinct:
+                    values[col] = [r[0] for r in conn.execute(
+                        f'SELECT DISTINCT "{col}" FROM "{table}" WHERE "{col}" IS NOT NULL'
+                    )]
+        schema[table] = {"columns": columns, "foreign_keys": foreign_keys, "values": values}
+
+    # Naming convention: <singular>_id references <table>.id
+    for table, info in schema.items():
+        for col in info["columns"]:
+            if col.endswith("_id") and col not in info["foreign_keys"]:
+                for target in schema:
+                    if singular(target) == col[:-3] and "id" in schema[target]["columns"]:
+                        info["foreign_keys"][col] = (target, "id")
+    return schema
+
+# ========== MATCHER ==========
+
+class IntentMatcher:
+    """Translate common questions to SQL using templates compiled from a schema."""
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.table_words = {}
+        self.column_words = {}
+        self.value_phrases = []
+        self.measures = {}
+        self.dates = {}
+        for table, info in schema.items():
+            self.table_words[table] = table
+            self.table_words[singular(table)] = table
+            for col, cinfo in info["columns"].items():
+                is_key = cinfo["pk"] or col == "id" or col.endswith("_id")
+                if not is_key:
+                    for word in {col, singular(col), col + "s", col.replace("_", " ")}:
+                        self.column_words.setdefault(word, []).append((table, col))
+                if not is_key and cinfo["type"] in ("REAL", "INTEGER", "NUMERIC", "FLOAT", "DOUBLE"):
+                    self.measures.setdefault(table, col)
+                if cinfo["type"] in ("DATE", "DATETIME", "TIMESTAMP") or col.endswith("_date"):
+                    self.dates.setdefault(table, col)
+            for col, values in info["values"].items():
+                for value in values:
+                    phrase = " ".join(tokenize(str(value)))
+                    if phrase:
+                        self.value_phrases.append((phrase, table, col, value))
+        # Longest phrases first so "new york" wins over "york"
+        self.value_phrases.sort(key=lambda v: -len(v[0]))
+
+    @classmethod
+    def from_connection(cls, conn, exclude=()):
+        return cls(load_schema(conn, exclude=exclude))
+
+    def _join(self, a, b):
+        """Return (child, fk_col, parent, parent_col) linking two tables, if any."""
+        for child, parent in ((a, b), (b, a)):
+            for col, (target, target_col) in self.schema[child]["foreign_keys"].items():
+                if target == parent:
+                    return child, col, parent, target_col
+        return None
+
+    def match(self, question):
+        """Return {"sql", "intent", "confidence"} or None when nothing is recognized."""
+        tokens = tokenize(question)
+        if not tokens:
+            return None
+        text = " " + " ".join(tokens) + " "
+        explained = set()
+        order = []  # tables in order of first mention
+
+        def mention(table):
+            if table not in order:
+                order.append(table)
+
+        # Literal values (country = 'USA', product = 'Laptop', ...)
+        filters = []
+        for phrase, table, col, value in self.value_phrases:
+            for candidate in (phrase, phrase + "s"):
+                if f" {candidate} " in text:
+                    filters.append((table, col, "=", value))
+                    explained.update(candidate.split())
+                    text = text.replace(f" {candidate} ", " \0 ")
+                    break
+
+        # Top-N / bottom-N
+        top = None
+        for i, tok in enumerate(tokens):
+            if tok in TOP_WORDS or tok in BOTTOM_WORDS:
+                n = None
+                for nxt in tokens[i + 1:i + 3] + tokens[max(0, i - 1):i]:
+                    if nxt.isdigit():
+                        n = int(nxt)
+                    elif nxt in NUMBER_WORDS:
+                        n = NUMBER_WORDS[nxt]
+                    if n:
+                        explained.add(nxt)
+                        break
+                top = ("DESC" if tok in TOP_WORDS else "ASC", n or DEFAULT_TOP_N)
+                explained.add(tok)
+                break
+
+        # Numeric comparisons ("amount over 100")
+        comparisons = []
+        for phrase, op in COMPARATORS:
+            for m in re.finditer(rf"(?:(\w+) )?{phrase} (\d+(?:\.\d+)?)", " ".join(tokens)):
+                number = float(m.group(2)) if "." in m.group(2) else int(m.group(2))
+                target = self.column_words.get(m.group(1) or "", [None])[0]
+                comparisons.append((target, op, number))
+                explained.update(phrase.split())
+                explained.add(m.group(2))
+
+        # Grouping ("per country", "by month", "for each user")
+        group = None
+        for i, tok in enumerate(tokens[:-1]):
+            if tok in GROUP_WORDS:
+                nxt = tokens[i + 1]
+                if nxt in PERIOD_FORMATS:
+                    group = ("period", PERIOD_FORMATS[nxt])
+                elif nxt in self.table_words:
+                    group = ("table", self.table_words[nxt])
+                elif nxt in self.column_words:
+                    table, col = self.column_words[nxt][0]
+                    if top and self.measures.get(table) == col:
+                        # "top 3 orders by amount" sorts by the measure, it does not group
+                        continue
+                    group = ("column", (table, col))
+                else:
+                    continue
+                explained.update((tok, nxt))
+                break
+
+        # Aggregate function
+        words = set(tokens)
+        agg = None
+        if words & COUNT_WORDS and ("count" in words or "number" in words or {"how", "many"} <= words):
+            agg = "COUNT"
+        elif words & AVG_WORDS:
+            agg = "AVG"
+        elif words & SUM_WORDS:
+            agg = "SUM"
+        elif words & MAX_WORDS:
+            agg = "MAX"
+        elif words & MIN_WORDS:
+            agg = "MIN"
+        if agg:
+            explained.update(words & {"COUNT": COUNT_WORDS, "AVG": AVG_WORDS, "SUM": SUM_WORDS,
+                                      "MAX": MAX_WORDS, "MIN": MIN_WORDS}[agg])
+
+        # Tables and columns named directly
+        columns = []
+        for tok in tokens:
+            if tok in self.table_words:
+                mention(self.table_words[tok])
+                explained.add(tok)
+            elif tok in self.column_words:
+                columns.append(self.column_words[tok][0])
+                explained.add(tok)
+        for table, _, _, _ in filters:
+            mention(table)
+        if group and group[0] == "table":
+            mention(group[1])
+        if group and group[0] == "column":
+            mention(group[1][0])
+
+        # Measure column for sums/averages/top-N/comparisons
+        measure = None
+        for table, col in columns:
+            if self.measures.get(table) == col:
+                measure = (table, col)
+        needs_measure = agg in ("SUM", "AVG", "MAX", "MIN") or top or group and group[0] == "period" \
+            or any(c[0] is None for c in comparisons)
+        if needs_measure and measure is None:
+            for table in order + list(self.measures):
+                if table in self.measures:
+                    measure = (table, self.measures[table])
+                    break
+        if measure:
+            mention(measure[0])
+        comparisons = [(c[0] or measure, c[1], c[2]) for c in comparisons if c[0] or measure]
+        for (table, _), _, _ in comparisons:
+            mention(table)
+        if group and group[0] == "period":
+            base = measure[0] if measure else (order[0] if order else None)
+            if base not in self.dates:
+                return None
+            mention(base)
+
+        if not order:
+            return None
+
+        # "top 2 users by total spend" ranks the entity without a measure of its own
+        if top and agg and not group and measure:
+            owners = [t for t in order if t != measure[0]]
+            if owners:
+                group = ("table", owners[0])
+
+        # Resolve the FROM clause
+        join = None
+        if len(order) > 2:
+            return None
+        if len(order) == 2:
+            join = self._join(order[0], order[1])
+            if join is None:
+                return None
+        base = join[0] if join else order[0]
+        qualify = join is not None
+
+        def ref(table, col):
+            return f"{table}.{col}" if qualify else col
+
+        from_sql = base
+        if join:
+            child, fk, parent, parent_col = join
+            from_sql = f"{child} JOIN {parent} ON {parent}.{parent_col} = {child}.{fk}"
+
+        where = [f"{ref(t, c)} = {quote(v)}" for t, c, _, v in filters]
+        where += [f"{ref(t, c)} {op} {quote(n)}" for (t, c), op, n in comparisons]
+        where_sql = f" WHERE {' AND '.join(where)}" if where else ""
+
+        # Build SELECT
+        intent = "list"
+        if group:
+            if group[0] == "period":
+                date_col = self.dates[base]
+                key_sql = f"strftime('{group[1]}', {ref(base, date_col)})"
+                key_alias = "period"
+                select_keys = f"{key_sql} AS {key_alias}"
+                group_sql = key_sql
+            elif group[0] == "table":
+                table = group[1]
+                label = next((c for c in ("name", "title") if c in self.schema[table]["columns"]), None)
+                pk = next((c for c, i in self.schema[table]["columns"].items() if i["pk"]), "id")
+                key_col = ref(table, pk)
+                if join and table == join[2]:
+                    key_col = ref(join[0], join[1])
+                select_keys = f"{key_col} AS {singular(table)}_id"
+                group_sql = key_col
+                if label:
+                    select_keys += f", {ref(table, label)} AS {label}"
+                    group_sql += f", {ref(table, label)}"
+                key_alias = f"{singular(table)}_id"
+            else:
+                table, col = group[1]
+                select_keys = f"{ref(table, col)} AS {col}"
+                group_sql = ref(table, col)
+                key_alias = col
+            if agg in (None, "COUNT"):
+                agg_sql, alias = "COUNT(*)", "count"
+            else:
+                agg_sql, alias = f"{agg}({ref(*measure)})", f"{agg.lower()}_{measure[1]}"
+            sql = f"SELECT {select_keys}, {agg_sql} AS {alias} FROM {from_sql}{where_sql} GROUP BY {group_sql}"
+            if top:
+                sql += f" ORDER BY {alias} {top[0]} LIMIT {top[1]}"
+            else:
+                sql += f" ORDER BY {alias} DESC" if group[0] != "period" else f" ORDER BY {key_alias}"
+            intent = "group_by"
+        elif agg == "COUNT":
+            sql = f"SELECT COUNT(*) AS count FROM {from_sql}{where_sql}"
+            intent = "count"
+        elif agg:
+            sql = f"SELECT {agg}({ref(*measure)}) AS {agg.lower()}_{measure[1]} FROM {from_sql}{where_sql}"
+            intent = "aggregate"
+        else:
+            if join:
+                child, _, parent, _ = join
+                taken = set(self.schema[child]["columns"])
+                extra = []
+                for col, info in self.schema[parent]["columns"].items():
+                    if info["pk"]:
+                        continue
+                    extra.append(f"{parent}.{col}" if col not in taken else f"{parent}.{col} AS {singular(parent)}_{col}")
+                select = ", ".join([f"{child}.*"] + extra)
+                intent = "join"
+            else:
+                select = "*"
+                intent = "filter" if where else "list"
+            sql = f"SELECT {select} FROM {from_sql}{where_sql}"
+            if top:
+                sql += f" ORDER BY {ref(*measure)} {top[0]} LIMIT {top[1]}"
+                intent = "top_n"
+
+        # Every content word must have shaped the SQL; "or", "last month" or an
+        # unknown word means the template answers a different question, so the
+        # score drops below MATCH_CONFIDENCE and the question goes to the LLM tier
+        content = [t for t in tokens if t not in STOPWORDS]
+        unexplained = [t for t in content if t not in explained or t in DECLINE_WORDS]
+        confidence = 1.0
+        if unexplained:
+            confidence = MATCH_CONFIDENCE * (1 - len(unexplained) / len(content))
+        return {"sql": sql, "intent": intent, "confidence": round(confidence, 3)}
@@ -0,0 +1,248 @@
+# llm_translate.py - Streaming LLM tier for NL to SQL with schema-pruned prompts
+import re
+import sys
+import threading
+import time
+
+from intent_matcher import singular, tokenize
+from sql_guard import tokenize_spans
+
+MODEL = "llama3.2:3b"
+KEEP_ALIVE = -1          # keep the model loaded between calls (Ollama: negative = forever)
+MAX_PROMPT_TABLES = 4
+MAX_PROMPT_COLUMNS = 16
+MAX_NEW_TOKENS = 256
+OPTIONS = {"temperature": 0.1, "num_predict": MAX_NEW_TOKENS}
+
+PROMPT_TEMPLATE = """Translate the question into one SQLite SELECT statement.
+Tables:
+{tables}
+{hints}Question: {question}
+Return only the SQL, ending with a semicolon."""
+
+_FENCE = re.compile(r"```[ \t]*(?:sql|sqlite)?[ \t]*\n?(.*?)(```|$)", re.S | re.I)
+_START_WORDS = {"SELECT", "WITH"}
+# Words that continue a statement after a blank line (prose would capitalize them: "Where ...")
+_CLAUSE_WORDS = {
+    "FROM", "WHERE", "JOIN", "LEFT", "RIGHT", "INNER", "OUTER", "CROSS", "FULL", "NATURAL", "ON", "USING",
+    "GROUP", "ORDER", "HAVING", "LIMIT", "OFFSET", "UNION", "INTERSECT", "EXCEPT", "WINDOW", "AND", "OR"
+}
+
+
+class TranslationError(Exception):
+    """The model produced no usable SQL."""
+
+
+# ========== SQL EXTRACTION ==========
+
+def extract_sql(text, final=False):
+    """Return (sql, complete) for the first statement in model output.
+
+    Handles ```sql fences (closed or still streaming), prose before the
+    query and explanations after it. A statement is complete once a
+    semicolon outside a string literal, a closing fence or (outside fences)
+    a blank line followed by prose rather than another clause follows it;
+    ``final`` marks the end of the output.
+    """
+    fence = _FENCE.search(text)
+    if fence:
+        body, closed = fence.group(1), bool(fence.group(2))
+    else:
+        body, closed = text, False
+    spans = tokenize_spans(body)
+    # Prefer an upper-case keyword so "to select users:" in prose is not taken for the query
+    starts = [(word in _START_WORDS, s) for kind, word, s, _ in spans if kind == "word" and word.upper() in _START_WORDS]
+    start = next((s for exact, s in starts if exact), starts[0][1] if starts else None)
+    if start is None:
+        return None, closed or final
+    for kind, word, s, _ in spans:
+        # An odd number of quotes means the semicolon sits in a literal that is still streaming
+        if s > start and word == ";" and body.count("'", start, s) % 2 == 0:
+            return body[start:s].strip(), True
+    sql = body[start:]
+    if not fence:
+        for blank in re.finditer(r"\n[ \t]*\n", sql):
+            rest = sql[blank.end():].lstrip()
+            if not rest:
+                break
+            word = re.match(r"[A-Za-z_]+|\S", rest).group()
+            if word == rest and not final:
+                return sql.strip(), False   # the next word is still streaming
+            if word in ("(", ")", ",") or word.upper() in _CLAUSE_WORDS and word in (word.upper(), word.lower()):
+                continue
+            return sql[:blank.start()].strip(), True
+    return sql.strip(), closed or final
+
+
+# ========== PROMPTS ==========
+
+def relevant_tables(schema, question, max_tables=MAX_PROMPT_TABLES):
+    """Tables (best first) and matched columns/values for the question.
+
+    Tables score for their own name, their column names and their known
+    values appearing in the question; tables they reference by foreign
+    key come along so joins stay possible. With no match at all every
+    table is kept.
+    """
+    words = tokenize(question)
+    text = " " + " ".join(words) + " "
+    vocabulary = set(words) | {singular(w) for w in words}
+    scores, columns, hints = {}, {}, {}
+    for table, info in schema.items():
+        score = 3 if table in vocabulary or singular(table) in vocabulary else 0
+        for col in info["columns"]:
+            names = {col, singular(col), col.replace("_", " ")}
+            if any(f" {name} " in text for name in names):
+                score += 1
+                columns.setdefault(table, set()).add(col)
+        for col, values in info["values"].items():
+            for value in values:
+                phrase = " ".join(tokenize(str(value)))
+                if phrase and f" {phrase} " in text:
+                    score += 2
+                    columns.setdefault(table, set()).add(col)
+                    hints.setdefault((table, col), []).append(value)
+        if score:
+            scores[table] = score
+    if not scores:
+        return list(schema), columns, hints
+    selected = sorted(scores, key=lambda t: -scores[t])[:max_tables]
+    for table in list(selected):
+        for target, _ in schema[table]["foreign_keys"].values():
+            if target in schema and target not in selected and len(selected) < max_tables:
+                selected.append(target)
+    return selected, columns, hints
+
+
+def build_prompt(schema, question, max_tables=MAX_PROMPT_TABLES):
+    """Prompt listing only the tables/columns the question is about; returns (prompt, tables)."""
+    tables, matched, hints = relevant_tables(schema, question, max_tables)
+    lines = []
+    for table in tables:
+        info = schema[table]
+        cols = list(info["columns"])
+        if len(cols) > MAX_PROMPT_COLUMNS:
+            keep = matched.get(table, set()) | set(info["foreign_keys"])
+            cols = [c for c in cols if c in keep or info["columns"][c]["pk"] or c == "id"]
+        defs = ", ".join(f"{c} {info['columns'][c]['type']}".strip() for c in cols)
+        lines.append(f"{table}({defs})")
+        for col, (target, target_col) in info["foreign_keys"].items():
+            if target in tables:
+                lines.append(f"  {table}.{col} references {target}.{target_col}")
+    hint_lines = "".join(
+        f"{table}.{col} values: {', '.join(repr(v) for v in values)}\n" for (table, col), values in hints.items()
+        if table in tables
+    )
+    prompt = PROMPT_TEMPLATE.format(tables="\n".join(lines), hints=hint_lines, question=question)
+    return prompt, tables
+
+
+# ========== TRANSLATOR ==========
+
+class Translator:
+    """Streams completions from ``generate`` (``ollama.generate``) and stops at the first full statement.
+
+    ``warm_up`` loads the model ahead of the first question, and every
+    request passes ``keep_alive`` so it stays resident between calls.
+    Each call reports time to first token and total latency.
+    """
+
+    def __init__(self, generate=None, model=MODEL, keep_alive=KEEP_ALIVE, options=None):
+        self.generate = generate
+        self.model = model
+        self.keep_alive = keep_alive
+        self.options = dict(OPTIONS if options is None else options)
+        self.warm_up_ms = None
+        self.calls = 0
+        self.early_stops = 0
+        self.errors = 0
+        self.ttft_ms_total = 0.0
+        self.total_ms_total = 0.0
+        self.last = None
+        self._lock = threading.Lock()
+
+    @property
+    def available(self):
+        return self.generate is not None
+
+    def warm_up(self):
+        """Load the model (an empty prompt only loads it) so the first question skips the cold start."""
+        if not self.available:
+            return
+        start = time.perf_counter()
+        try:
+            self.generate(model=self.model, prompt="", keep_alive=self.keep_alive)
+        except Exception as e:
+            print(f"⚠️ LLM warm-up failed: {e}", file=sys.stderr)
+            return
+        self.warm_up_ms = round((time.perf_counter() - start) * 1000, 1)
+
+    def translate(self, question, schema):
+        """Return (sql, timings) for ``question`` against ``schema`` (intent_matcher.load_schema format)."""
+        if not self.available:
+            raise TranslationError("No LLM configured")
+        prompt, tables = build_prompt(schema, question)
+        start = time.perf_counter()
+        ttft_ms = None
+        text = ""
+        chunks = 0
+        sql, complete, early_stop = None, False, False
+        stream = self.generate(model=self.model, prompt=prompt, stream=True,
+                               options=self.options, keep_alive=self.keep_alive)
+        try:
+            for chunk in stream:
+                piece = chunk.get("response") or ""
+                if piece and ttft_ms is None:
+                    ttft_ms = (time.perf_counter() - start) * 1000
+                text += piece
+                chunks += 1
+                sql, complete = extract_sql(text)
+                if complete:
+                    early_stop = not chunk.get("done")
+                    break
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            # Closing the stream drops the HTTP response, which cancels the rest of the generation
+            close = getattr(stream, "close", None)
+            if close:
+                close()
+        if not complete:
+            sql, _ = extract_sql(text, final=True)
+        total_ms = (time.perf_counter() - start) * 1000
+        timings = {
+            "model": self.model,
+            "ttft_ms": round(ttft_ms, 1) if ttft_ms is not None else None,
+            "total_ms": round(total_ms, 1),
+            "early_stop": early_stop,
+            "chunks": chunks,
+            "prompt_tables": tables,
+            "prompt_chars": len(prompt)
+        }
+        with self._lock:
+            self.calls += 1
+            self.early_stops += early_stop
+            self.ttft_ms_total += ttft_ms or 0.0
+            self.total_ms_total += total_ms
+            self.last = timings
+            if not sql:
+                self.errors += 1
+        if not sql:
+            raise TranslationError(f"No SQL statement in model output: {text[:200]!r}")
+        return sql, timings
+
+    def stats(self):
+        with self._lock:
+            return {
+                "available": self.available,
+                "model": self.model,
+                "warm_up_ms": self.warm_up_ms,
+                "calls": self.calls,
+                "early_stops": self.early_stops,
+                "errors": self.errors,
+                "avg_ttft_ms": round(self.ttft_ms_total / self.calls, 1) if self.calls else None,
+                "avg_total_ms": round(self.total_ms_total / self.calls, 1) if self.calls else None,
+                "last": self.last
+            }
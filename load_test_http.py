@@ -0,0 +1,117 @@
+# load_test_http.py - Hundreds of simulated MCP clients against one HTTP server process
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+from mcp import ClientSession
+from mcp.client.streamable_http import streamablehttp_client
+
+WORKLOAD = [
+    ("execute_sql", {"query": "SELECT * FROM users WHERE country = ?", "params": ["USA"]}),
+    ("execute_sql", {"query": "SELECT user_id, SUM(amount) AS total FROM orders GROUP BY user_id"}),
+    ("query_data", {"question": "Show me all users"}),
+    ("query_data", {"question": "How many orders are there?"}),
+    ("query_data", {"question": "users.csv", "source_type": "file"}),
+    ("list_sources", {}),
+]
+
+
+def wait_for_server(url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"{url}/health", timeout=1) as response:
+                return json.loads(response.read())
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not come up")
+
+
+async def client(url, calls, rng, latencies, errors, start_gate):
+    await start_gate.wait()
+    try:
+        async with streamablehttp_client(f"{url}/mcp", timeout=60) as (read, write, _):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                for _ in range(calls):
+                    name, arguments = rng.choice(WORKLOAD)
+                    started = time.perf_counter()
+                    result = await session.call_tool(name, arguments)
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    if result.isError:
+                        errors.append(name)
+    except Exception as e:
+        errors.append(f"session: {type(e).__name__}: {e}")
+
+
+async def run_load(url, clients, calls, seed=7):
+    rng = random.Random(seed)
+    latencies = []
+    errors = []
+    start_gate = asyncio.Event()
+    tasks = [
+        asyncio.create_task(client(url, calls, random.Random(rng.random()), latencies, errors, start_gate))
+        for _ in range(clients)
+    ]
+    started = time.perf_counter()
+    start_gate.set()
+    await asyncio.gather(*tasks)
+    return latencies, errors, time.perf_counter() - started
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--calls", type=int, default=10, help="tool calls per client")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--url", help="use an already running server instead of starting one")
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if not url:
+        url = f"http://127.0.0.1:{args.port}"
+        env = {**os.environ, "SESSION_RATE_LIMIT": os.environ.get("SESSION_RATE_LIMIT", "50")}
+        server = subprocess.Popen(
+            [sys.executable, "server_challenge2.py", "--transport", "http", "--port", str(args.port)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env
+        )
+    try:
+        wait_for_server(url)
+        print(f"🧪 HTTP load test: {args.clients} concurrent MCP sessions x {args.calls} calls")
+        print("=" * 70)
+        latencies, errors, elapsed = asyncio.run(run_load(url, args.clients, args.calls))
+        stats = wait_for_server(url)
+        total = args.clients * args.calls
+        print(f"Completed calls: {len(latencies):,}/{total:,} in {elapsed:.1f} s "
+              f"({len(latencies) / elapsed:,.0f} calls/sec)")
+        if latencies:
+            print(f"Latency p50 {percentile(latencies, 50):.1f} ms | p95 {percentile(latencies, 95):.1f} ms | "
+                  f"p99 {percentile(latencies, 99):.1f} ms | mean {statistics.mean(latencies):.1f} ms")
+        print(f"Errors: {len(errors)}" + (f" (first: {errors[0]})" if errors else ""))
+        print(f"Shared state: {stats['sessions']['calls']:,} limited calls, "
+              f"statement cache hit rate {stats['db_pool']['hit_rate']:.1%} over "
+              f"{stats['db_pool']['connections']} pooled connections, "
+              f"{stats['file_cache_entries']} cached files")
+        print("✅ Load test finished" if not errors else "❌ Load test had errors")
+        return 0 if not errors else 1
+    finally:
+        if server:
+            server.terminate()
+            server.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
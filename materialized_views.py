@@ -0,0 +1,335 @@
+# materialized_views.py - Trigger-maintained aggregate views stored as SQLite tables
+import json
+import re
+
+CATALOG_TABLE = "_mv_catalog"
+PERIODS = {"day": "%Y-%m-%d", "month": "%Y-%m", "year": "%Y"}
+IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+# Starter definitions for the sample schema, used when a view is created by name only
+DEFAULT_VIEWS = {
+    "mv_spend_per_user": {
+        "source": "orders",
+        "join": {"table": "users", "on": ["user_id", "id"]},
+        "group_by": ["user_id", "users.name"],
+        "aggregates": {"total_spend": "sum(amount)", "order_count": "count(*)"}
+    },
+    "mv_orders_per_country": {
+        "source": "orders",
+        "join": {"table": "users", "on": ["user_id", "id"]},
+        "group_by": ["users.country"],
+        "aggregates": {"order_count": "count(*)", "revenue": "sum(amount)"}
+    },
+    "mv_monthly_revenue": {
+        "source": "orders",
+        "group_by": ["month(order_date)"],
+        "aggregates": {"revenue": "sum(amount)", "order_count": "count(*)", "avg_order": "avg(amount)"}
+    }
+}
+
+
+class ViewDefinitionError(ValueError):
+    """Raised for an invalid or unsupported materialized view definition."""
+
+
+def _ident(name):
+    if not isinstance(name, str) or not IDENTIFIER.match(name):
+        raise ViewDefinitionError(f"Invalid identifier: {name!r}")
+    return name
+
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+
+
+def ensure_catalog(conn):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {CATALOG_TABLE} (
+            name TEXT PRIMARY KEY,
+            definition TEXT NOT NULL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+# ========== DEFINITION ==========
+
+class ViewPlan:
+    """Parsed view definition plus the SQL fragments used by its triggers."""
+
+    def __init__(self, conn, name, definition):
+        self.name = _ident(name)
+        self.source = _ident(definition.get("source", ""))
+        source_cols = _columns(conn, self.source)
+        if not source_cols:
+            raise ViewDefinitionError(f"Unknown source table: {self.source}")
+
+        self.join = None
+        dim_cols = []
+        if definition.get("join"):
+            join = definition["join"]
+            fk, pk = join.get("on", [None, None])
+            self.join = {"table": _ident(join.get("table")), "fk": _ident(fk), "pk": _ident(pk)}
+            dim_cols = _columns(conn, self.join["table"])
+            if fk not in source_cols or pk not in dim_cols:
+                raise ViewDefinitionError(f"Join columns not found: {self.source}.{fk} = {self.join['table']}.{pk}")
+
+        # Group keys: "col", "<join table>.col", or "day|month|year(col)"
+        self.keys = []
+        for item in definition.get("group_by", []):
+            period = re.match(r"^(day|month|year)\((\w+)\)$", item)
+            if period:
+                col = _ident(period.group(2))
+                if col not in source_cols:
+                    raise ViewDefinitionError(f"Unknown column: {col}")
+                self.keys.append({"alias": period.group(1), "kind": "period",
+                                  "format": PERIODS[period.group(1)], "column": col})
+            elif "." in item:
+                table, col = item.split(".", 1)
+                if not self.join or table != self.join["table"] or col not in dim_cols:
+                    raise ViewDefinitionError(f"Group column {item} needs a join on {table}")
+                self.keys.append({"alias": _ident(col), "kind": "dimension", "column": col})
+            else:
+                if _ident(item) not in source_cols:
+                    raise ViewDefinitionError(f"Unknown column: {item}")
+                self.keys.append({"alias": item, "kind": "source", "column": item})
+        if not self.keys:
+            raise ViewDefinitionError("group_by needs at least one column")
+
+        # Aggregates: count(*), sum(col), avg(col)
+        self.aggregates = []
+        for alias, expr in definition.get("aggregates", {}).items():
+            m = re.match(r"^\s*(count|sum|avg)\(\s*(\*|\w+)\s*\)\s*$", expr, re.I)
+            if not m:
+                raise ViewDefinitionError(f"Unsupported aggregate {expr!r} (use count(*), sum(col), avg(col))")
+            func, col = m.group(1).lower(), m.group(2)
+            if func != "count" and col not in source_cols:
+                raise ViewDefinitionError(f"Unknown column: {col}")
+            self.aggregates.append({"alias": _ident(alias), "func": func, "column": col})
+
+        aliases = [k["alias"] for k in self.keys] + [a["alias"] for a in self.aggregates]
+        if len(set(aliases)) != len(aliases):
+            raise ViewDefinitionError("Duplicate column names in view")
+        self.definition = definition
+
+    def sum_columns(self):
+        """Running totals kept in the table as (name, column, kind).
+
+        ``kind`` is "sum" for a running sum or "nn" for a count of non-NULL
+        values; avg is derived from its _sum_ and _nn_ columns.
+        """
+        cols = []
+        for agg in self.aggregates:
+            if agg["func"] == "sum":
+                cols.append((agg["alias"], agg["column"], "sum"))
+            elif agg["func"] == "avg":
+                cols.append((f"_sum_{agg['alias']}", agg["column"], "sum"))
+                cols.append((f"_nn_{agg['alias']}", agg["column"], "nn"))
+        return cols
+
+    @staticmethod
+    def _row_value(ref, col, kind):
+        return f"IFNULL({ref}.{col}, 0)" if kind == "sum" else f"({ref}.{col} IS NOT NULL)"
+
+    @staticmethod
+    def _group_value(ref, col, kind):
+        return f"TOTAL({ref}.{col})" if kind == "sum" else f"COUNT({ref}.{col})"
+
+    def key_exprs(self, fact, dim):
+        """SQL for each group key given fact/dimension row references."""
+        exprs = []
+        for key in self.keys:
+            if key["kind"] == "source":
+                exprs.append(f"{fact}.{key['column']}")
+            elif key["kind"] == "period":
+                exprs.append(f"strftime('{key['format']}', {fact}.{key['column']})")
+            else:
+                exprs.append(f"{dim}.{key['column']}")
+        return exprs
+
+    def delta_select(self, sign, fact, dim=None, scan_fact=False):
+        """SELECT producing (_key, keys..., _count, sums...) deltas with the given sign.
+
+        ``fact``/``dim`` are row references (NEW/OLD inside triggers). With
+        ``scan_fact`` the fact table is read for all rows matching ``dim``.
+        """
+        if self.join and dim is None:
+            dim_ref = "d"
+            dim_from = (f" JOIN {self.join['table']} d ON d.{self.join['pk']} = {fact}.{self.join['fk']}")
+        else:
+            dim_ref = dim
+            dim_from = ""
+        keys = self.key_exprs("f" if scan_fact else fact, dim_ref)
+        key_sql = " || ',' || ".join(f"quote({k})" for k in keys)
+        cols = [f"{key_sql} AS _key"] + [f"{k} AS {key['alias']}" for k, key in zip(keys, self.keys)]
+        if scan_fact:
+            cols.append(f"{sign} * COUNT(*) AS _count")
+            cols += [f"{sign} * {self._group_value('f', col, kind)} AS {alias}"
+                     for alias, col, kind in self.sum_columns()]
+            sql = (f"SELECT {', '.join(cols)} FROM {self.source} f"
+                   f" WHERE f.{self.join['fk']} = {dim}.{self.join['pk']}"
+                   f" GROUP BY {', '.join(keys)}")
+            return sql
+        cols.append(f"{sign} AS _count")
+        cols += [f"{sign} * {self._row_value(fact, col, kind)} AS {alias}"
+                 for alias, col, kind in self.sum_columns()]
+        if fact in ("NEW", "OLD"):
+            # Row-level trigger delta: single row, inner-join semantics via the dimension lookup
+            if self.join:
+                dim_from = (f" FROM {self.join['table']} d"
+                            f" WHERE d.{self.join['pk']} = {fact}.{self.join['fk']}")
+            return f"SELECT {', '.join(cols)}{dim_from}"
+        group = ", ".join(keys)
+        cols = cols[:len(keys) + 1]
+        cols.append(f"{sign} * COUNT(*) AS _count")
+        cols += [f"{sign} * {self._group_value(fact, col, kind)} AS {alias}"
+                 for alias, col, kind in self.sum_columns()]
+        return f"SELECT {', '.join(cols)} FROM {self.source} {fact}{dim_from} GROUP BY {group}"
+
+    def apply_sql(self, delta):
+        """Upsert a delta SELECT into the view table and drop emptied groups."""
+        key_aliases = [k["alias"] for k in self.keys]
+        sums = [alias for alias, _, _ in self.sum_columns()]
+        insert_cols = ["_key"] + key_aliases + ["_count"] + sums
+        updates = ["_count = _count + excluded._count"]
+        updates += [f"{s} = {s} + excluded.{s}" for s in sums]
+        for agg in self.aggregates:
+            if agg["func"] == "count":
+                updates.append(f"{agg['alias']} = _count + excluded._count")
+            elif agg["func"] == "avg":
+                s, n = f"_sum_{agg['alias']}", f"_nn_{agg['alias']}"
+                updates.append(f"{agg['alias']} = ({s} + excluded.{s}) / NULLIF({n} + excluded.{n}, 0)")
+        initial = {agg["alias"]: "_count" for agg in self.aggregates if agg["func"] == "count"}
+        initial.update({agg["alias"]: f"_sum_{agg['alias']} * 1.0 / NULLIF(_nn_{agg['alias']}, 0)"
+                        for agg in self.aggregates if agg["func"] == "avg"})
+        insert_cols += list(initial)
+        select_cols = ["_key"] + key_aliases + ["_count"] + sums + list(initial.values())
+        return [
+            f"INSERT INTO {self.name} ({', '.join(insert_cols)}) "
+            f"SELECT {', '.join(select_cols)} FROM ({delta}) WHERE true "
+            f"ON CONFLICT(_key) DO UPDATE SET {', '.join(updates)}",
+            f"DELETE FROM {self.name} WHERE _count <= 0 AND _key IN (SELECT _key FROM ({delta}))"
+        ]
+
+    def create_sql(self):
+        cols = ["_key TEXT PRIMARY KEY"] + [k["alias"] for k in self.keys] + ["_count INTEGER NOT NULL"]
+        cols += [f"{alias} REAL NOT NULL DEFAULT 0" for alias, _, _ in self.sum_columns()]
+        cols += [f"{a['alias']} INTEGER" for a in self.aggregates if a["func"] == "count"]
+        cols += [f"{a['alias']} REAL" for a in self.aggregates if a["func"] == "avg"]
+        return f"CREATE TABLE {self.name} ({', '.join(cols)})"
+
+    def trigger_sql(self):
+        """CREATE TRIGGER statements on the source (and joined) table."""
+        triggers = []
+
+        def trigger(suffix, event, table, statements):
+            body = ";\n    ".join(statements)
+            triggers.append(
+                f"CREATE TRIGGER {self.name}__{suffix} AFTER {event} ON {table}\n"
+                f"BEGIN\n    {body};\nEND"
+            )
+
+        watched = {k["column"] for k in self.keys if k["kind"] != "dimension"}
+        watched |= {col for _, col, _ in self.sum_columns()}
+        if self.join:
+            watched.add(self.join["fk"])
+        trigger("ins", "INSERT", self.source, self.apply_sql(self.delta_select(1, "NEW")))
+        trigger("del", "DELETE", self.source, self.apply_sql(self.delta_select(-1, "OLD")))
+        trigger("upd", f"UPDATE OF {', '.join(sorted(watched))}", self.source,
+                self.apply_sql(self.delta_select(-1, "OLD")) + self.apply_sql(self.delta_select(1, "NEW")))
+
+        if self.join:
+            dim = self.join["table"]
+            dim_watched = {k["column"] for k in self.keys if k["kind"] == "dimension"} | {self.join["pk"]}
+            trigger("dim_ins", "INSERT", dim,
+                    self.apply_sql(self.delta_select(1, None, "NEW", scan_fact=True)))
+            trigger("dim_del", "DELETE", dim,
+                    self.apply_sql(self.delta_select(-1, None, "OLD", scan_fact=True)))
+            trigger("dim_upd", f"UPDATE OF {', '.join(sorted(dim_watched))}", dim,
+                    self.apply_sql(self.delta_select(-1, None, "OLD", scan_fact=True))
+                    + self.apply_sql(self.delta_select(1, None, "NEW", scan_fact=True)))
+        return triggers
+
+# ========== MANAGEMENT ==========
+
+def _drop_objects(conn, name):
+    for (trigger,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name GLOB ?", (f"{name}__*",)
+    ).fetchall():
+        conn.execute(f'DROP TRIGGER IF EXISTS "{trigger}"')
+    conn.execute(f'DROP TABLE IF EXISTS "{name}"')
+
+
+def create_view(conn, name, definition, replace=False):
+    """Create (or replace) a materialized view, fill it once, and install its triggers."""
+    ensure_catalog(conn)
+    definition = definition or DEFAULT_VIEWS.get(name)
+    if not definition:
+        raise ViewDefinitionError(f"No definition given for {name}")
+    plan = ViewPlan(conn, name, definition)
+    exists = conn.execute(f"SELECT 1 FROM {CATALOG_TABLE} WHERE name = ?", (plan.name,)).fetchone()
+    if exists and not replace:
+        raise ViewDefinitionError(f"Materialized view {plan.name} already exists")
+    if not exists and conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = ?", (plan.name,)
+    ).fetchone():
+        raise ViewDefinitionError(f"{plan.name} is already used by another table or view")
+
+    with conn:
+        _drop_objects(conn, plan.name)
+        conn.execute(plan.create_sql())
+        for key in plan.keys:
+            conn.execute(f"CREATE INDEX {plan.name}__{key['alias']} ON {plan.name} ({key['alias']})")
+        if plan.join:
+            # Dimension-side deltas look up fact rows by foreign key
+            conn.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_{plan.source}_{plan.join['fk']} "
+                f"ON {plan.source} ({plan.join['fk']})"
+            )
+        for statement in plan.apply_sql(plan.delta_select(1, "src")):
+            conn.execute(statement)
+        for statement in plan.trigger_sql():
+            conn.execute(statement)
+        conn.execute(
+            f"INSERT OR REPLACE INTO {CATALOG_TABLE} (name, definition) VALUES (?, ?)",
+            (plan.name, json.dumps(definition))
+        )
+    return describe_view(conn, plan.name)
+
+
+def drop_view(conn, name):
+    ensure_catalog(conn)
+    with conn:
+        if not conn.execute(f"SELECT 1 FROM {CATALOG_TABLE} WHERE name = ?", (name,)).fetchone():
+            raise ViewDefinitionError(f"Unknown materialized view: {name}")
+        _drop_objects(conn, _ident(name))
+        conn.execute(f"DELETE FROM {CATALOG_TABLE} WHERE name = ?", (name,))
+
+
+def refresh_view(conn, name):
+    """Full recompute (repair path; normal maintenance is incremental)."""
+    definition = get_definition(conn, name)
+    return create_view(conn, name, definition, replace=True)
+
+
+def get_definition(conn, name):
+    ensure_catalog(conn)
+    row = conn.execute(f"SELECT definition FROM {CATALOG_TABLE} WHERE name = ?", (name,)).fetchone()
+    if not row:
+        raise ViewDefinitionError(f"Unknown materialized view: {name}")
+    return json.loads(row[0])
+
+
+def describe_view(conn, name):
+    definition = get_definition(conn, name)
+    columns = [c for c in _columns(conn, name) if not c.startswith("_")]
+    rows = conn.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0]
+    return {"name": name, "columns": columns, "rows": rows, "definition": definition}
+
+
+def list_views(conn):
+    if not conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (CATALOG_TABLE,)
+    ).fetchone():
+        return []
+    names = [r[0] for r in conn.execute(f"SELECT name FROM {CATALOG_TABLE} ORDER BY name")]
+    return [describe_view(conn, name) for name in names]
@@ -0,0 +1,347 @@
+# parallel_ops.py - Process-pool joins and group-bys over columnar shared-memory buffers
+import atexit
+import marshal
+import multiprocessing
+import os
+import threading
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import repeat
+from multiprocessing import shared_memory
+
+import spill_ops
+
+# Off (None) until benchmark_parallel_ops.py shows a speedup on the host; the
+# in-process operators are used for every input size until then
+PARALLEL_MIN_ROWS = None
+PARALLEL_WORKERS = os.cpu_count() or 1
+CHUNKS_PER_WORKER = 2
+MISSING = ...   # a row without the column; marshal encodes Ellipsis, JSON/SQL values never are one
+
+_pool = {"executor": None, "workers": 0}
+_pool_lock = threading.Lock()
+
+# ========== COLUMNAR BUFFERS ==========
+# The parent copies only the columns an operator reads (join key, group keys,
+# aggregated field) into one shared-memory segment as marshal-encoded row
+# chunks. Workers decode their own chunks straight from the segment and
+# publish their (small) results in segments of their own.
+
+def _share(chunks):
+    """Marshal each value list into one new segment; returns (segment, [(start, stop), ...])."""
+    blobs = [marshal.dumps(chunk) for chunk in chunks]
+    segment = shared_memory.SharedMemory(create=True, size=max(1, sum(len(blob) for blob in blobs)))
+    spans = []
+    offset = 0
+    for blob in blobs:
+        segment.buf[offset:offset + len(blob)] = blob
+        spans.append((offset, offset + len(blob)))
+        offset += len(blob)
+    return segment, spans
+
+
+def _read(name, spans):
+    segment = shared_memory.SharedMemory(name=name)
+    try:
+        chunks = []
+        for start, stop in spans:
+            with segment.buf[start:stop] as view:
+                chunks.append(marshal.loads(view))
+        return chunks
+    finally:
+        segment.close()
+
+
+def _publish(value):
+    data = marshal.dumps(value)
+    segment = shared_memory.SharedMemory(create=True, size=max(1, len(data)))
+    segment.buf[:len(data)] = data
+    segment.close()
+    return segment.name, len(data)
+
+
+def _collect(name, size):
+    segment = shared_memory.SharedMemory(name=name)
+    try:
+        with segment.buf[:size] as view:
+            return marshal.loads(view)
+    finally:
+        segment.close()
+        segment.unlink()
+
+
+def _bounds(total, count):
+    """``count`` contiguous (start, stop) ranges covering ``total`` rows (empty ranges dropped)."""
+    step = -(-total // max(1, count)) or 1
+    return [(start, min(total, start + step)) for start in range(0, total, step)]
+
+# ========== WORKERS ==========
+
+def _executor(workers):
+    with _pool_lock:
+        if _pool["executor"] is None or _pool["workers"] != workers:
+            if _pool["executor"] is not None:
+                _pool["executor"].shutdown(wait=False)
+            # The server runs request and snapshot threads, so forking it is not safe;
+            # a forkserver forks workers from a clean single-threaded process instead
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            _pool["executor"] = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+            _pool["workers"] = workers
+        return _pool["executor"]
+
+
+def _discard(executor):
+    """Forget a broken executor so the next call builds a fresh pool."""
+    with _pool_lock:
+        if _pool["executor"] is executor:
+            _pool["executor"] = None
+            _pool["workers"] = 0
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def warm_up(workers=None):
+    """Start the worker processes now so the first large call does not wait for them."""
+    workers = workers or PARALLEL_WORKERS
+    if workers > 1:
+        _executor(workers).submit(os.getpid).result()
+
+
+def shutdown():
+    with _pool_lock:
+        if _pool["executor"] is not None:
+            _pool["executor"].shutdown(wait=True, cancel_futures=True)
+            _pool["executor"] = None
+
+
+atexit.register(shutdown)
+
+
+def _task(task):
+    """Worker entry point: decode this task's chunks from shared memory and run it."""
+    operation, name, spans, options = task
+    columns = _read(name, spans)
+    if operation == "group":
+        result = _group_chunk(columns, *options)
+    elif operation == "first":
+        result = _first_keys(columns[0], *options)
+    else:
+        result = _probe(columns[0], columns[1:])
+    return _publish(result)
+
+
+def _group_chunk(columns, start, key_count):
+    """Per group in one row range: (key, first seq, group values, field values, row count)."""
+    values = columns[key_count] if len(columns) > key_count else repeat(MISSING)
+    groups = {}
+    for seq, (group_values, value) in enumerate(zip(zip(*columns[:key_count]), values), start):
+        key = tuple(spill_ops.hashable(v) for v in group_values)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = [key, seq, group_values, [], 0]
+        group[4] += 1
+        if value is not MISSING:
+            group[3].append(value)
+    return list(groups.values())
+
+
+def _first_keys(column, start):
+    """(key, seq, value) of the first row with each join key in one row range."""
+    first = {}
+    for seq, value in enumerate(column, start):
+        if value is not MISSING:
+            key = spill_ops.hashable(value)
+            if key not in first:
+                first[key] = (key, seq, value)
+    return list(first.values())
+
+
+def _probe(base, builds):
+    """Position of the first matching row in every build column for each base key (-1: none)."""
+    matches = []
+    for column in builds:
+        first = {}
+        for position, value in enumerate(column):
+            if value is not MISSING:
+                first.setdefault(spill_ops.hashable(value), position)
+        # A base row without the key, or with a NULL key, never matches (as in spill_ops)
+        matches.append(array("q", [
+            -1 if value is MISSING or value is None else first.get(spill_ops.hashable(value), -1)
+            for value in base
+        ]).tobytes())
+    return matches
+
+
+def _run(operation, chunks, tasks, workers, stats):
+    """Share ``chunks`` and run one worker task per (chunk indexes, options) in ``tasks``.
+
+    Returns the task results in order, or None when the pool cannot take
+    the call: a value marshal cannot encode (e.g. a datetime) or a worker
+    process that died (e.g. OOM-killed), in which case the pool is
+    dropped. ``stats["pool_error"]`` says which; the caller then runs the
+    operation in-process.
+    """
+    start = time.perf_counter()
+    try:
+        segment, spans = _share(chunks)
+    except ValueError:
+        stats["pool_error"] = "values marshal cannot encode; ran in-process"
+        return None
+    stats["shared_bytes"] = segment.size
+    stats["chunks"] = len(tasks)
+    stats["share_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    executor = _executor(workers)
+    try:
+        futures = [
+            executor.submit(_task, (operation, segment.name, [spans[i] for i in indexes], options))
+            for indexes, options in tasks
+        ]
+        return [_collect(*future.result()) for future in futures]
+    except BrokenProcessPool:
+        _discard(executor)
+        stats["pool_error"] = "worker process died; ran in-process"
+        return None
+    finally:
+        segment.close()
+        segment.unlink()
+
+
+def _workers(row_count, min_rows, workers):
+    workers = workers or PARALLEL_WORKERS
+    return workers if workers > 1 and min_rows is not None and row_count >= min_rows else 0
+
+
+def _fallback(stats, result):
+    rows, in_process = result
+    in_process["pool_error"] = stats["pool_error"]
+    return rows, in_process
+
+# ========== OPERATORS ==========
+
+def group_aggregate(rows, group_by, field, agg_type="sum", memory_bytes=spill_ops.MEMORY_BUDGET,
+                    min_rows=PARALLEL_MIN_ROWS, workers=None):
+    """``spill_ops.group_aggregate`` across worker processes once ``rows`` reaches ``min_rows``.
+
+    Each worker groups one contiguous range of rows and keeps every
+    group's field values in row order, so the parent only concatenates
+    them per group and aggregates; groups stay in first-appearance order
+    and results (float sums included) match the in-process operator.
+    """
+    workers = _workers(len(rows), min_rows, workers)
+    if not workers:
+        return spill_ops.group_aggregate(rows, group_by, field, agg_type, memory_bytes)
+    group_by = [group_by] if isinstance(group_by, str) else list(group_by)
+    start = time.perf_counter()
+    columns = [[row.get(c) for row in rows] for c in group_by]
+    if agg_type != "count":
+        columns.append([row.get(field, MISSING) for row in rows])
+    chunks, tasks = [], []
+    for lo, hi in _bounds(len(rows), workers * CHUNKS_PER_WORKER):
+        tasks.append((range(len(chunks), len(chunks) + len(columns)), (lo, len(group_by))))
+        chunks.extend(column[lo:hi] for column in columns)
+    stats = {"strategy": "process_pool_aggregate", "workers": workers}
+    parts = _run("group", chunks, tasks, workers, stats)
+    if parts is None:
+        return _fallback(stats, spill_ops.group_aggregate(rows, group_by, field, agg_type, memory_bytes))
+
+    merge_start = time.perf_counter()
+    groups = {}
+    for part in parts:
+        for key, seq, group_values, field_values, count in part:
+            group = groups.get(key)
+            if group is None:
+                groups[key] = [group_values, field_values, count]
+            else:
+                group[1].extend(field_values)
+                group[2] += count
+    result = []
+    for group_values, field_values, count in groups.values():
+        record = dict(zip(group_by, group_values))
+        record.update({"aggregation_type": agg_type, "field": field,
+                       "result": spill_ops.aggregate(field_values, agg_type, count)})
+        result.append(record)
+    stats["merge_ms"] = round((time.perf_counter() - merge_start) * 1000, 2)
+    stats["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return result, stats
+
+
+def join_datasets(datasets, join_key, join_type="inner", memory_bytes=spill_ops.MEMORY_BUDGET,
+                  min_rows=PARALLEL_MIN_ROWS, workers=None):
+    """``spill_ops.join_datasets`` across worker processes once the inputs reach ``min_rows``.
+
+    Only the join-key columns are shared. For ``left`` every worker
+    indexes the other datasets' keys and returns, for its range of the
+    first dataset, the position of each row's match; for ``inner`` each
+    worker returns the first row of every key in its range. The parent
+    builds the records from those positions, in the in-process order.
+    """
+    workers = _workers(sum(len(rows) for rows in datasets), min_rows, workers)
+    if not workers:
+        return spill_ops.join_datasets(datasets, join_key, join_type, memory_bytes)
+    start = time.perf_counter()
+    columns = [list(rows[0].keys()) if rows and isinstance(rows[0], dict) else [] for rows in datasets]
+    keys = [[row.get(join_key, MISSING) for row in rows] for rows in datasets]
+    stats = {"strategy": "process_pool_join", "workers": workers}
+    if join_type == "left":
+        # Build-side key columns first, then the base rows in one range per worker
+        chunks = keys[1:]
+        tasks = []
+        for lo, hi in _bounds(len(keys[0]), workers):
+            tasks.append(([len(chunks)] + list(range(len(keys) - 1)), None))
+            chunks.append(keys[0][lo:hi])
+    else:
+        chunks, tasks, offsets = [], [], []
+        seq = 0
+        for index, column in enumerate(keys):
+            for lo, hi in _bounds(len(column), workers * CHUNKS_PER_WORKER):
+                tasks.append(([len(chunks)], (seq + lo,)))
+                offsets.append((index, seq))
+                chunks.append(column[lo:hi])
+            seq += len(column)
+    parts = _run("probe" if join_type == "left" else "first", chunks, tasks, workers, stats)
+    if parts is None:
+        return _fallback(stats, spill_ops.join_datasets(datasets, join_key, join_type, memory_bytes))
+
+    merge_start = time.perf_counter()
+    prefixed = [dict() for _ in datasets]
+
+    def match(index, position):
+        record = prefixed[index].get(position)
+        if record is None:
+            record = prefixed[index][position] = spill_ops._prefixed(datasets[index][position], index, join_key)
+        return record
+
+    result = []
+    if join_type == "left":
+        positions = [array("q") for _ in datasets[1:]]
+        for part in parts:
+            for index, data in enumerate(part):
+                positions[index].frombytes(data)
+        nulls = [{f"dataset{index + 1}_{c}": None for c in columns[index] if c != join_key}
+                 for index in range(len(datasets))]
+        for row, found in zip(datasets[0], zip(*positions)):
+            record = dict(row)
+            for index, position in enumerate(found, 1):
+                record.update(nulls[index] if position < 0 else match(index, position))
+            result.append(record)
+    else:
+        first_match = [dict() for _ in datasets]   # per dataset: key -> position of its first row
+        first_seen = {}                           # key -> value of its first appearance
+        for (index, offset), part in zip(offsets, parts):
+            matches = first_match[index]
+            for key, seq, value in part:
+                if key not in matches:
+                    matches[key] = seq - offset
+                    first_seen.setdefault(key, value)
+        for key, value in first_seen.items():
+            record = {join_key: value}
+            for index in range(len(datasets)):
+                position = first_match[index].get(key)
+                if position is not None:
+                    record.update(match(index, position))
+            result.append(record)
+    stats["merge_ms"] = round((time.perf_counter() - merge_start) * 1000, 2)
+    stats["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return result, stats
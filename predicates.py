@@ -0,0 +1,430 @@
+# predicates.py - Filter expressions compiled to Python closures or pushed down as SQL
+import operator
+import re
+from collections import OrderedDict
+
+from sql_guard import tokenize
+
+PREDICATE_CACHE_SIZE = 256
+
+COMPARISONS = {
+    "=": operator.eq, "==": operator.eq, "!=": operator.ne, "<>": operator.ne,
+    "<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge
+}
+KEYWORDS = {"AND", "OR", "NOT", "IN", "BETWEEN", "IS", "NULL", "LIKE", "CONTAINS", "MATCHES",
+            "TRUE", "FALSE"}
+NUMERIC_TEXT = re.compile(r"[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?")
+
+
+class PredicateError(ValueError):
+    """Raised for an expression that does not parse."""
+
+# ========== PARSING ==========
+# Grammar (keywords are case-insensitive):
+#   expr       := and_expr (OR and_expr)*
+#   and_expr   := unary (AND unary)*
+#   unary      := NOT unary | '(' expr ')' | comparison
+#   comparison := field op value | field [NOT] IN (value, ...) | field [NOT] BETWEEN value AND value
+#               | field IS [NOT] NULL | field [NOT] LIKE 'pattern' | field [NOT] CONTAINS 'text'
+#               | field [NOT] MATCHES 'regex' | field ~ 'regex'
+#   value      := number | 'string' | TRUE | FALSE | NULL
+
+class _Parser:
+    def __init__(self, expression):
+        self.expression = expression
+        self.tokens = self._merge_operators(tokenize(expression))
+        self.pos = 0
+
+    @staticmethod
+    def _merge_operators(tokens):
+        """Join the single-character punctuation sql_guard yields into <=, >=, !=, <>, ==."""
+        merged = []
+        for kind, text in tokens:
+            if merged and kind == "punct" and merged[-1][0] == "punct" and merged[-1][1] + text in COMPARISONS:
+                merged[-1] = ("punct", merged[-1][1] + text)
+            else:
+                merged.append((kind, text))
+        return merged
+
+    def error(self, message):
+        return PredicateError(f"{message} in expression: {self.expression!r}")
+
+    def peek(self, offset=0):
+        index = self.pos + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def keyword(self, *words):
+        kind, text = self.peek()
+        if kind == "word" and text.upper() in words:
+            self.pos += 1
+            return text.upper()
+        return None
+
+    def expect(self, text):
+        if self.peek()[1] != text:
+            raise self.error(f"Expected {text!r}")
+        self.pos += 1
+
+    def parse(self):
+        if not self.tokens:
+            raise self.error("Empty filter")
+        node = self.parse_or()
+        if self.pos != len(self.tokens):
+            raise self.error(f"Unexpected {self.peek()[1]!r}")
+        return node
+
+    def parse_or(self):
+        nodes = [self.parse_and()]
+        while self.keyword("OR"):
+            nodes.append(self.parse_and())
+        return nodes[0] if len(nodes) == 1 else ("or", nodes)
+
+    def parse_and(self):
+        nodes = [self.parse_unary()]
+        while self.keyword("AND"):
+            nodes.append(self.parse_unary())
+        return nodes[0] if len(nodes) == 1 else ("and", nodes)
+
+    def parse_unary(self):
+        if self.keyword("NOT"):
+            return ("not", self.parse_unary())
+        if self.peek()[1] == "(":
+            self.pos += 1
+            node = self.parse_or()
+            self.expect(")")
+            return node
+        return self.parse_comparison()
+
+    def parse_field(self):
+        kind, text = self.peek()
+        if kind == "ident":
+            self.pos += 1
+            return text[1:-1].replace('""', '"') if text[0] == '"' else text[1:-1]
+        if kind == "word" and text.upper() not in KEYWORDS:
+            self.pos += 1
+            return text
+        raise self.error(f"Expected a field name, got {text!r}")
+
+    def parse_value(self):
+        kind, text = self.peek()
+        sign = 1
+        if text == "-" and self.peek(1)[0] == "number":
+            self.pos += 1
+            sign = -1
+            kind, text = self.peek()
+        self.pos += 1
+        if kind == "number":
+            return sign * (float(text) if "." in text else int(text))
+        if kind == "string":
+            return text[1:-1].replace("''", "'")
+        if kind == "word" and text.upper() in ("TRUE", "FALSE", "NULL"):
+            return {"TRUE": True, "FALSE": False, "NULL": None}[text.upper()]
+        raise self.error(f"Expected a value, got {text!r}")
+
+    def parse_comparison(self):
+        field = self.parse_field()
+        kind, text = self.peek()
+        if kind == "punct" and text in COMPARISONS:
+            self.pos += 1
+            value = self.parse_value()
+            if value is None:
+                # "= NULL" is never true in SQL; treat it as the null check people mean
+                return ("null", field, text in ("!=", "<>"))
+            return ("cmp", field, text, value)
+        if text == "~":
+            self.pos += 1
+            return ("regex", field, self._pattern(), False)
+        if self.keyword("IS"):
+            negated = bool(self.keyword("NOT"))
+            if not self.keyword("NULL"):
+                raise self.error("Expected NULL after IS")
+            return ("null", field, negated)
+        negated = bool(self.keyword("NOT"))
+        word = self.keyword("IN", "BETWEEN", "LIKE", "CONTAINS", "MATCHES")
+        if word == "IN":
+            self.expect("(")
+            values = [self.parse_value()]
+            while self.peek()[1] == ",":
+                self.pos += 1
+                values.append(self.parse_value())
+            self.expect(")")
+            return ("in", field, values, negated)
+        if word == "BETWEEN":
+            low = self.parse_value()
+            if not self.keyword("AND"):
+                raise self.error("Expected AND in BETWEEN")
+            return ("between", field, low, self.parse_value(), negated)
+        if word == "LIKE":
+            return ("like", field, self._pattern(), negated)
+        if word == "CONTAINS":
+            return ("contains", field, self._pattern(), negated)
+        if word == "MATCHES":
+            return ("regex", field, self._pattern(), negated)
+        raise self.error(f"Expected an operator after {field!r}")
+
+    def _pattern(self):
+        value = self.parse_value()
+        if not isinstance(value, str):
+            raise self.error("Expected a quoted pattern")
+        return value
+
+
+def parse(expression):
+    """Parse an expression into a tuple tree (see the grammar above)."""
+    return _Parser(expression).parse()
+
+# ========== PYTHON COMPILATION ==========
+# Closures return True, False or None (unknown, e.g. a missing field), with SQL's
+# three-valued AND/OR/NOT, so filtering in Python keeps the same rows as the SQL.
+
+def _coerce(value, like):
+    """``value`` converted to the type of the literal it is compared with (None if it cannot be)."""
+    if value is None:
+        return None
+    if isinstance(like, bool):
+        if isinstance(value, str):
+            lowered = value.strip().lower()
+            return True if lowered in ("true", "1", "yes") else False if lowered in ("false", "0", "no") else None
+        return bool(value)
+    if isinstance(like, (int, float)):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return value
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+    return value if isinstance(value, str) else str(value)
+
+
+def _as_number(literal):
+    """A quoted literal that reads as a number ('9', '-1.5') as that number; others unchanged.
+
+    SQLite gives such a literal the numeric affinity of the column it is
+    compared with, so ``age < '9'`` compares numbers there and must here too.
+    """
+    if isinstance(literal, str) and NUMERIC_TEXT.fullmatch(literal):
+        return float(literal) if any(c in literal for c in ".eE") else int(literal)
+    return literal
+
+
+def _like_regex(pattern):
+    """SQLite LIKE (case-insensitive, % and _) as a compiled regex."""
+    parts = ("." if ch == "_" else ".*" if ch == "%" else re.escape(ch) for ch in pattern)
+    return re.compile("".join(parts), re.S | re.I)
+
+
+def _compile(node):
+    kind = node[0]
+    if kind == "and":
+        tests = [_compile(child) for child in node[1]]
+
+        def test(row):
+            result = True
+            for child in tests:
+                value = child(row)
+                if value is False:
+                    return False
+                if value is None:
+                    result = None
+            return result
+        return test
+    if kind == "or":
+        tests = [_compile(child) for child in node[1]]
+
+        def test(row):
+            result = False
+            for child in tests:
+                value = child(row)
+                if value is True:
+                    return True
+                if value is None:
+                    result = None
+            return result
+        return test
+    if kind == "not":
+        inner = _compile(node[1])
+
+        def test(row):
+            value = inner(row)
+            return None if value is None else not value
+        return test
+
+    field = node[1]
+    if kind == "null":
+        negated = node[2]
+        return lambda row: (row.get(field) is not None) if negated else (row.get(field) is None)
+    if kind == "cmp":
+        compare, literal = COMPARISONS[node[2]], _as_number(node[3])
+
+        def test(row):
+            value = _coerce(row.get(field), literal)
+            return None if value is None else compare(value, literal)
+        return test
+    if kind == "in":
+        values, negated = [_as_number(v) for v in node[2]], node[3]
+        literals = [v for v in values if v is not None]
+        sample = literals[0] if literals else ""
+        members = set(literals)
+        has_null = len(literals) < len(values)
+
+        def test(row):
+            value = _coerce(row.get(field), sample)
+            if value is None:
+                return None
+            found = value in members
+            if not found and has_null:
+                return None
+            return found != negated
+        return test
+    if kind == "between":
+        low, high, negated = _as_number(node[2]), _as_number(node[3]), node[4]
+
+        def test(row):
+            value = _coerce(row.get(field), low)
+            return None if value is None else (low <= value <= high) != negated
+        return test
+    pattern, negated = node[2], node[3]
+    if kind == "contains":
+        def test(row):
+            value = row.get(field)
+            return None if value is None else (pattern in str(value)) != negated
+        return test
+    try:
+        regex = _like_regex(pattern) if kind == "like" else re.compile(pattern)
+    except re.error as e:
+        raise PredicateError(f"Invalid regex {pattern!r}: {e}") from e
+    match = regex.fullmatch if kind == "like" else regex.search
+
+    def test(row):
+        value = row.get(field)
+        return None if value is None else (match(str(value)) is not None) != negated
+    return test
+
+# ========== SQL PUSHDOWN ==========
+
+def quote_ident(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _bind(params, value):
+    """Placeholder for ``value``: ``?`` appended to a list, or a generated ``:_where_N`` in a dict."""
+    if isinstance(params, dict):
+        name = f"_where_{len(params)}"
+        params[name] = value
+        return f":{name}"
+    params.append(value)
+    return "?"
+
+
+def _sql(node, params):
+    kind = node[0]
+    if kind in ("and", "or"):
+        return "(" + f" {kind.upper()} ".join(_sql(child, params) for child in node[1]) + ")"
+    if kind == "not":
+        return f"NOT {_sql(node[1], params)}"
+    column = quote_ident(node[1])
+    if kind == "null":
+        return f"{column} IS {'NOT ' if node[2] else ''}NULL"
+    if kind == "cmp":
+        return f"{column} {'=' if node[2] == '==' else node[2]} {_bind(params, node[3])}"
+    if kind == "in":
+        marks = ", ".join(_bind(params, value) for value in node[2])
+        return f"{column} {'NOT ' if node[3] else ''}IN ({marks})"
+    if kind == "between":
+        low, high = _bind(params, node[2]), _bind(params, node[3])
+        return f"{column} {'NOT ' if node[4] else ''}BETWEEN {low} AND {high}"
+    mark = _bind(params, node[2])
+    negation = "NOT " if node[3] else ""
+    if kind == "like":
+        return f"{column} {negation}LIKE {mark}"
+    if kind == "contains":
+        return f"{negation}(instr({column}, {mark}) > 0)"
+    return f"{column} {negation}REGEXP {mark}"
+
+
+def _regexp(pattern, value):
+    return None if value is None else re.search(pattern, str(value)) is not None
+
+
+def install(conn):
+    """Register REGEXP (SQLite has the operator but no implementation) on ``conn``."""
+    conn.create_function("regexp", 2, _regexp, deterministic=True)
+
+# ========== COMPILED PREDICATES ==========
+
+class Predicate:
+    """A parsed expression: ``test(row)`` in Python, ``sql()`` for a WHERE clause."""
+
+    def __init__(self, expression, tree):
+        self.expression = expression
+        self.tree = tree
+        self._test = _compile(tree)
+        params = []
+        self.where = _sql(tree, params)
+        self.params = params
+
+    def test(self, row):
+        return self._test(row) is True
+
+    def filter(self, rows):
+        test = self._test
+        return [row for row in rows if test(row) is True]
+
+    def sql(self, named=False):
+        """(WHERE clause text, params): positional, or ``:_where_N`` names in a dict with ``named``.
+
+        Use ``named`` to combine the clause with a query that binds its own
+        parameters by name; SQLite cannot mix a dict with ``?`` placeholders.
+        """
+        if named:
+            params = {}
+            return _sql(self.tree, params), params
+        return self.where, list(self.params)
+
+
+class PredicateCache:
+    """LRU of compiled predicates keyed by expression text."""
+
+    def __init__(self, capacity=PREDICATE_CACHE_SIZE):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, expression):
+        predicate = self.entries.get(expression)
+        if predicate is not None:
+            self.entries.move_to_end(expression)
+            self.hits += 1
+            return predicate
+        self.misses += 1
+        predicate = self.entries[expression] = Predicate(expression, parse(expression))
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+        return predicate
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+PREDICATE_CACHE = PredicateCache()
+
+
+def compile_predicate(expression):
+    """Compiled predicate for ``expression``, parsed once per distinct text."""
+    return PREDICATE_CACHE.get(expression.strip())
+
+
+def from_condition(field, condition, value):
+    """Predicate for the legacy field/condition/value filter triple."""
+    if condition not in (">", "<", "=", "contains"):
+        raise PredicateError(f"Unknown condition: {condition}")
+    node = ("contains", field, str(value), False) if condition == "contains" else ("cmp", field, condition, value)
+    return Predicate(f"{field} {condition} {value!r}", node)
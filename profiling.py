@@ -0,0 +1,180 @@
+# profiling.py - Opt-in cProfile/tracemalloc capture for individual tool calls
+import cProfile
+import io
+import os
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+import uuid
+
+PROFILE_DIR = "profiles"
+TOP_FUNCTIONS = 10
+TRACE_FRAMES = 10
+KEEP_RECENT = 20
+
+
+class Profiler:
+    """Decides which tool calls to profile and captures them.
+
+    A call is profiled when it passes ``profile: true`` or, while profiling
+    is enabled, with probability ``sample_rate``. cProfile stats go to
+    ``<request id>.prof`` (load with ``pstats``/snakeviz) and, with memory
+    tracing on, a tracemalloc snapshot to ``<request id>.tracemalloc``.
+    One call is captured at a time: cProfile hooks a single thread and
+    tracemalloc is process-wide, so overlapping calls would blur together.
+    """
+
+    def __init__(self, directory=PROFILE_DIR, enabled=False, sample_rate=0.0, memory=False, top=TOP_FUNCTIONS):
+        self.directory = directory
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.memory = memory
+        self.top = top
+        self.profiled = 0
+        self.skipped_busy = 0
+        self.recent = []
+        self._busy = threading.Lock()
+        self._lock = threading.Lock()
+
+    def configure(self, enabled=None, sample_rate=None, memory=None, top=None, directory=None):
+        with self._lock:
+            if enabled is not None:
+                self.enabled = bool(enabled)
+            if sample_rate is not None:
+                if not 0.0 <= float(sample_rate) <= 1.0:
+                    raise ValueError("sample_rate must be between 0 and 1")
+                self.sample_rate = float(sample_rate)
+            if memory is not None:
+                self.memory = bool(memory)
+            if top is not None:
+                self.top = max(1, int(top))
+            if directory:
+                self.directory = directory
+        return self.stats()
+
+    def wants(self, arguments):
+        flag = arguments.get("profile") if isinstance(arguments, dict) else None
+        if flag is not None:
+            return bool(flag)
+        return self.enabled and self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def run(self, name, arguments, fn, request_id=None):
+        """``fn(name, arguments)``, profiled when selected; returns (result, summary or None)."""
+        if not self.wants(arguments):
+            return fn(name, arguments), None
+        if not self._busy.acquire(blocking=False):
+            self.skipped_busy += 1
+            return fn(name, arguments), {"skipped": "another call is being profiled"}
+        try:
+            return self._capture(name, arguments, fn, request_id)
+        finally:
+            self._busy.release()
+
+    def _capture(self, name, arguments, fn, request_id):
+        profile_id = f"{name}-{request_id if request_id is not None else 'local'}-{uuid.uuid4().hex[:8]}"
+        memory = self.memory or bool(arguments.get("profile_memory"))
+        # Someone else (e.g. PYTHONTRACEMALLOC) may already be tracing; leave their session alone
+        started_tracing = memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(TRACE_FRAMES)
+        if memory:
+            tracemalloc.reset_peak()
+            base_memory = tracemalloc.get_traced_memory()[0]
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            result = fn(name, arguments)
+        finally:
+            profiler.disable()
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            snapshot = None
+            if memory:
+                current, peak = tracemalloc.get_traced_memory()
+                snapshot = tracemalloc.take_snapshot()
+                if started_tracing:
+                    tracemalloc.stop()
+
+        os.makedirs(self.directory, exist_ok=True)
+        stats_path = os.path.join(self.directory, f"{profile_id}.prof")
+        profiler.dump_stats(stats_path)
+        summary = {
+            "request_id": profile_id,
+            "tool": name,
+            "elapsed_ms": round(elapsed_ms, 2),
+            "stats_file": stats_path,
+            "hot_functions": hot_functions(pstats.Stats(profiler), self.top)
+        }
+        if snapshot is not None:
+            snapshot_path = os.path.join(self.directory, f"{profile_id}.tracemalloc")
+            snapshot.dump(snapshot_path)
+            summary.update(
+                peak_memory_bytes=peak - base_memory,
+                retained_memory_bytes=current - base_memory,
+                snapshot_file=snapshot_path,
+                top_allocations=top_allocations(snapshot, self.top)
+            )
+        with self._lock:
+            self.profiled += 1
+            self.recent.append({k: summary[k] for k in ("request_id", "tool", "elapsed_ms", "stats_file")})
+            del self.recent[:-KEEP_RECENT]
+        return result, summary
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "memory": self.memory,
+            "top": self.top,
+            "directory": self.directory,
+            "profiled": self.profiled,
+            "skipped_busy": self.skipped_busy,
+            "recent": list(self.recent)
+        }
+
+
+def _label(func):
+    filename, line, function = func
+    if filename == "~":
+        # Built-ins such as {method 'execute' of 'sqlite3.Cursor' objects}
+        return function
+    return f"{os.path.basename(filename)}:{line}({function})"
+
+
+def hot_functions(stats, top=TOP_FUNCTIONS):
+    """Functions with the most self time, with their cumulative time and call counts."""
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:top]
+    return [
+        {
+            "function": _label(func),
+            "self_ms": round(tottime * 1000, 3),
+            "cumulative_ms": round(cumtime * 1000, 3),
+            "calls": ncalls
+        }
+        for func, (_, ncalls, tottime, cumtime, _) in rows
+    ]
+
+
+def top_allocations(snapshot, top=TOP_FUNCTIONS):
+    """Source lines holding the most memory at the end of the call."""
+    snapshot = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__)
+    ])
+    return [
+        {
+            "line": f"{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}",
+            "size_bytes": stat.size,
+            "blocks": stat.count
+        }
+        for stat in snapshot.statistics("lineno")[:top]
+    ]
+
+
+def format_stats(path, top=TOP_FUNCTIONS, sort="tottime"):
+    """Text report for a saved ``.prof`` file."""
+    out = io.StringIO()
+    pstats.Stats(path, stream=out).sort_stats(sort).print_stats(top)
+    return out.getvalue()
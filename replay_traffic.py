@@ -0,0 +1,276 @@
+# replay_traffic.py - Replay a captured MCP request log and compare latency and responses
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+from mcp.client.streamable_http import streamablehttp_client
+
+from load_test_http import percentile, wait_for_server
+from traffic_capture import REDACTED, digest, is_error, result_handles
+
+REPLAYED_METHODS = {"tools/call", "tools/list", "ping"}
+MAX_DIFFS_SHOWN = 5
+
+
+def load_log(path):
+    with open(path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    records.sort(key=lambda r: r["ts"])
+    if records:
+        first = records[0]["ts"]
+        for record in records:
+            record["offset_s"] = record["ts"] - first
+    return records
+
+
+def parse_speed(value):
+    """"max" (no pacing) or a multiple of the recorded rate such as 1, 2 or 10."""
+    if value == "max":
+        return None
+    speed = float(value.rstrip("x"))
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("speed must be positive or 'max'")
+    return speed
+
+
+def has_redacted(value):
+    if isinstance(value, dict):
+        return REDACTED in value or any(has_redacted(v) for v in value.values())
+    if isinstance(value, list):
+        return any(has_redacted(v) for v in value)
+    return False
+
+
+def remap(value, handles):
+    """Recorded result handles in arguments replaced by the ones this replay produced."""
+    if isinstance(value, str):
+        return handles.get(value, value)
+    if isinstance(value, dict):
+        return {k: remap(v, handles) for k, v in value.items()}
+    if isinstance(value, list):
+        return [remap(v, handles) for v in value]
+    return value
+
+
+class Replay:
+    """Sends recorded requests at the recorded pace (scaled by ``speed``) over ``concurrency`` workers.
+
+    Requests from one recorded session always go to the same worker, in
+    order, so calls that chain on a result handle still see it.
+    """
+
+    def __init__(self, records, speed=1.0, concurrency=8):
+        self.records = records
+        self.speed = speed
+        self.concurrency = max(1, concurrency)
+        self.handles = {}
+        self.latencies = {}
+        self.recorded_latencies = {}
+        self.errors = {}
+        self.diffs = []
+        self.skipped = {}
+        self.max_lag_ms = 0.0
+
+    def _skip(self, reason):
+        self.skipped[reason] = self.skipped.get(reason, 0) + 1
+
+    async def _send(self, session, record):
+        method = record["method"]
+        if method == "tools/list":
+            return "tools/list", await session.list_tools()
+        if method == "ping":
+            return "ping", await session.send_ping()
+        params = record["params"]
+        arguments = remap(params.get("arguments") or {}, self.handles)
+        return params["name"], await session.call_tool(params["name"], arguments)
+
+    async def _worker(self, session, queue):
+        while True:
+            record = await queue.get()
+            if record is None:
+                return
+            started = time.perf_counter()
+            try:
+                label, result = await self._send(session, record)
+            except Exception as e:
+                label = record["params"].get("name", record["method"])
+                self.errors.setdefault(label, []).append(f"{type(e).__name__}: {e}")
+                continue
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.latencies.setdefault(label, []).append(elapsed_ms)
+            self.recorded_latencies.setdefault(label, []).append(record["elapsed_ms"])
+            response = result.model_dump(mode="json", by_alias=True, exclude_none=True) if result else {}
+            if is_error(response):
+                self.errors.setdefault(label, []).append(json.dumps(response)[:200])
+            recorded = record.get("response")
+            if recorded is None:
+                continue
+            for old, new in zip(recorded["handles"], result_handles(response)):
+                self.handles[old] = new
+            if digest(response) != recorded["digest"]:
+                self.diffs.append({
+                    "tool": label,
+                    "offset_s": round(record["offset_s"], 3),
+                    "arguments": record["params"].get("arguments"),
+                    "recorded_error": recorded["is_error"],
+                    "replay_error": is_error(response),
+                    "replay_response": json.dumps(response)[:300]
+                })
+
+    async def run(self, sessions):
+        queues = [asyncio.Queue() for _ in range(self.concurrency)]
+        workers = [
+            asyncio.create_task(self._worker(sessions[i % len(sessions)], queue))
+            for i, queue in enumerate(queues)
+        ]
+        routes = {}
+        start = time.perf_counter()
+        for record in self.records:
+            if record["method"] not in REPLAYED_METHODS:
+                self._skip(record["method"])
+                continue
+            if record["method"] == "tools/call" and has_redacted(record["params"].get("arguments")):
+                self._skip("redacted arguments")
+                continue
+            if self.speed:
+                due = record["offset_s"] / self.speed
+                delay = due - (time.perf_counter() - start)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    self.max_lag_ms = max(self.max_lag_ms, -delay * 1000)
+            route = routes.setdefault(record.get("session"), len(routes) % self.concurrency)
+            queues[route].put_nowait(record)
+        for queue in queues:
+            queue.put_nowait(None)
+        await asyncio.gather(*workers)
+        return time.perf_counter() - start
+
+    def report(self, elapsed):
+        tools = {}
+        for label, values in sorted(self.latencies.items()):
+            recorded = self.recorded_latencies[label]
+            tools[label] = {
+                "calls": len(values),
+                "errors": len(self.errors.get(label, [])),
+                "p50_ms": round(percentile(values, 50), 2),
+                "p95_ms": round(percentile(values, 95), 2),
+                "p99_ms": round(percentile(values, 99), 2),
+                "mean_ms": round(statistics.mean(values), 2),
+                "recorded_p50_ms": round(percentile(recorded, 50), 2),
+                "recorded_p95_ms": round(percentile(recorded, 95), 2)
+            }
+        for label, errors in self.errors.items():
+            tools.setdefault(label, {"calls": 0, "errors": len(errors)})
+        replayed = sum(len(v) for v in self.latencies.values())
+        return {
+            "replayed": replayed,
+            "elapsed_s": round(elapsed, 3),
+            "calls_per_sec": round(replayed / elapsed, 1) if elapsed else None,
+            "max_schedule_lag_ms": round(self.max_lag_ms, 1),
+            "skipped": self.skipped,
+            "tools": tools,
+            "response_diffs": len(self.diffs),
+            "diffs": self.diffs
+        }
+
+
+@contextlib.asynccontextmanager
+async def open_sessions(url, count):
+    """``count`` MCP sessions against ``url``, or one shared stdio session when url is None."""
+    async with contextlib.AsyncExitStack() as stack:
+        sessions = []
+        if url is None:
+            # One stdio server; JSON-RPC lets the workers' calls overlap on a single session
+            params = StdioServerParameters(command=sys.executable, args=["server_challenge2.py"], env=dict(os.environ))
+            read, write = await stack.enter_async_context(stdio_client(params, errlog=open(os.devnull, "w")))
+            count = 1
+        for _ in range(count):
+            if url is not None:
+                read, write, _ = await stack.enter_async_context(streamablehttp_client(f"{url}/mcp", timeout=60))
+            session = await stack.enter_async_context(ClientSession(read, write))
+            await session.initialize()
+            sessions.append(session)
+        yield sessions
+
+
+async def replay(records, url, speed, concurrency):
+    runner = Replay(records, speed, concurrency)
+    async with open_sessions(url, concurrency) as sessions:
+        elapsed = await runner.run(sessions)
+    return runner.report(elapsed)
+
+
+def print_report(report, speed):
+    print(f"🧪 Replayed {report['replayed']:,} requests at {'max speed' if speed is None else f'{speed:g}x'} "
+          f"in {report['elapsed_s']:.1f} s ({report['calls_per_sec']} calls/sec)")
+    print("=" * 70)
+    print(f"{'tool':<20} {'calls':>6} {'err':>4} {'p50':>9} {'p95':>9} {'p99':>9} {'rec p50':>9} {'rec p95':>9}")
+    for label, stats in report["tools"].items():
+        if not stats["calls"]:
+            print(f"{label:<20} {0:>6} {stats['errors']:>4}")
+            continue
+        print(f"{label:<20} {stats['calls']:>6} {stats['errors']:>4} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} "
+              f"{stats['p99_ms']:>9.2f} {stats['recorded_p50_ms']:>9.2f} {stats['recorded_p95_ms']:>9.2f}")
+    print("(rec = server-side handler time recorded at capture; replay times are measured by the client)")
+    if report["skipped"]:
+        print(f"Skipped: {report['skipped']}")
+    if speed is not None:
+        print(f"Max schedule lag: {report['max_schedule_lag_ms']} ms")
+    print(f"Response differences: {report['response_diffs']}")
+    for diff in report["diffs"][:MAX_DIFFS_SHOWN]:
+        print(f"  ❌ {diff['tool']} at +{diff['offset_s']}s {json.dumps(diff['arguments'])[:120]}")
+        print(f"     replay: {diff['replay_response'][:200]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay an NDJSON log written by server_challenge2.py --capture")
+    parser.add_argument("log", help="capture file (NDJSON)")
+    parser.add_argument("--speed", type=parse_speed, default=1.0, help="1, 2x, 10x ... or max (default: 1)")
+    parser.add_argument("--concurrency", type=int, default=8, help="parallel workers / HTTP sessions")
+    parser.add_argument("--transport", choices=["http", "stdio"], default="http")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--url", help="use an already running HTTP server instead of starting one")
+    parser.add_argument("--json", help="also write the full report to this file")
+    parser.add_argument("--fail-on-diff", action="store_true", help="exit 1 when any response differs")
+    args = parser.parse_args()
+
+    records = load_log(args.log)
+    server = None
+    url = args.url
+    if args.transport == "http" and not url:
+        url = f"http://127.0.0.1:{args.port}"
+        # Replays must not be throttled by per-session limits sized for interactive clients
+        env = {**os.environ, "SESSION_RATE_LIMIT": os.environ.get("SESSION_RATE_LIMIT", "100000"),
+               "SESSION_BURST": os.environ.get("SESSION_BURST", "100000")}
+        server = subprocess.Popen(
+            [sys.executable, "server_challenge2.py", "--transport", "http", "--port", str(args.port)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env
+        )
+    try:
+        if url:
+            wait_for_server(url)
+        report = asyncio.run(replay(records, url if args.transport == "http" else None, args.speed, args.concurrency))
+    finally:
+        if server:
+            server.terminate()
+            server.wait(timeout=10)
+    print_report(report, args.speed)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    failed = args.fail_on_diff and report["response_diffs"] > 0
+    print("✅ Replay finished" if not failed else "❌ Replay had differences or errors")
+    return 0 if not failed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
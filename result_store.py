@@ -0,0 +1,249 @@
+# result_store.py - Server-side result sets referenced by handle between tool calls
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+MAX_MEMORY_BYTES = 256 * 1024 * 1024
+MAX_DISK_BYTES = 2 * 1024 * 1024 * 1024
+TTL_SECONDS = 30 * 60
+SIZE_SAMPLE = 100
+SPILL_CHUNK_ROWS = 1000        # rows per pickle in a spill file, so a page reads one or two
+
+
+class ResultNotFound(KeyError):
+    """Raised for an unknown or expired result handle."""
+
+    def __str__(self):
+        return self.args[0] if self.args else "Unknown result handle"
+
+
+def estimate_size(rows):
+    """Approximate in-memory size of a list of row dicts (sampled for large results)."""
+    if not rows:
+        return sys.getsizeof(rows)
+    sample = rows[:SIZE_SAMPLE]
+    per_row = sum(
+        sys.getsizeof(row) + sum(sys.getsizeof(v) for v in (row.values() if isinstance(row, dict) else row))
+        for row in sample
+    ) / len(sample)
+    return int(sys.getsizeof(rows) + per_row * len(rows))
+
+
+class ResultStore:
+    """Bounded store of result sets with TTL expiry.
+
+    Entries live in memory until the memory budget is exceeded, then the
+    least recently used ones are pickled to ``spill_dir`` in chunks of
+    ``SPILL_CHUNK_ROWS`` with an index of their file offsets, so a page reads
+    only the chunks it covers; the oldest spilled entries are dropped once the
+    disk budget is exceeded. Each access extends the entry's TTL.
+    """
+
+    def __init__(self, max_memory_bytes=MAX_MEMORY_BYTES, max_disk_bytes=MAX_DISK_BYTES,
+                 ttl_seconds=TTL_SECONDS, spill_dir=None):
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl_seconds = ttl_seconds
+        self.spill_dir = spill_dir
+        self.entries = OrderedDict()   # handle -> entry dict, least recently used first
+        self.memory_bytes = 0
+        self.disk_bytes = 0
+        self.spills = 0
+        self.expired = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+
+    def _spill_path(self, handle):
+        if self.spill_dir is None:
+            self.spill_dir = tempfile.mkdtemp(prefix="mcp-results-")
+        os.makedirs(self.spill_dir, exist_ok=True)
+        return os.path.join(self.spill_dir, f"{handle}.pkl")
+
+    def put(self, rows, meta=None):
+        """Store ``rows`` and return a new handle."""
+        rows = list(rows)
+        handle = f"res_{uuid.uuid4().hex[:16]}"
+        columns = list(rows[0].keys()) if rows and isinstance(rows[0], dict) else []
+        entry = {
+            "handle": handle, "rows": rows, "row_count": len(rows), "columns": columns,
+            "size": estimate_size(rows), "meta": meta or {}, "location": "memory",
+            "path": None, "created": time.time(), "expires": time.time() + self.ttl_seconds
+        }
+        with self._lock:
+            self._purge_expired()
+            self.entries[handle] = entry
+            self.memory_bytes += entry["size"]
+            self._enforce_budgets()
+        return handle
+
+    def get(self, handle):
+        """Return the rows for ``handle`` (read back from disk if spilled)."""
+        return self._rows(handle, 0, None)
+
+    def page(self, handle, offset=0, limit=100):
+        """Rows ``offset`` to ``offset + limit``; a spilled result reads only those chunks."""
+        return self._rows(handle, offset, offset + limit)
+
+    def _rows(self, handle, start, stop):
+        with self._lock:
+            entry = self._entry(handle)
+            if entry["location"] == "memory":
+                return entry["rows"][start:stop]
+            path, offsets, chunk = entry["path"], entry["offsets"], entry["chunk_rows"]
+        first = start // chunk
+        last = len(offsets) if stop is None else min(len(offsets), -(-stop // chunk))
+        rows = []
+        try:
+            with open(path, "rb") as f:
+                if first < last:
+                    f.seek(offsets[first])
+                for _ in range(first, last):
+                    rows.extend(pickle.load(f))
+        except FileNotFoundError:
+            # Dropped or evicted while we were reading
+            raise ResultNotFound(f"Unknown or expired result handle: {handle}")
+        skip = start - first * chunk
+        return rows[skip:None if stop is None else stop - first * chunk]
+
+    def describe(self, handle):
+        with self._lock:
+            entry = self._entry(handle)
+            return self._public(entry)
+
+    def drop(self, handle):
+        with self._lock:
+            entry = self.entries.pop(handle, None)
+            if entry is None:
+                raise ResultNotFound(f"Unknown result handle: {handle}")
+            self._release(entry)
+
+    def stats(self):
+        with self._lock:
+            self._purge_expired()
+            in_memory = sum(1 for e in self.entries.values() if e["location"] == "memory")
+            return {
+                "handles": len(self.entries),
+                "in_memory": in_memory,
+                "on_disk": len(self.entries) - in_memory,
+                "memory_bytes": self.memory_bytes,
+                "max_memory_bytes": self.max_memory_bytes,
+                "disk_bytes": self.disk_bytes,
+                "max_disk_bytes": self.max_disk_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "spills": self.spills,
+                "expired": self.expired,
+                "evicted": self.evicted
+            }
+
+    def export(self, max_bytes=None):
+        """Memory-resident entries, most recently used first, up to ``max_bytes`` of rows."""
+        with self._lock:
+            self._purge_expired()
+            exported, total = [], 0
+            for entry in reversed(self.entries.values()):
+                if entry["location"] != "memory":
+                    continue
+                if max_bytes is not None and total + entry["size"] > max_bytes:
+                    break
+                total += entry["size"]
+                exported.append({k: entry[k] for k in ("handle", "rows", "meta", "created", "expires")})
+            return exported
+
+    def restore(self, entries):
+        """Re-add exported entries under their original handles; returns how many were kept."""
+        now = time.time()
+        restored = 0
+        with self._lock:
+            # Oldest first so the most recently used end up at the LRU tail again
+            for item in reversed(entries):
+                if item["expires"] <= now or item["handle"] in self.entries:
+                    continue
+                rows = item["rows"]
+                self.entries[item["handle"]] = {
+                    "handle": item["handle"], "rows": rows, "row_count": len(rows),
+                    "columns": list(rows[0].keys()) if rows and isinstance(rows[0], dict) else [],
+                    "size": estimate_size(rows), "meta": item["meta"], "location": "memory",
+                    "path": None, "created": item["created"], "expires": item["expires"]
+                }
+                self.memory_bytes += self.entries[item["handle"]]["size"]
+                restored += 1
+            self._enforce_budgets()
+        return restored
+
+    def close(self):
+        """Forget every result and remove spill files."""
+        with self._lock:
+            self.entries.clear()
+            self.memory_bytes = self.disk_bytes = 0
+            if self.spill_dir and os.path.isdir(self.spill_dir):
+                shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+    # Callers below hold the lock
+
+    def _entry(self, handle):
+        self._purge_expired()
+        entry = self.entries.get(handle)
+        if entry is None:
+            raise ResultNotFound(f"Unknown or expired result handle: {handle}")
+        entry["expires"] = time.time() + self.ttl_seconds
+        self.entries.move_to_end(handle)
+        return entry
+
+    def _public(self, entry):
+        return {
+            "handle": entry["handle"],
+            "row_count": entry["row_count"],
+            "columns": entry["columns"],
+            "size_bytes": entry["size"],
+            "location": entry["location"],
+            "expires_in_s": round(entry["expires"] - time.time(), 1),
+            **entry["meta"]
+        }
+
+    def _release(self, entry):
+        if entry["location"] == "memory":
+            self.memory_bytes -= entry["size"]
+        else:
+            self.disk_bytes -= entry["disk_size"]
+            try:
+                os.remove(entry["path"])
+            except OSError:
+                pass
+
+    def _purge_expired(self):
+        now = time.time()
+        for handle in [h for h, e in self.entries.items() if e["expires"] <= now]:
+            self._release(self.entries.pop(handle))
+            self.expired += 1
+
+    def _enforce_budgets(self):
+        for entry in list(self.entries.values()):
+            if self.memory_bytes <= self.max_memory_bytes:
+                break
+            if entry["location"] == "memory":
+                self._spill(entry)
+        for handle, entry in list(self.entries.items()):
+            if self.disk_bytes <= self.max_disk_bytes:
+                break
+            if entry["location"] == "disk":
+                self._release(self.entries.pop(handle))
+                self.evicted += 1
+
+    def _spill(self, entry):
+        path = self._spill_path(entry["handle"])
+        rows, offsets = entry["rows"], []
+        with open(path, "wb") as f:
+            for i in range(0, len(rows), SPILL_CHUNK_ROWS):
+                offsets.append(f.tell())
+                pickle.dump(rows[i:i + SPILL_CHUNK_ROWS], f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.memory_bytes -= entry["size"]
+        entry.update(rows=None, location="disk", path=path, disk_size=os.path.getsize(path),
+                     offsets=offsets, chunk_rows=SPILL_CHUNK_ROWS)
+        self.disk_bytes += entry["disk_size"]
+        self.spills += 1
@@ -0,0 +1,376 @@
+# search_index.py - SQLite FTS5 search indexes over table columns and data files
+import json
+import os
+import re
+import sqlite3
+import time
+
+import bulk_ingest
+
+CATALOG_TABLE = "_search_catalog"
+INDEX_PREFIX = "_fts_"
+FILE_TABLE_PREFIX = "_file_"
+IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+DEFAULT_PAGE = 20
+MAX_PAGE = 1000
+RANK_CANDIDATES = 2000      # matches scored by BM25 before the best page is picked
+INSERT_BATCH = 10_000
+
+# keyword: word tokens (case/diacritic-insensitive, prefix queries with *);
+# substring: trigrams, so any 3+ character fragment (e.g. of an email) is indexed
+TOKENIZERS = {"keyword": "unicode61 remove_diacritics 2", "substring": "trigram"}
+TEXT_TYPES = ("CHAR", "CLOB", "TEXT")
+
+
+class SearchError(ValueError):
+    """Raised for an unknown index, bad definition or unusable query."""
+
+
+def _ident(name):
+    if not isinstance(name, str) or not IDENTIFIER.match(name):
+        raise SearchError(f"Invalid identifier: {name!r}")
+    return name
+
+
+def _quote(column):
+    """Column name as a quoted SQL identifier; file headers such as ``product name`` are kept as-is."""
+    if not isinstance(column, str) or not column:
+        raise SearchError(f"Invalid column name: {column!r}")
+    return '"' + column.replace('"', '""') + '"'
+
+
+def _columns(conn, table):
+    return [(row[1], (row[2] or "").upper()) for row in conn.execute(f'PRAGMA table_info("{table}")')]
+
+
+def ensure_catalog(conn):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {CATALOG_TABLE} (
+            name TEXT PRIMARY KEY,
+            source TEXT NOT NULL,
+            content_table TEXT NOT NULL,
+            columns TEXT NOT NULL,
+            mode TEXT NOT NULL,
+            file_version TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def index_table(name):
+    return f"{INDEX_PREFIX}{name}"
+
+# ========== FILE SOURCES ==========
+
+def _file_version(path):
+    stat = os.stat(path)
+    return f"{stat.st_size}|{stat.st_mtime_ns}"
+
+
+def _materialize_file(conn, path, table):
+    """Load a CSV/NDJSON/JSON file into ``table`` (replacing it); return {column: type}."""
+    rows, _, _ = bulk_ingest.open_source(path)
+    first = next(rows, None)
+    if first is None:
+        raise SearchError(f"{path} has no rows")
+    columns = list(first)
+    conn.execute(f'DROP TABLE IF EXISTS "{table}"')
+    column_list = ", ".join(_quote(c) for c in columns)
+    conn.execute(f'CREATE TABLE "{table}" ({column_list})')
+    insert = f'INSERT INTO "{table}" VALUES ({", ".join("?" * len(columns))})'
+
+    def values(row):
+        return tuple(v if v is None or isinstance(v, (int, float, str)) else json.dumps(v)
+                     for v in (row.get(c) for c in columns))
+
+    batch = [values(first)]
+    for row in rows:
+        batch.append(values(row))
+        if len(batch) >= INSERT_BATCH:
+            conn.executemany(insert, batch)
+            batch = []
+    conn.executemany(insert, batch)
+    return {c: "TEXT" if isinstance(first.get(c), str) else "NUMERIC" for c in columns}
+
+# ========== MANAGEMENT ==========
+
+def _drop_objects(conn, name, content_table=None):
+    fts = index_table(name)
+    for suffix in ("ai", "ad", "au"):
+        conn.execute(f'DROP TRIGGER IF EXISTS "{fts}__{suffix}"')
+    conn.execute(f'DROP TABLE IF EXISTS "{fts}"')
+    if content_table and content_table.startswith(FILE_TABLE_PREFIX):
+        conn.execute(f'DROP TABLE IF EXISTS "{content_table}"')
+
+
+def create_index(conn, name=None, source=None, columns=None, mode="keyword", replace=False):
+    """Build an FTS5 index over text columns of a table or a data file and keep it in sync.
+
+    Table sources get AFTER INSERT/UPDATE/DELETE triggers that mirror each
+    change into the index. File sources are materialized into a
+    ``_file_<name>`` table and rebuilt when the file changes on disk.
+    The whole build runs in one transaction, so a failed rebuild leaves
+    the previous index, content table and catalog entry in place.
+    """
+    ensure_catalog(conn)
+    if not source:
+        raise SearchError("A source table or file is required")
+    if mode not in TOKENIZERS:
+        raise SearchError(f"Unknown mode: {mode} (use {', '.join(TOKENIZERS)})")
+    is_file = os.path.splitext(source)[1].lower().lstrip(".") in bulk_ingest.READERS
+    name = _ident(name or re.sub(r"\W", "_", os.path.splitext(os.path.basename(source))[0]))
+    exists = conn.execute(f"SELECT content_table FROM {CATALOG_TABLE} WHERE name = ?", (name,)).fetchone()
+    if exists and not replace:
+        raise SearchError(f"Search index {name} already exists")
+
+    if is_file and not os.path.exists(source):
+        raise SearchError(f"File not found: {source}")
+
+    fts = index_table(name)
+    if conn.in_transaction:
+        conn.commit()
+    # sqlite3 opens no implicit transaction for DDL, so without BEGIN each drop would commit
+    conn.execute("BEGIN")
+    try:
+        if is_file:
+            # Loaded into a staging table that replaces the old content table once it is complete
+            content = f"{FILE_TABLE_PREFIX}{name}"
+            staging = f"{content}__staging"
+            version = _file_version(source)
+            available = _materialize_file(conn, source, staging)
+        else:
+            content = _ident(source)
+            version = None
+            available = dict(_columns(conn, content))
+            if not available:
+                raise SearchError(f"Unknown table: {content}")
+        if columns:
+            missing = [c for c in columns if c not in available]
+            if missing:
+                raise SearchError(f"Unknown column(s) in {source}: {', '.join(missing)}")
+        else:
+            columns = [c for c, kind in available.items() if any(t in kind for t in TEXT_TYPES) or not kind]
+            if not columns:
+                raise SearchError(f"{source} has no text columns; pass columns explicitly")
+        _drop_objects(conn, name, exists[0] if exists else None)
+        if is_file:
+            conn.execute(f'ALTER TABLE "{staging}" RENAME TO "{content}"')
+        column_list = ", ".join(_quote(c) for c in columns)
+        new_values = ", ".join(f"NEW.{_quote(c)}" for c in columns)
+        old_values = ", ".join(f"OLD.{_quote(c)}" for c in columns)
+        conn.execute(
+            f'CREATE VIRTUAL TABLE "{fts}" USING fts5({column_list}, content="{content}", '
+            f"content_rowid='rowid', tokenize='{TOKENIZERS[mode]}')"
+        )
+        conn.execute(f"""
+            CREATE TRIGGER "{fts}__ai" AFTER INSERT ON "{content}" BEGIN
+                INSERT INTO "{fts}" (rowid, {column_list}) VALUES (NEW.rowid, {new_values});
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER "{fts}__ad" AFTER DELETE ON "{content}" BEGIN
+                INSERT INTO "{fts}" ("{fts}", rowid, {column_list}) VALUES ('delete', OLD.rowid, {old_values});
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER "{fts}__au" AFTER UPDATE ON "{content}" BEGIN
+                INSERT INTO "{fts}" ("{fts}", rowid, {column_list}) VALUES ('delete', OLD.rowid, {old_values});
+                INSERT INTO "{fts}" (rowid, {column_list}) VALUES (NEW.rowid, {new_values});
+            END
+        """)
+        conn.execute(f"""INSERT INTO "{fts}" ("{fts}") VALUES ('rebuild')""")
+        conn.execute(
+            f"INSERT OR REPLACE INTO {CATALOG_TABLE} (name, source, content_table, columns, mode, file_version) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (name, source, content, json.dumps(columns), mode, version)
+        )
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return describe_index(conn, name)
+
+
+def get_index(conn, name):
+    ensure_catalog(conn)
+    row = conn.execute(
+        f"SELECT name, source, content_table, columns, mode, file_version FROM {CATALOG_TABLE} WHERE name = ?",
+        (name,)
+    ).fetchone()
+    if not row:
+        raise SearchError(f"Unknown search index: {name}")
+    return {"name": row[0], "source": row[1], "content_table": row[2], "columns": json.loads(row[3]),
+            "mode": row[4], "file_version": row[5]}
+
+
+def refresh_index(conn, name, force=False):
+    """Rebuild a file index whose file changed (or any index with ``force``); return True if rebuilt.
+
+    A file that is gone keeps serving its last materialized copy until the
+    index is dropped; a forced refresh reports the missing file.
+    """
+    index = get_index(conn, name)
+    if index["file_version"] is None:
+        if force:
+            with conn:
+                fts = index_table(name)
+                conn.execute(f"""INSERT INTO "{fts}" ("{fts}") VALUES ('rebuild')""")
+        return force
+    if not force and (not os.path.exists(index["source"])
+                      or _file_version(index["source"]) == index["file_version"]):
+        return False
+    create_index(conn, name, index["source"], index["columns"], index["mode"], replace=True)
+    return True
+
+
+def drop_index(conn, name):
+    index = get_index(conn, name)
+    with conn:
+        _drop_objects(conn, name, index["content_table"])
+        conn.execute(f"DELETE FROM {CATALOG_TABLE} WHERE name = ?", (name,))
+
+
+def describe_index(conn, name):
+    index = get_index(conn, name)
+    try:
+        rows = conn.execute(f'SELECT COUNT(*) FROM "{index["content_table"]}"').fetchone()[0]
+    except sqlite3.OperationalError as e:
+        # e.g. a catalog entry left behind by an older build; listing must not fail for every client
+        return {**index, "index_table": index_table(name), "rows": None, "error": f"{e}; drop or recreate it"}
+    return {**index, "index_table": index_table(name), "rows": rows}
+
+
+def list_indexes(conn):
+    if not conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (CATALOG_TABLE,)
+    ).fetchone():
+        return []
+    names = [r[0] for r in conn.execute(f"SELECT name FROM {CATALOG_TABLE} ORDER BY name")]
+    return [describe_index(conn, name) for name in names]
+
+# ========== SEARCH ==========
+
+def match_expression(query, mode, columns=None, raw=False):
+    """FTS5 MATCH text for a user query: every keyword must appear (``word*`` = prefix).
+
+    In substring mode the whole query is one quoted fragment. ``raw`` passes
+    FTS5 query syntax through unchanged.
+    """
+    if raw:
+        expression = query
+    elif mode == "substring":
+        expression = '"' + query.replace('"', '""') + '"'
+    else:
+        terms = re.findall(r"\w+\*?", query)
+        if not terms:
+            raise SearchError(f"No searchable terms in {query!r}")
+        expression = " ".join(
+            f'"{term[:-1]}"*' if term.endswith("*") else f'"{term}"' for term in terms
+        )
+    if columns:
+        expression = "{" + " ".join(_quote(c) for c in columns) + "} : (" + expression + ")"
+    return expression
+
+
+def _snippet(record, columns, terms, width=80):
+    """First indexed value containing a query term, with matches in [brackets]."""
+    if not terms:
+        return None
+    pattern = re.compile("|".join(re.escape(t) for t in sorted(terms, key=len, reverse=True)), re.I)
+    for column in columns:
+        value = record.get(column)
+        if not isinstance(value, str):
+            continue
+        found = pattern.search(value)
+        if found:
+            start = max(0, found.start() - width // 2)
+            text = value[start:start + width]
+            return ("…" if start else "") + pattern.sub(lambda m: f"[{m.group()}]", text) + \
+                ("…" if start + width < len(value) else "")
+    return None
+
+
+def search(conn, name, query, limit=DEFAULT_PAGE, offset=0, columns=None, raw=False, refresh=True,
+           rank_candidates=RANK_CANDIDATES):
+    """Ranked (BM25) page of rows matching ``query``, with a highlighted snippet per row.
+
+    Ranking scores every candidate, so for very common terms only the first
+    ``rank_candidates`` matches are ranked (0 ranks all of them); the
+    response says whether ranking was exhaustive. Rows are then fetched
+    by rowid for the page alone.
+    """
+    if refresh:
+        refresh_index(conn, name)
+    index = get_index(conn, name)
+    if not query or not query.strip():
+        raise SearchError("A search query is required")
+    limit = max(1, min(int(limit), MAX_PAGE))
+    offset = max(0, int(offset))
+    for column in columns or []:
+        if column not in index["columns"]:
+            raise SearchError(f"{column} is not indexed by {name}")
+    fts = index_table(name)
+    targets = columns or index["columns"]
+    start = time.perf_counter()
+    exhaustive = True
+    if index["mode"] == "substring" and len(query.strip()) < 3 and not raw:
+        # Trigrams need 3+ characters; shorter fragments fall back to a LIKE over the index
+        where = " OR ".join(f"{_quote(c)} LIKE ?" for c in targets)
+        params = [f"%{query.strip()}%"] * len(targets)
+        sql = f'SELECT rowid, NULL FROM "{fts}" WHERE {where} ORDER BY rowid LIMIT ? OFFSET ?'
+        strategy = "fts5_like"
+    elif index["mode"] == "substring" and not raw:
+        # BM25 means little for trigrams; rowid order lets FTS5 stop after one page
+        params = [match_expression(query, "substring", columns)]
+        sql = f'SELECT rowid, NULL FROM "{fts}" WHERE "{fts}" MATCH ? ORDER BY rowid LIMIT ? OFFSET ?'
+        strategy = "fts5_match"
+    else:
+        params = [match_expression(query, index["mode"], columns, raw)]
+        strategy = "fts5_match"
+        if rank_candidates:
+            candidates = conn.execute(
+                f'SELECT COUNT(*) FROM (SELECT rowid FROM "{fts}" WHERE "{fts}" MATCH ? LIMIT ?)',
+                [*params, rank_candidates + 1]
+            ).fetchone()[0]
+            exhaustive = candidates <= rank_candidates
+        if exhaustive:
+            sql = f'SELECT rowid, -rank FROM "{fts}" WHERE "{fts}" MATCH ? ORDER BY rank LIMIT ? OFFSET ?'
+        else:
+            sql = (f'SELECT rowid, -rank FROM (SELECT rowid, rank FROM "{fts}" WHERE "{fts}" MATCH ? LIMIT ?) '
+                   "ORDER BY rank LIMIT ? OFFSET ?")
+            params.append(rank_candidates)
+    hits = conn.execute(sql, [*params, limit + 1, offset]).fetchall()[:limit + 1]
+    page = hits[:limit]
+    records = {}
+    if page:
+        cursor = conn.execute(
+            f'SELECT rowid AS _rowid, * FROM "{index["content_table"]}" '
+            f'WHERE rowid IN ({", ".join("?" * len(page))})',
+            [rowid for rowid, _ in page]
+        )
+        names = [d[0] for d in cursor.description]
+        records = {row[0]: dict(zip(names, row)) for row in cursor}
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    terms = [query.strip()] if index["mode"] == "substring" else [t.rstrip("*") for t in re.findall(r"\w+\*?", query)]
+    results = []
+    for rowid, score in page:
+        record = records.get(rowid)
+        if record is None:
+            continue
+        record.pop("_rowid")
+        record["_score"] = round(score, 4) if score is not None else None
+        record["_snippet"] = _snippet(record, targets, terms)
+        results.append(record)
+    return {
+        "index": name,
+        "query": query,
+        "match": params[0] if strategy == "fts5_match" else None,
+        "results": results,
+        "offset": offset,
+        "row_count": len(results),
+        "has_more": len(hits) > limit,
+        "next_offset": offset + limit if len(hits) > limit else None,
+        "strategy": strategy,
+        "ranking": "exhaustive" if exhaustive else f"first {rank_candidates} matches",
+        "elapsed_ms": round(elapsed_ms, 3)
+    }
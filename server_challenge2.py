@@ -1,6 +1,9 @@
 # server_challenge2.py - Clean working version
+import argparse
 import asyncio
+import atexit
 import sys
+import threading
 import json
 import os
 import sqlite3
@@ -10,6 +13,27 @@ from mcp.server.models import InitializationOptions
 from mcp.server.stdio import stdio_server
 import requests
 import csv
+from db_pool import ConnectionPool, QueryAborted
+from intent_matcher import IntentMatcher, MATCH_CONFIDENCE
+from similarity_cache import SimilarityIndex
+from sql_guard import guard_query, QueryRejected
+import materialized_views
+from federation import DatabaseRegistry, FederationError, fan_out
+import bulk_ingest
+import change_tracking
+from result_store import ResultStore, ResultNotFound
+from spill_ops import sort_rows, aggregate
+import parallel_ops
+import sketches
+import predicates
+import search_index
+import profiling
+from llm_translate import Translator
+from traffic_capture import TrafficRecorder
+from warm_snapshot import WarmSnapshot, SNAPSHOT_INTERVAL_S, db_fingerprint, file_version
+import itertools
+from collections import OrderedDict
+from http_transport import SessionLimiter, SessionLimitExceeded, serve as serve_http
 
 # Try to import ollama
 try:
@@ -19,6 +43,20 @@ except ImportError:
     OLLAMA_AVAILABLE = False
     print("⚠️  Ollama not available, using fallback NL to SQL", file=sys.stderr)
 
+def _keep_alive(value):
+    # Ollama takes seconds (negative = keep loaded) or a duration string like "30m"
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+# LLM tier: warmed at startup, kept resident, streamed with schema-pruned prompts
+LLM_TRANSLATOR = Translator(
+    generate=ollama.generate if OLLAMA_AVAILABLE else None,
+    model=os.environ.get("OLLAMA_MODEL", "llama3.2:3b"),
+    keep_alive=_keep_alive(os.environ.get("OLLAMA_KEEP_ALIVE", "-1"))
+)
+
 # ========== DATABASE SETUP ==========
 
 def ensure_database():
@@ -80,6 +118,342 @@ def ensure_database():
 # Ensure database exists
 DB_PATH = ensure_database()
 
+# Global statement deadline and result-set memory cap (tools may pass a smaller timeout_ms)
+STATEMENT_TIMEOUT_MS = int(os.environ.get("SQL_TIMEOUT_MS", "10000"))
+MAX_RESULT_BYTES = int(os.environ.get("SQL_MAX_RESULT_BYTES", str(64 * 1024 * 1024)))
+
+# Shared connection pool (each connection keeps its own prepared-statement cache)
+DB_POOL = ConnectionPool(DB_PATH, timeout_ms=STATEMENT_TIMEOUT_MS, max_result_bytes=MAX_RESULT_BYTES)
+
+# Named databases: "main" is data/sample.db; shards come from SQLITE_DATABASES
+# (inline JSON or a JSON file: {"shard1": {"path": "data/shard1.db", "group": "customers"}})
+DATABASES = DatabaseRegistry(timeout_ms=STATEMENT_TIMEOUT_MS, max_result_bytes=MAX_RESULT_BYTES)
+DATABASES.register("main", DB_PATH, pool=DB_POOL)
+DATABASES.load_config(os.environ.get("SQLITE_DATABASES"))
+
+def statement_timeout(arguments):
+    """Per-call timeout_ms, capped by the global deadline."""
+    timeout_ms = arguments.get("timeout_ms")
+    if not timeout_ms:
+        return STATEMENT_TIMEOUT_MS
+    return min(int(timeout_ms), STATEMENT_TIMEOUT_MS)
+
+# Working-memory budget for transform_data/integrate_data; larger inputs spill to temp files
+TRANSFORM_MEMORY_BYTES = int(os.environ.get("TRANSFORM_MEMORY_BYTES", str(64 * 1024 * 1024)))
+
+# Joins/group-bys with at least this many input rows run on a process pool; unset keeps
+# them in-process (enable it once benchmark_parallel_ops.py shows a speedup on the host)
+PARALLEL_MIN_ROWS = int(os.environ["PARALLEL_MIN_ROWS"]) if os.environ.get("PARALLEL_MIN_ROWS") \
+    else parallel_ops.PARALLEL_MIN_ROWS
+PARALLEL_WORKERS = int(os.environ.get("PARALLEL_WORKERS", str(parallel_ops.PARALLEL_WORKERS)))
+
+# ========== RESULT HANDLES ==========
+
+# Results kept server-side so tools can chain on a handle instead of re-sending rows
+RESULT_STORE = ResultStore(
+    max_memory_bytes=int(os.environ.get("RESULT_STORE_MAX_BYTES", str(256 * 1024 * 1024))),
+    ttl_seconds=int(os.environ.get("RESULT_TTL_SECONDS", "1800"))
+)
+atexit.register(RESULT_STORE.close)
+PREVIEW_ROWS = 5
+
+def result_payload(data, arguments, **meta):
+    """Rows inline, or a result handle plus a short preview when return_handle is set."""
+    if not arguments.get("return_handle"):
+        return {"result": data, "row_count": len(data)}
+    handle = RESULT_STORE.put(data, meta)
+    return {
+        "result_handle": handle,
+        "row_count": len(data),
+        "preview": data[:PREVIEW_ROWS],
+        "expires_in_s": RESULT_STORE.ttl_seconds
+    }
+
+def input_rows(value):
+    """Inline rows, or the stored rows when ``value`` is a result handle."""
+    if isinstance(value, str):
+        return RESULT_STORE.get(value)
+    return value or []
+
+# ========== FILTERS ==========
+
+def filter_predicate(params):
+    """Compiled predicate for a ``where`` expression or the field/condition/value triple."""
+    if params.get("where"):
+        return predicates.compile_predicate(params["where"])
+    return predicates.from_condition(params.get("field", "id"), params.get("condition", ">"), params.get("value", 1))
+
+def scan_table(table, arguments, predicate=None):
+    """Rows of a table, with ``predicate`` pushed down as the WHERE clause."""
+    sql = f"SELECT * FROM {predicates.quote_ident(table)}"
+    params = []
+    if predicate:
+        where, params = predicate.sql()
+        sql += f" WHERE {where}"
+    with DATABASES.pool(arguments.get("database", "main")).connection() as pooled:
+        predicates.install(pooled.conn)
+        rows, _ = pooled.execute(sql, params, statement_timeout(arguments))
+        return rows, {"pushdown": sql, "params": params, **pooled.last_stats}
+
+# ========== APPROXIMATE AGGREGATES ==========
+
+def approx_profile(arguments, rows=None):
+    """One-pass sketches (distinct counts, quantiles, sample) in constant memory.
+
+    Rows come from ``rows``, a table or query (streamed from SQLite), a data
+    file (streamed for CSV/NDJSON), a result handle or inline data.
+    """
+    options = {
+        "fields": arguments.get("fields"),
+        "state": arguments.get("state"),
+        "precision": int(arguments.get("precision", sketches.HLL_PRECISION)),
+        "k": int(arguments.get("k", sketches.KLL_K)),
+        "sample_size": int(arguments.get("sample_size", sketches.RESERVOIR_SIZE)),
+        "seed": arguments.get("seed")
+    }
+    table = arguments.get("table")
+    query = arguments.get("query")
+    predicate = predicates.compile_predicate(arguments["where"]) if arguments.get("where") else None
+    execution = {"source": "inline"}
+    if rows is None and (table or query):
+        params = arguments.get("params")
+        if predicate:
+            # The filter runs inside SQLite so only matching rows are sketched; its values are
+            # bound by generated names when the query's own params are named
+            named = isinstance(params, dict)
+            where, where_params = predicate.sql(named=named)
+            query = f"SELECT * FROM ({query}) WHERE {where}" if query else \
+                f"SELECT * FROM {predicates.quote_ident(table)} WHERE {where}"
+            params = {**params, **where_params} if named else list(params or []) + where_params
+        query = query or f"SELECT * FROM {predicates.quote_ident(table)}"
+        with DATABASES.pool(arguments.get("database", "main")).connection() as pooled:
+            predicates.install(pooled.conn)
+            # Batches are folded into the sketches as they arrive, so no result cap applies
+            batches = pooled.stream(query, params, statement_timeout(arguments), retain=False)
+            profile = sketches.profile_rows(itertools.chain.from_iterable(batches), **options)
+            execution = {"source": "sql", "query": query, **pooled.last_stats}
+    else:
+        if rows is None and arguments.get("source"):
+            rows, description, _ = bulk_ingest.open_source(arguments["source"], format=arguments.get("format"))
+            execution = {"source": description}
+        elif rows is None:
+            rows = input_rows(arguments.get("handle") or arguments.get("data", []))
+        if predicate:
+            rows = (row for row in rows if predicate.test(row))
+        profile = sketches.profile_rows(rows, **options)
+    result = profile.result(arguments.get("quantiles") or sketches.DEFAULT_QUANTILES)
+    if arguments.get("return_state"):
+        result["state"] = profile.to_state()
+    return result, execution
+
+# ========== FILE CACHE ==========
+
+# Parsed data files, revalidated by mtime/size; shared by every session of this process
+FILE_CACHE_ENTRIES = 32
+_file_cache = OrderedDict()
+# Tools run in worker threads and the snapshot writer reads the cache from its own thread
+_file_cache_lock = threading.Lock()
+
+def load_data_file(file_path):
+    """Rows of a CSV or JSON file, parsed once per file version."""
+    stat = os.stat(file_path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    restore_files()
+    with _file_cache_lock:
+        cached = _file_cache.get(file_path)
+        if cached and cached[0] == version:
+            _file_cache.move_to_end(file_path)
+            return cached[1]
+    # Parse outside the lock so one large file does not block reads of the others
+    with open(file_path, 'r') as f:
+        if file_path.endswith(".csv"):
+            data = list(csv.DictReader(f))
+        else:
+            data = json.load(f)
+    with _file_cache_lock:
+        _file_cache[file_path] = (version, data)
+        _file_cache.move_to_end(file_path)
+        while len(_file_cache) > FILE_CACHE_ENTRIES:
+            _file_cache.popitem(last=False)
+    return data
+
+# ========== SESSIONS ==========
+
+# Per-session limits; pools and caches above are shared by all sessions
+SESSION_LIMITER = SessionLimiter(
+    max_concurrent=int(os.environ.get("SESSION_MAX_CONCURRENT", "4")),
+    rate=float(os.environ.get("SESSION_RATE_LIMIT", "50")),
+    burst=int(os.environ.get("SESSION_BURST", "100"))
+)
+
+class _LocalSession:
+    """Stands in for the MCP session when a tool is called directly (tests, scripts)."""
+
+_LOCAL_SESSION = _LocalSession()
+
+def current_session():
+    try:
+        return server.request_context.session
+    except LookupError:
+        return _LOCAL_SESSION
+
+def current_request_id():
+    try:
+        return server.request_context.request_id
+    except LookupError:
+        return None
+
+# ========== PROFILING ==========
+
+# Opt-in per call (profile: true) or sampled; toggled at runtime with profile_tools
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILER = profiling.Profiler(
+    directory=os.environ.get("PROFILE_DIR", profiling.PROFILE_DIR),
+    enabled=PROFILE_SAMPLE_RATE > 0,
+    sample_rate=PROFILE_SAMPLE_RATE,
+    memory=os.environ.get("PROFILE_MEMORY", "0") == "1"
+)
+
+def server_stats():
+    return {
+        "sessions": SESSION_LIMITER.stats(),
+        "db_pool": DB_POOL.stats(),
+        "similarity_index": SQL_SIMILARITY_INDEX.stats(),
+        "result_store": RESULT_STORE.stats(),
+        "predicate_cache": predicates.PREDICATE_CACHE.stats(),
+        "file_cache_entries": len(_file_cache),
+        "warm_snapshot": WARM_SNAPSHOT.stats(),
+        "profiling": PROFILER.stats(),
+        "llm": LLM_TRANSLATOR.stats()
+    }
+
+# ========== NL TO SQL ==========
+
+_intent_matcher = {"schema_version": None, "matcher": None, "fingerprint": None}
+
+# Previously translated questions, reused for paraphrases of the same question
+SQL_SIMILARITY_INDEX = SimilarityIndex(aliases={
+    "american": "usa", "america": "usa", "united states": "usa",
+    "british": "uk", "united kingdom": "uk", "england": "uk",
+    "canadian": "canada", "australian": "australia"
+})
+
+def get_intent_matcher():
+    """Return the rule/template matcher, recompiling it when the schema changes."""
+    with DB_POOL.connection() as pooled:
+        version = pooled.conn.execute("PRAGMA schema_version").fetchone()[0]
+        if _intent_matcher["schema_version"] != version:
+            fingerprint = db_fingerprint(DB_PATH)
+            matcher = restore_catalog(version, fingerprint)
+            if matcher is None:
+                # Materialized views are derived data; questions target the base tables
+                views = [v["name"] for v in materialized_views.list_views(pooled.conn)]
+                matcher = IntentMatcher.from_connection(pooled.conn, exclude=views)
+            _intent_matcher.update(matcher=matcher, schema_version=version, fingerprint=fingerprint)
+    return _intent_matcher["matcher"]
+
+# ========== WARM RESTART ==========
+
+# Cache state saved on shutdown and every WARM_SNAPSHOT_INTERVAL_S; each cache takes
+# its section back on first use and drops entries whose source changed meanwhile
+WARM_SNAPSHOT = WarmSnapshot(
+    os.environ.get("WARM_SNAPSHOT_PATH", os.path.join(os.path.dirname(DB_PATH), ".warm_snapshot.pkl")),
+    interval_s=int(os.environ.get("WARM_SNAPSHOT_INTERVAL_S", str(SNAPSHOT_INTERVAL_S)))
+)
+# Only the most recently used in-memory results are saved, up to this many bytes
+WARM_SNAPSHOT_RESULT_BYTES = int(os.environ.get("WARM_SNAPSHOT_RESULT_BYTES", str(64 * 1024 * 1024)))
+
+def database_fingerprints():
+    return {name: db_fingerprint(db["path"]) for name, db in DATABASES.databases.items()}
+
+def export_catalog():
+    if _intent_matcher["matcher"] is None:
+        return None
+    return {
+        "schema_version": _intent_matcher["schema_version"],
+        "fingerprint": _intent_matcher["fingerprint"],
+        "schema": _intent_matcher["matcher"].schema
+    }
+
+def export_files():
+    with _file_cache_lock:
+        return [(path, version, data) for path, (version, data) in _file_cache.items()]
+
+def export_results():
+    # Handles are point-in-time results; only changes made while the server was down invalidate them
+    entries = RESULT_STORE.export(WARM_SNAPSHOT_RESULT_BYTES)
+    return {
+        "databases": database_fingerprints(),
+        "files": {e["meta"]["file"]: file_version(e["meta"]["file"]) for e in entries if e["meta"].get("file")},
+        "entries": entries
+    }
+
+WARM_SNAPSHOT.register("catalog", export_catalog)
+WARM_SNAPSHOT.register("similarity", SQL_SIMILARITY_INDEX.export)
+WARM_SNAPSHOT.register("files", export_files)
+WARM_SNAPSHOT.register("results", export_results)
+
+def restore_catalog(schema_version, fingerprint):
+    """Saved intent matcher, if the schema and the data it sampled values from are unchanged."""
+    saved = WARM_SNAPSHOT.take("catalog")
+    if saved is None:
+        return None
+    if saved["schema_version"] != schema_version or saved["fingerprint"] != fingerprint:
+        WARM_SNAPSHOT.record("catalog", 0, 1)
+        return None
+    WARM_SNAPSHOT.record("catalog", 1)
+    return IntentMatcher(saved["schema"])
+
+def restore_similarity():
+    saved = WARM_SNAPSHOT.take("similarity")
+    if saved is None:
+        return
+    # Translations stay valid as long as the schema does
+    kept = [entry for entry in saved if entry[2] == _intent_matcher["schema_version"]]
+    for question, sql, schema_version in kept:
+        SQL_SIMILARITY_INDEX.add(question, sql, schema_version)
+    WARM_SNAPSHOT.record("similarity", len(kept), len(saved) - len(kept))
+
+def restore_files():
+    saved = WARM_SNAPSHOT.take("files")
+    if saved is None:
+        return
+    current = [(path, version, data) for path, version, data in saved if file_version(path) == version]
+    kept = 0
+    with _file_cache_lock:
+        for path, version, data in current:
+            if path not in _file_cache:
+                _file_cache[path] = (version, data)
+                kept += 1
+    WARM_SNAPSHOT.record("files", kept, len(saved) - kept)
+
+def restore_results():
+    saved = WARM_SNAPSHOT.take("results")
+    if saved is None:
+        return
+    databases_changed = saved["databases"] != database_fingerprints()
+    valid = []
+    for entry in saved["entries"]:
+        path = entry["meta"].get("file")
+        if path:
+            if file_version(path) == saved["files"].get(path):
+                valid.append(entry)
+        elif not databases_changed:
+            # SQL results and anything derived from them
+            valid.append(entry)
+    kept = RESULT_STORE.restore(valid)
+    WARM_SNAPSHOT.record("results", kept, len(saved["entries"]) - kept)
+
+def fallback_sql(question, match=None):
+    """Best guess when the LLM is unavailable."""
+    if match:
+        return match["sql"]
+    if "USA" in question:
+        return "SELECT * FROM users WHERE country = 'USA'"
+    elif "count" in question.lower():
+        return "SELECT COUNT(*) as count FROM users"
+    return "SELECT * FROM users"
+
 # ========== TOOLS ==========
 
 server = Server("challenge2-data-integration")
@@ -99,6 +473,15 @@ query_data_tool = Tool(
                 "type": "string",
                 "description": "sql, api, or file",
                 "default": "sql"
+            },
+            "timeout_ms": {
+                "type": "integer",
+                "description": "Statement deadline in milliseconds (sql only)"
+            },
+            "return_handle": {
+                "type": "boolean",
+                "description": "Keep the rows server-side and return a result_handle (plus a preview)",
+                "default": False
             }
         },
         "required": ["question"]
@@ -121,7 +504,30 @@ sql_tool = Tool(
         "properties": {
             "query": {
                 "type": "string",
-                "description": "SQL query to execute"
+                "description": "SQL query to execute (use ? or :name placeholders)"
+            },
+            "params": {
+                "type": ["array", "object"],
+                "description": "Positional (array) or named (object) parameters"
+            },
+            "timeout_ms": {
+                "type": "integer",
+                "description": "Statement deadline in milliseconds"
+            },
+            "database": {
+                "type": "string",
+                "description": "Registered database to run on",
+                "default": "main"
+            },
+            "attach": {
+                "type": "array",
+                "description": "Other registered databases to ATTACH (query them as <name>.<table>)",
+                "items": {"type": "string"}
+            },
+            "return_handle": {
+                "type": "boolean",
+                "description": "Keep the rows server-side and return a result_handle (plus a preview)",
+                "default": False
             }
         },
         "required": ["query"]
@@ -140,18 +546,35 @@ transform_tool = Tool(
                 "description": "Data to transform",
                 "items": {"type": "object"}
             },
+            "handle": {
+                "type": "string",
+                "description": "Result handle to transform instead of inline data"
+            },
+            "table": {
+                "type": "string",
+                "description": "Table to transform server-side; a filter is pushed down as its WHERE clause"
+            },
+            "database": {
+                "type": "string",
+                "description": "Registered database for table",
+                "default": "main"
+            },
+            "return_handle": {
+                "type": "boolean",
+                "description": "Keep the rows server-side and return a result_handle (plus a preview)",
+                "default": False
+            },
             "operation": {
                 "type": "string",
-                "description": "Operation: sort, filter, limit, aggregate",
+                "description": "Operation: sort, filter, limit, aggregate, approx",
                 "default": "sort"
             },
             "params": {
                 "type": "object",
-                "description": "Operation parameters",
+                "description": "Operation parameters (sort: by, reverse; filter: where expression, e.g. \"age >= 18 and country in ('USA', 'UK') and email is not null\", or field, condition, value; limit: limit; aggregate: field, type, group_by; approx: fields, quantiles, sample_size, state, return_state)",
                 "default": {}
             }
-        },
-        "required": ["data"]
+        }
     }
 )
 
@@ -167,13 +590,16 @@ export_tool = Tool(
                 "description": "Data to export",
                 "items": {"type": "object"}
             },
+            "handle": {
+                "type": "string",
+                "description": "Result handle to export instead of inline data"
+            },
             "format": {
                 "type": "string",
                 "description": "Format: json or csv",
                 "default": "json"
             }
-        },
-        "required": ["data"]
+        }
     }
 )
 
@@ -186,8 +612,8 @@ integrate_tool = Tool(
         "properties": {
             "datasets": {
                 "type": "array",
-                "description": "List of datasets to combine",
-                "items": {"type": "object"}
+                "description": "List of datasets to combine (each an array of rows or a result handle)",
+                "items": {"type": ["array", "string"]}
             },
             "join_key": {
                 "type": "string",
@@ -203,48 +629,522 @@ integrate_tool = Tool(
     }
 )
 
+# Tool 7: Batch Query
+batch_tool = Tool(
+    name="batch_query",
+    description="Execute several parameterized SQL statements on one pooled connection",
+    inputSchema={
+        "type": "object",
+        "properties": {
+            "queries": {
+                "type": "array",
+                "description": "List of {query, params} objects (or plain SQL strings)",
+                "items": {"type": ["object", "string"]}
+            },
+            "query": {
+                "type": "string",
+                "description": "Single SQL statement to run once per entry of params_list"
+            },
+            "params_list": {
+                "type": "array",
+                "description": "Parameter sets for 'query'",
+                "items": {"type": ["array", "object"]}
+            },
+            "timeout_ms": {
+                "type": "integer",
+                "description": "Deadline in milliseconds for each statement"
+            }
+        }
+    }
+)
+
+# Tool 8: Materialized Views
+views_tool = Tool(
+    name="materialize_view",
+    description="Create, drop, refresh or list incrementally maintained materialized views",
+    inputSchema={
+        "type": "object",
+        "properties": {
+            "action": {
+                "type": "string",
+                "description": "create, drop, refresh, or list",
+                "default": "list"
+            },
+            "name": {
+                "type": "string",
+                "description": "View (table) name, e.g. mv_spend_per_user"
+            },
+            "definition": {
+                "type": "object",
+                "description": "{source, join: {table, on: [fk, pk]}, group_by: [col | table.col | month(col)], aggregates: {alias: count(*) | sum(col) | avg(col)}}"
+            }
+        }
+    }
+)
+
+# Tool 9: Federated Query
+federated_tool = Tool(
+    name="federated_query",
+    description="Run one SQL query across several registered databases in parallel and merge the results",
+    inputSchema={
+        "type": "object",
+        "properties": {
+            "query": {
+                "type": "string",
+                "description": "SQL to run on every shard (ORDER BY, LIMIT and plain aggregates are merged)"
+            },
+            "params": {
+                "type": ["array", "object"],
+                "description": "Positional (array) or named (object) parameters"
+            },
+            "databases": {
+                "type": "array",
+                "description": "Database names, or [\"*\"] for all",
+                "items": {"type": "string"}
+            },
+            "group": {
+                "type": "string",
+                "description": "Shard group to fan out to (instead of databases)"
+            },
+            "timeout_ms": {
+                "type": "integer",
+                "description": "Statement deadline in milliseconds per shard"
+            }
+        },
+        "required": ["query"]
+    }
+)
+
+# Tool 10: Bulk Ingest
+ingest_tool = Tool(
+    name="ingest_data",
+    description="Bulk load CSV/NDJSON/JSON files or inline rows into a SQLite table (batched, resumable)",
+    inputSchema={
+        "type": "object",
+        "properties": {
+            "table": {
+                "type": "string",
+                "description": "Target table"
+            },
+            "source": {
+                "type": "string",
+                "description": "Path of a .csv, .ndjson/.jsonl or .json file"
+            },
+            "format": {
+                "type": "string",
+                "description": "csv, ndjson or json (default: from the file extension)"
+            },
+            "rows": {
+                "type": "array",
+                "description": "Inline rows: objects, or arrays together with 'columns'",
+                "items": {"type": ["object", "array"]}
+            },
+            "handle": {
+                "type": "string",
+                "description": "Result handle to load instead of inline rows"
+            },
+            "columns": {
+                "type": "array",
+                "description": "Column names for array rows",
+                "items": {"type": "string"}
+            },
+            "database": {
+                "type": "string",
+                "description": "Registered database to load into",
+                "default": "main"
+            },
+            "batch_size": {
+                "type": "integer",
+                "description": "Rows per transaction",
+                "default": 10000
+            },
+            "on_conflict": {
+                "type": "string",
+                "description": "abort, ignore or replace",
+                "default": "abort"
+            },
+            "create_table": {
+                "type": "boolean",
+                "description": "Create the table from the first row if it does not exist",
+                "default": False
+            },
+            "load_id": {
+                "type": "string",
+                "description": "Checkpoint id (default: derived from the source)"
+            },
+            "resume": {
+                "type": "boolean",
+                "description": "Continue from the last checkpoint of this load",
+                "default": True
+            }
+        },
+        "required": ["table"]
+    }
+)
+
+# Tool 11: Changes Since
+changes_tool = Tool(
+    name="changes_since",
+    description="Return only the rows of a table inserted/updated since a watermark token, plus the next watermark",
+    inputSchema={
+        "type": "object",
+        "properties": {
+            "table": {
+                "type": "string",
+                "description": "Table to sync (optional when a watermark is given)"
+            },
+            "watermark": {
+                "type": "string",
+                "description": "Token from the previous call; omit to start from the beginning"
+            },
+            "mode": {
+                "type": "string",
+                "description": "rowid, column or changelog (default: changelog if enabled, else rowid)"
+            },
+            "column": {
+                "type": "string",
+                "description": "Monotonic column for mode 'column' (e.g. id, order_date)"
+            },
+            "limit": {
+                "type": "integer",
+                "description": "Maximum rows per page (has_more tells whether to call again)",
+                "default": 1000
+            },
+            "action": {
+                "type": "string",
+                "description": "fetch, enable_log, disable_log or log_status",
+                "default": "fetch"
+            },
+            "database": {
+                "type": "string",
+                "description": "Registered database",
+                "default": "main"
+            }
+        }
+    }
+)
+
+# Tool 12: Fetch Result
+fetch_tool = Tool(
+    name="fetch_result",
+    description="Page through, describe or drop a server-side result handle",
+    inputSchema={
+        "type": "object",
+        "properties": {
+            "handle": {
+                "type": "string",
+                "description": "Result handle returned with return_handle"
+            },
+            "action": {
+                "type": "string",
+                "description": "fetch, describe, drop or stats",
+                "default": "fetch"
+            },
+            "offset": {
+                "type": "integer",
+                "description": "First row to return",
+                "default": 0
+            },
+            "limit": {
+                "type": "integer",
+                "description": "Rows to return",
+                "default": 100
+            }
+        }
+    }
+)
+
+# Tool 13: Approximate Aggregates
+approx_tool = Tool(
+    name="approx_aggregate",
+    description="Approximate distinct counts (HyperLogLog), percentiles (KLL) and a uniform sample in one constant-memory pass, with error bounds and mergeable sketch state",
+    inputSchema={
+        "type": "object",
+        "properties": {
+            "table": {
+                "type": "string",
+                "description": "Table to scan server-side"
+            },
+            "query": {
+                "type": "string",
+                "description": "SELECT to scan server-side instead of a whole table"
+            },
+            "params": {
+                "type": "array",
+                "description": "Query parameters for ? placeholders",
+                "items": {}
+            },
+            "database": {
+                "type": "string",
+                "description": "Registered database for table/query",
+                "default": "main"
+            },
+            "source": {
+                "type": "string",
+                "description": "Data file to scan (csv, ndjson/jsonl or json)"
+            },
+            "format": {
+                "type": "string",
+                "description": "File format when the extension does not say"
+            },
+            "handle": {
+                "type": "string",
+                "description": "Result handle to sketch"
+            },
+            "data": {
+                "type": "array",
+                "description": "Inline rows to sketch",
+                "items": {"type": "object"}
+            },
+            "where": {
+                "type": "string",
+                "description": "Filter expression applied before sketching (pushed down to SQL for table/query)"
+            },
+            "fields": {
+                "type": "array",
+                "description": "Columns to sketch (default: all columns of the first row)",
+                "items": {"type": "string"}
+            },
+            "quantiles": {
+                "type": "array",
+                "description": "Quantiles to report",
+                "items": {"type": "number"},
+                "default": [0.5, 0.9, 0.95, 0.99]
+            },
+            "sample_size": {
+                "type": "integer",
+                "description": "Rows kept by the reservoir sample",
+                "default": 100
+            },
+            "precision": {
+                "type": "integer",
+                "description": "HyperLogLog precision p (2^p registers, error ~1.04/sqrt(2^p))",
+                "default": 14
+            },
+            "k": {
+                "type": "integer",
+                "description": "KLL accuracy parameter (rank error ~1.3% at 200)",
+                "default": 200
+            },
+            "state": {
+                "type": "object",
+                "description": "Sketch state from an earlier call to merge into this one (e.g. another shard or an earlier batch)"
+            },
+            "return_state": {
+                "type": "boolean",
+                "description": "Include the mergeable sketch state in the response",
+                "default": False
+            },
+            "timeout_ms": {
+                "type": "integer",
+                "description": "Statement timeout for table/query scans"
+            }
+        }
+    }
+)
+
+# Tool 14: Search Data
+search_tool = Tool(
+    name="search_data",
+    description="Ranked full-text search over FTS5 indexes of table columns or data files (create/drop/refresh/list indexes too)",
+    inputSchema={
+        "type": "object",
+        "properties": {
+            "action": {
+                "type": "string",
+                "description": "search, create_index, drop_index, refresh_index or list",
+                "default": "search"
+            },
+            "index": {
+                "type": "string",
+                "description": "Index name (defaults to the source table or file name on create)"
+            },
+            "query": {
+                "type": "string",
+                "description": "Keywords (all must match, word* for prefixes) or, for substring indexes, a text fragment"
+            },
+            "columns": {
+                "type": "array",
+                "description": "create_index: text columns to index (default: all text columns); search: restrict to these columns",
+                "items": {"type": "string"}
+            },
+            "source": {
+                "type": "string",
+                "description": "create_index: table name or data file (e.g. users, data/products.json)"
+            },
+            "mode": {
+                "type": "string",
+                "description": "create_index: keyword (word tokens) or substring (trigrams, for emails/codes)",
+                "default": "keyword"
+            },
+            "raw": {
+                "type": "boolean",
+                "description": "Pass query through as FTS5 query syntax (OR, NEAR, phrases)",
+                "default": False
+            },
+            "limit": {
+                "type": "integer",
+                "description": "Results per page",
+                "default": 20
+            },
+            "offset": {
+                "type": "integer",
+                "description": "First result to return (use next_offset from the previous page)",
+                "default": 0
+            },
+            "database": {
+                "type": "string",
+                "description": "Registered database holding the index",
+                "default": "main"
+            }
+        }
+    }
+)
+
+# Tool 15: Profile Tools
+profile_tool = Tool(
+    name="profile_tools",
+    description="Turn sampled profiling of tool calls on/off, show recent profiles, or print a saved profile",
+    inputSchema={
+        "type": "object",
+        "properties": {
+            "action": {
+                "type": "string",
+                "description": "status, configure or report",
+                "default": "status"
+            },
+            "enabled": {
+                "type": "boolean",
+                "description": "configure: profile a sample of all calls"
+            },
+            "sample_rate": {
+                "type": "number",
+                "description": "configure: fraction of calls to profile while enabled (0-1)"
+            },
+            "memory": {
+                "type": "boolean",
+                "description": "configure: also trace allocations with tracemalloc (slower)"
+            },
+            "top": {
+                "type": "integer",
+                "description": "Number of hot functions to report"
+            },
+            "request_id": {
+                "type": "string",
+                "description": "report: request_id from a call's profile summary"
+            },
+            "sort": {
+                "type": "string",
+                "description": "report: pstats sort key (tottime, cumulative, ncalls)",
+                "default": "tottime"
+            }
+        }
+    }
+)
+
 # ========== TOOL HANDLERS ==========
 
+TOOLS = [query_data_tool, sources_tool, sql_tool, transform_tool, export_tool, integrate_tool, batch_tool, views_tool, federated_tool, ingest_tool, changes_tool, fetch_tool, approx_tool, search_tool, profile_tool]
+
+# Any call can ask to be profiled
+for _tool in TOOLS:
+    _tool.inputSchema["properties"].update({
+        "profile": {
+            "type": "boolean",
+            "description": "Capture cProfile stats for this call and return the hottest functions"
+        },
+        "profile_memory": {
+            "type": "boolean",
+            "description": "With profile: also report peak memory and top allocations (tracemalloc)"
+        }
+    })
+
 @server.list_tools()
 async def handle_list_tools():
-    return [query_data_tool, sources_tool, sql_tool, transform_tool, export_tool, integrate_tool]
+    return TOOLS
 
 @server.call_tool()
 async def handle_call_tool(name: str, arguments: dict):
+    """Apply the caller's session limits, then run the tool off the event loop."""
+    try:
+        async with SESSION_LIMITER.limit(current_session()):
+            # Tools block on SQLite/files; a worker thread keeps other sessions responsive
+            result, profile = await asyncio.to_thread(PROFILER.run, name, arguments, run_tool, current_request_id())
+            if profile:
+                result["content"].append({"type": "text", "text": json.dumps({"profile": profile}, indent=2)})
+            return result
+    except SessionLimitExceeded as e:
+        return {
+            "content": [{
+                "type": "text",
+                "text": json.dumps({
+                    "error": str(e),
+                    "tool": name,
+                    "retry_after_s": e.retry_after
+                }, indent=2)
+            }],
+            "isError": True
+        }
+
+def run_tool(name: str, arguments: dict):
+    # Result handles from before a restart must resolve on the first call
+    restore_results()
     try:
         if name == "query_data":
             question = arguments.get("question", "")
             source_type = arguments.get("source_type", "sql")
             
             if source_type == "sql":
+                translator = "direct"
+                match = None
+                similar = None
+                llm = None
                 # Convert natural language to SQL if needed
-                if OLLAMA_AVAILABLE and not question.strip().upper().startswith("SELECT"):
-                    try:
-                        response = ollama.generate(
-                            model='llama3.2:3b',
-                            prompt=f"Convert to SQL: {question}\nTables: users(id,name,email,country), orders(id,user_id,product,amount)\nReturn only SQL:",
-                            options={'temperature': 0.1}
-                        )
-                        sql = response['response'].strip()
-                    except:
-                        # Simple fallback
-                        if "USA" in question:
-                            sql = "SELECT * FROM users WHERE country = 'USA'"
-                        elif "count" in question.lower():
-                            sql = "SELECT COUNT(*) as count FROM users"
-                        else:
-                            sql = "SELECT * FROM users"
+                if not question.strip().upper().startswith("SELECT"):
+                    # Fast tier: templates compiled from the live schema; LLM only when unsure
+                    match = get_intent_matcher().match(question)
+                    restore_similarity()
+                    if match and match["confidence"] >= MATCH_CONFIDENCE:
+                        sql, translator = match["sql"], "intent"
+                    elif similar := SQL_SIMILARITY_INDEX.lookup(question, _intent_matcher["schema_version"]):
+                        # Paraphrase of a question the LLM already answered
+                        sql, translator = similar["sql"], "similar"
+                    elif OLLAMA_AVAILABLE:
+                        try:
+                            # Prompt carries only the tables the question mentions; stops at the first full statement
+                            sql, llm = LLM_TRANSLATOR.translate(question, get_intent_matcher().schema)
+                            translator = "llm"
+                        except Exception:
+                            sql, translator = fallback_sql(question, match), "fallback"
+                    else:
+                        sql, translator = fallback_sql(question, match), "fallback"
                 else:
                     sql = question
                 
-                # Execute SQL
-                conn = sqlite3.connect(DB_PATH)
-                conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
-                cursor.execute(sql)
-                rows = cursor.fetchall()
-                data = [dict(row) for row in rows]
-                conn.close()
+                # Guard: read-only, plan-checked, LIMIT added when missing
+                with DB_POOL.connection() as pooled:
+                    try:
+                        guard = guard_query(pooled.conn, sql)
+                    except QueryRejected as rejected:
+                        return {
+                            "content": [{
+                                "type": "text",
+                                "text": json.dumps({
+                                    "error": f"Query rejected: {rejected}",
+                                    "question": question,
+                                    "generated_sql": sql,
+                                    "translator": translator,
+                                    **rejected.details
+                                }, indent=2)
+                            }],
+                            "isError": True
+                        }
+                    
+                    # Execute SQL
+                    data, _ = pooled.execute(guard["sql"], timeout_ms=statement_timeout(arguments))
+                if translator == "llm":
+                    # Only remember SQL that actually ran
+                    SQL_SIMILARITY_INDEX.add(question, sql, _intent_matcher["schema_version"])
                 
                 return {
                     "content": [{
@@ -253,8 +1153,16 @@ async def handle_call_tool(name: str, arguments: dict):
                             "question": question,
                             "source_type": source_type,
                             "generated_sql": sql if sql != question else "Direct SQL",
-                            "result": data,
-                            "row_count": len(data)
+                            "translator": translator,
+                            "intent": match["intent"] if match else None,
+                            "confidence": match["confidence"] if match else None,
+                            "similar_question": similar["matched_question"] if similar else None,
+                            "llm": llm,
+                            "executed_sql": guard["sql"],
+                            "limit_added": guard["limit_added"],
+                            "estimated_rows": guard["estimated_rows"],
+                            "plan_warnings": guard["warnings"],
+                            **result_payload(data, arguments, source="query_data", sql=guard["sql"])
                         }, indent=2)
                     }]
                 }
@@ -274,7 +1182,7 @@ async def handle_call_tool(name: str, arguments: dict):
                             "text": json.dumps({
                                 "question": question,
                                 "source_type": source_type,
-                                "result": mock_api_data,
+                                **result_payload(mock_api_data, arguments, source="query_data"),
                                 "note": "Mock API data - would connect to real API in production"
                             }, indent=2)
                         }]
@@ -295,30 +1203,17 @@ async def handle_call_tool(name: str, arguments: dict):
             elif source_type == "file":
                 # Handle file queries
                 try:
-                    if question.endswith(".csv"):
+                    if question.endswith(".csv") or question.endswith(".json"):
                         file_path = os.path.join("data", question)
-                        data = []
-                        with open(file_path, 'r') as f:
-                            reader = csv.DictReader(f)
-                            for row in reader:
-                                data.append(row)
-                    elif question.endswith(".json"):
-                        file_path = os.path.join("data", question)
-                        with open(file_path, 'r') as f:
-                            data = json.load(f)
+                        data = load_data_file(file_path)
                     else:
                         # Assume it's a file name without extension
                         try:
                             file_path = os.path.join("data", question + ".json")
-                            with open(file_path, 'r') as f:
-                                data = json.load(f)
+                            data = load_data_file(file_path)
                         except:
                             file_path = os.path.join("data", question + ".csv")
-                            data = []
-                            with open(file_path, 'r') as f:
-                                reader = csv.DictReader(f)
-                                for row in reader:
-                                    data.append(row)
+                            data = load_data_file(file_path)
                     
                     return {
                         "content": [{
@@ -326,8 +1221,7 @@ async def handle_call_tool(name: str, arguments: dict):
                             "text": json.dumps({
                                 "question": question,
                                 "source_type": source_type,
-                                "result": data,
-                                "row_count": len(data)
+                                **result_payload(data, arguments, source="query_data", file=file_path)
                             }, indent=2)
                         }]
                     }
@@ -363,6 +1257,33 @@ async def handle_call_tool(name: str, arguments: dict):
                 {"type": "file", "name": "csv_files", "files": ["users.csv"], "description": "CSV files with user data"},
                 {"type": "file", "name": "json_files", "files": ["products.json", "orders.json"], "description": "JSON files with product and order data"}
             ]
+            for db in DATABASES.describe():
+                if db["name"] != "main":
+                    sources.append({
+                        "type": "sql",
+                        "name": db["name"],
+                        "path": db["path"],
+                        "group": db["group"],
+                        "description": "Registered SQLite database (execute_sql database/attach, federated_query)"
+                    })
+            with DB_POOL.connection() as pooled:
+                views = materialized_views.list_views(pooled.conn)
+                indexes = search_index.list_indexes(pooled.conn)
+            if views:
+                sources.append({
+                    "type": "sql",
+                    "name": "materialized_views",
+                    "tables": [v["name"] for v in views],
+                    "views": views,
+                    "description": "Incrementally maintained views (query with execute_sql)"
+                })
+            if indexes:
+                sources.append({
+                    "type": "search",
+                    "name": "search_indexes",
+                    "indexes": indexes,
+                    "description": "Full-text indexes (query with search_data)"
+                })
             return {
                 "content": [{
                     "type": "text",
@@ -372,50 +1293,375 @@ async def handle_call_tool(name: str, arguments: dict):
         
         elif name == "execute_sql":
             query = arguments.get("query", "")
-            conn = sqlite3.connect(DB_PATH)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            cursor.execute(query)
-            rows = cursor.fetchall()
-            data = [dict(row) for row in rows]
-            conn.close()
+            params = arguments.get("params")
+            database = arguments.get("database", "main")
+            attach = arguments.get("attach", [])
+            if database == "main" and not attach:
+                data, cache_hit = DB_POOL.execute(query, params, timeout_ms=statement_timeout(arguments))
+            else:
+                data, cache_hit = DATABASES.execute(
+                    database, query, params, attach, timeout_ms=statement_timeout(arguments)
+                )
             
             return {
                 "content": [{
                     "type": "text",
                     "text": json.dumps({
                         "query": query,
+                        "params": params,
+                        "database": database,
+                        **result_payload(data, arguments, source="execute_sql", sql=query),
+                        "statement_cache": {
+                            "hit": cache_hit,
+                            "hit_rate": DATABASES.pool(database).stats()["hit_rate"]
+                        }
+                    }, indent=2)
+                }]
+            }
+        
+        elif name == "batch_query":
+            queries = arguments.get("queries", [])
+            if arguments.get("query"):
+                queries = queries + [
+                    {"query": arguments["query"], "params": p}
+                    for p in arguments.get("params_list", [None])
+                ]
+            
+            timeout_ms = statement_timeout(arguments)
+            results = []
+            cache_hits = 0
+            # One connection for the whole batch so repeated SQL text reuses its prepared statement
+            with DB_POOL.connection() as conn:
+                for entry in queries:
+                    if isinstance(entry, str):
+                        entry = {"query": entry}
+                    data, cache_hit = conn.execute(entry.get("query", ""), entry.get("params"), timeout_ms)
+                    cache_hits += cache_hit
+                    results.append({
+                        "query": entry.get("query", ""),
+                        "params": entry.get("params"),
                         "result": data,
                         "row_count": len(data)
+                    })
+            
+            return {
+                "content": [{
+                    "type": "text",
+                    "text": json.dumps({
+                        "statements": len(results),
+                        "results": results,
+                        "statement_cache": {
+                            "batch_hits": cache_hits,
+                            **DB_POOL.stats()
+                        }
+                    }, indent=2)
+                }]
+            }
+        
+        elif name == "federated_query":
+            query = arguments.get("query", "")
+            try:
+                merged = fan_out(
+                    DATABASES, query, arguments.get("params"),
+                    databases=arguments.get("databases"), group=arguments.get("group"),
+                    timeout_ms=statement_timeout(arguments)
+                )
+            except FederationError as federation_error:
+                return {
+                    "content": [{
+                        "type": "text",
+                        "text": json.dumps({
+                            "error": f"Federation Error: {str(federation_error)}",
+                            "query": query
+                        }, indent=2)
+                    }],
+                    "isError": True
+                }
+            
+            return {
+                "content": [{
+                    "type": "text",
+                    "text": json.dumps({
+                        "query": query,
+                        **merged,
+                        "row_count": len(merged["result"])
                     }, indent=2)
                 }]
             }
         
+        elif name == "ingest_data":
+            table = arguments.get("table", "")
+            try:
+                with DATABASES.pool(arguments.get("database", "main")).connection() as pooled:
+                    result = bulk_ingest.ingest(
+                        pooled.conn, table,
+                        source=arguments.get("source"),
+                        rows=input_rows(arguments["handle"]) if arguments.get("handle") else arguments.get("rows"),
+                        format=arguments.get("format"),
+                        columns=arguments.get("columns"),
+                        batch_size=arguments.get("batch_size", bulk_ingest.BATCH_SIZE),
+                        on_conflict=arguments.get("on_conflict", "abort"),
+                        create_table=arguments.get("create_table", False),
+                        load_id=arguments.get("load_id"),
+                        resume=arguments.get("resume", True)
+                    )
+            except bulk_ingest.IngestError as ingest_error:
+                return {
+                    "content": [{
+                        "type": "text",
+                        "text": json.dumps({
+                            "error": f"Ingest Error: {str(ingest_error)}",
+                            "table": table,
+                            "source": arguments.get("source")
+                        }, indent=2)
+                    }],
+                    "isError": True
+                }
+            
+            return {
+                "content": [{
+                    "type": "text",
+                    "text": json.dumps(result, indent=2)
+                }]
+            }
+        
+        elif name == "changes_since":
+            action = arguments.get("action", "fetch")
+            table = arguments.get("table")
+            try:
+                with DATABASES.pool(arguments.get("database", "main")).connection() as pooled:
+                    if action == "fetch":
+                        result = change_tracking.changes_since(
+                            pooled.conn, table,
+                            watermark=arguments.get("watermark"),
+                            mode=arguments.get("mode"),
+                            column=arguments.get("column"),
+                            limit=arguments.get("limit", change_tracking.DEFAULT_PAGE)
+                        )
+                    elif action == "enable_log":
+                        result = change_tracking.enable_change_log(pooled.conn, table)
+                    elif action == "disable_log":
+                        change_tracking.disable_change_log(pooled.conn, table)
+                        result = {"table": table, "change_log": None}
+                    elif action == "log_status":
+                        if not change_tracking.has_change_log(pooled.conn, table):
+                            raise change_tracking.ChangeTrackingError(f"No change log on {table}")
+                        result = change_tracking.describe_change_log(pooled.conn, table)
+                    else:
+                        raise change_tracking.ChangeTrackingError(f"Unsupported action: {action}")
+            except change_tracking.ChangeTrackingError as tracking_error:
+                return {
+                    "content": [{
+                        "type": "text",
+                        "text": json.dumps({
+                            "error": f"Change Tracking Error: {str(tracking_error)}",
+                            "action": action,
+                            "table": table
+                        }, indent=2)
+                    }],
+                    "isError": True
+                }
+            
+            return {
+                "content": [{
+                    "type": "text",
+                    "text": json.dumps({"action": action, **result}, indent=2)
+                }]
+            }
+        
+        elif name == "fetch_result":
+            action = arguments.get("action", "fetch")
+            handle = arguments.get("handle", "")
+            if action == "stats":
+                result = RESULT_STORE.stats()
+            elif action == "describe":
+                result = RESULT_STORE.describe(handle)
+            elif action == "drop":
+                RESULT_STORE.drop(handle)
+                result = {"handle": handle, "dropped": True}
+            else:
+                offset = max(0, int(arguments.get("offset", 0)))
+                limit = max(1, int(arguments.get("limit", 100)))
+                rows = RESULT_STORE.page(handle, offset, limit)
+                total = RESULT_STORE.describe(handle)["row_count"]
+                result = {
+                    "handle": handle,
+                    "offset": offset,
+                    "result": rows,
+                    "row_count": len(rows),
+                    "total_rows": total,
+                    "has_more": offset + len(rows) < total
+                }
+            
+            return {
+                "content": [{
+                    "type": "text",
+                    "text": json.dumps({"action": action, **result}, indent=2)
+                }]
+            }
+        
+        elif name == "profile_tools":
+            action = arguments.get("action", "status")
+            try:
+                if action == "configure":
+                    result = PROFILER.configure(
+                        enabled=arguments.get("enabled"), sample_rate=arguments.get("sample_rate"),
+                        memory=arguments.get("memory"), top=arguments.get("top")
+                    )
+                elif action == "report":
+                    request_id = os.path.basename(arguments.get("request_id", ""))
+                    path = os.path.join(PROFILER.directory, f"{request_id}.prof")
+                    if not request_id or not os.path.exists(path):
+                        raise ValueError(f"No saved profile for request_id: {request_id!r}")
+                    result = {
+                        "request_id": request_id,
+                        "report": profiling.format_stats(path, arguments.get("top", PROFILER.top),
+                                                         arguments.get("sort", "tottime"))
+                    }
+                elif action == "status":
+                    result = PROFILER.stats()
+                else:
+                    raise ValueError(f"Unknown action: {action}")
+            except (ValueError, KeyError) as profile_error:
+                return {
+                    "content": [{
+                        "type": "text",
+                        "text": json.dumps({
+                            "error": f"Profiling Error: {str(profile_error)}",
+                            "action": action
+                        }, indent=2)
+                    }],
+                    "isError": True
+                }
+            
+            return {
+                "content": [{
+                    "type": "text",
+                    "text": json.dumps({"action": action, **result}, indent=2)
+                }]
+            }
+        
+        elif name == "approx_aggregate":
+            result, execution = approx_profile(arguments)
+            
+            return {
+                "content": [{
+                    "type": "text",
+                    "text": json.dumps({**result, "execution": execution}, indent=2, default=str)
+                }]
+            }
+        
+        elif name == "search_data":
+            action = arguments.get("action", "search")
+            index = arguments.get("index")
+            try:
+                with DATABASES.pool(arguments.get("database", "main")).connection() as pooled:
+                    if action == "search":
+                        result = search_index.search(
+                            pooled.conn, index, arguments.get("query", ""),
+                            limit=arguments.get("limit", search_index.DEFAULT_PAGE),
+                            offset=arguments.get("offset", 0),
+                            columns=arguments.get("columns") if arguments.get("columns") else None,
+                            raw=arguments.get("raw", False)
+                        )
+                    elif action == "create_index":
+                        result = search_index.create_index(
+                            pooled.conn, index, arguments.get("source"), arguments.get("columns"),
+                            mode=arguments.get("mode", "keyword"), replace=arguments.get("replace", False)
+                        )
+                    elif action == "drop_index":
+                        search_index.drop_index(pooled.conn, index)
+                        result = {"index": index, "dropped": True}
+                    elif action == "refresh_index":
+                        rebuilt = search_index.refresh_index(pooled.conn, index, force=True)
+                        result = {**search_index.describe_index(pooled.conn, index), "rebuilt": rebuilt}
+                    elif action == "list":
+                        result = {"indexes": search_index.list_indexes(pooled.conn)}
+                    else:
+                        raise search_index.SearchError(f"Unknown action: {action}")
+            except search_index.SearchError as search_error:
+                return {
+                    "content": [{
+                        "type": "text",
+                        "text": json.dumps({
+                            "error": f"Search Error: {str(search_error)}",
+                            "action": action,
+                            "index": index
+                        }, indent=2)
+                    }],
+                    "isError": True
+                }
+            
+            return {
+                "content": [{
+                    "type": "text",
+                    "text": json.dumps({"action": action, **result}, indent=2)
+                }]
+            }
+        
+        elif name == "materialize_view":
+            action = arguments.get("action", "list")
+            view_name = arguments.get("name", "")
+            
+            try:
+                with DB_POOL.connection() as pooled:
+                    if action == "create":
+                        result = materialized_views.create_view(pooled.conn, view_name, arguments.get("definition"))
+                    elif action == "drop":
+                        materialized_views.drop_view(pooled.conn, view_name)
+                        result = {"dropped": view_name}
+                    elif action == "refresh":
+                        result = materialized_views.refresh_view(pooled.conn, view_name)
+                    elif action == "list":
+                        result = {
+                            "views": materialized_views.list_views(pooled.conn),
+                            "templates": list(materialized_views.DEFAULT_VIEWS)
+                        }
+                    else:
+                        raise materialized_views.ViewDefinitionError(f"Unsupported action: {action}")
+            except materialized_views.ViewDefinitionError as view_error:
+                return {
+                    "content": [{
+                        "type": "text",
+                        "text": json.dumps({
+                            "error": f"View Error: {str(view_error)}",
+                            "action": action,
+                            "name": view_name
+                        }, indent=2)
+                    }],
+                    "isError": True
+                }
+            
+            return {
+                "content": [{
+                    "type": "text",
+                    "text": json.dumps({"action": action, **result}, indent=2)
+                }]
+            }
+        
         elif name == "transform_data":
-            data = arguments.get("data", [])
+            data = input_rows(arguments.get("handle") or arguments.get("data", []))
             operation = arguments.get("operation", "sort")
             params = arguments.get("params", {})
             
+            execution = None
+            table = arguments.get("table")
+            if table:
+                # Server-side source: a filter becomes the scan's WHERE clause
+                predicate = filter_predicate(params) if operation == "filter" else None
+                data, execution = scan_table(table, arguments, predicate)
+            
             if operation == "sort" and data:
-                # Sort by specified field or default to id
+                # Sort by specified field or default to id (external merge sort past the memory budget)
                 sort_key = params.get("by", "id")
                 reverse = params.get("reverse", False)
-                data = sorted(data, key=lambda x: x.get(sort_key, 0), reverse=reverse)
+                data, execution = sort_rows(data, lambda x: x.get(sort_key, 0), reverse, TRANSFORM_MEMORY_BYTES)
             
-            elif operation == "filter" and data:
-                # Filter by condition
-                field = params.get("field", "id")
-                value = params.get("value", 1)
-                condition = params.get("condition", ">")
-                
-                if condition == ">":
-                    data = [item for item in data if item.get(field, 0) > value]
-                elif condition == "=":
-                    data = [item for item in data if item.get(field) == value]
-                elif condition == "<":
-                    data = [item for item in data if item.get(field, 0) < value]
-                elif condition == "contains":
-                    data = [item for item in data if value in str(item.get(field, ""))]
+            elif operation == "filter" and data and not table:
+                # Compiled predicate (parsed once per expression, typed comparisons)
+                predicate = filter_predicate(params)
+                data = predicate.filter(data)
+                execution = {"predicate": predicate.expression, "sql": predicate.where}
             
             elif operation == "limit" and data:
                 # Limit number of items
@@ -427,19 +1673,23 @@ async def handle_call_tool(name: str, arguments: dict):
                 agg_field = params.get("field", "value")
                 agg_type = params.get("type", "sum")
                 
-                values = [item.get(agg_field, 0) for item in data if agg_field in item]
-                if agg_type == "sum":
-                    result = sum(values)
-                elif agg_type == "avg":
-                    result = sum(values) / len(values) if values else 0
-                elif agg_type == "count":
-                    result = len(data)
-                elif agg_type == "max":
-                    result = max(values) if values else 0
-                elif agg_type == "min":
-                    result = min(values) if values else 0
-                
-                data = [{"aggregation_type": agg_type, "field": agg_field, "result": result}]
+                group_by = params.get("group_by")
+                if group_by:
+                    # Per-group aggregation: process pool for large inputs, else in-process (spilling past the budget)
+                    data, execution = parallel_ops.group_aggregate(
+                        data, group_by, agg_field, agg_type, TRANSFORM_MEMORY_BYTES,
+                        min_rows=PARALLEL_MIN_ROWS, workers=PARALLEL_WORKERS
+                    )
+                else:
+                    values = [item.get(agg_field, 0) for item in data if agg_field in item]
+                    result = aggregate(values, agg_type, len(data))
+                    data = [{"aggregation_type": agg_type, "field": agg_field, "result": result}]
+            
+            elif operation == "approx":
+                # Sketch-based distinct counts, percentiles and sample (one row per field)
+                profile, execution = approx_profile(params, rows=data)
+                data = [{"field": field, **summary} for field, summary in profile["fields"].items()]
+                execution.update(rows=profile["rows"], sample=profile["sample"], state=profile.get("state"))
             
             return {
                 "content": [{
@@ -447,14 +1697,15 @@ async def handle_call_tool(name: str, arguments: dict):
                     "text": json.dumps({
                         "operation": operation,
                         "params": params,
-                        "result": data,
-                        "count": len(data)
+                        **result_payload(data, arguments, source="transform_data", operation=operation),
+                        "count": len(data),
+                        "execution": execution
                     }, indent=2)
                 }]
             }
         
         elif name == "export_data":
-            data = arguments.get("data", [])
+            data = input_rows(arguments.get("handle") or arguments.get("data", []))
             format_type = arguments.get("format", "json")
             
             if format_type == "json":
@@ -484,7 +1735,7 @@ async def handle_call_tool(name: str, arguments: dict):
             }
         
         elif name == "integrate_data":
-            datasets = arguments.get("datasets", [])
+            datasets = [input_rows(dataset) for dataset in arguments.get("datasets", [])]
             join_key = arguments.get("join_key", "id")
             join_type = arguments.get("join_type", "inner")
             
@@ -500,54 +1751,14 @@ async def handle_call_tool(name: str, arguments: dict):
                     "isError": True
                 }
             
-            # Simple integration logic
+            # Hash join: process pool for large inputs, else in-process (grace hash join past the budget)
             integrated_data = []
-            
-            if join_type == "inner":
-                # Find common keys
-                all_keys = set()
-                for dataset in datasets:
-                    for item in dataset:
-                        if join_key in item:
-                            all_keys.add(item[join_key])
-                
-                # Create integrated records
-                for key in all_keys:
-                    record = {join_key: key}
-                    for i, dataset in enumerate(datasets):
-                        for item in dataset:
-                            if item.get(join_key) == key:
-                                # Add all fields with dataset prefix
-                                for k, v in item.items():
-                                    if k != join_key:
-                                        record[f"dataset{i+1}_{k}"] = v
-                                break
-                    integrated_data.append(record)
-            
-            elif join_type == "left":
-                # Use first dataset as base
-                base_dataset = datasets[0]
-                for base_item in base_dataset:
-                    record = base_item.copy()
-                    base_key = base_item.get(join_key)
-                    
-                    # Join with other datasets
-                    for i, dataset in enumerate(datasets[1:], 1):
-                        found = False
-                        for item in dataset:
-                            if item.get(join_key) == base_key:
-                                for k, v in item.items():
-                                    if k != join_key:
-                                        record[f"dataset{i+1}_{k}"] = v
-                                found = True
-                                break
-                        
-                        if not found:
-                            for k in item.keys():
-                                if k != join_key:
-                                    record[f"dataset{i+1}_{k}"] = None
-                    
-                    integrated_data.append(record)
+            execution = None
+            if join_type in ("inner", "left"):
+                integrated_data, execution = parallel_ops.join_datasets(
+                    datasets, join_key, join_type, TRANSFORM_MEMORY_BYTES,
+                    min_rows=PARALLEL_MIN_ROWS, workers=PARALLEL_WORKERS
+                )
             
             return {
                 "content": [{
@@ -557,6 +1768,7 @@ async def handle_call_tool(name: str, arguments: dict):
                         "join_key": join_key,
                         "datasets_count": len(datasets),
                         "integrated_records": len(integrated_data),
+                        "execution": execution,
                         "result": integrated_data[:10],  # Limit output
                         "note": f"Showing first 10 of {len(integrated_data)} records"
                     }, indent=2)
@@ -569,6 +1781,32 @@ async def handle_call_tool(name: str, arguments: dict):
                 "isError": True
             }
     
+    except ResultNotFound as e:
+        return {
+            "content": [{
+                "type": "text",
+                "text": json.dumps({
+                    "error": str(e),
+                    "tool": name,
+                    "hint": "Result handles expire after inactivity; re-run the query with return_handle"
+                }, indent=2)
+            }],
+            "isError": True
+        }
+    
+    except QueryAborted as e:
+        return {
+            "content": [{
+                "type": "text",
+                "text": json.dumps({
+                    "error": str(e),
+                    "tool": name,
+                    **e.details
+                }, indent=2)
+            }],
+            "isError": True
+        }
+    
     except Exception as e:
         return {
             "content": [{"type": "text", "text": f"Error: {str(e)}"}],
@@ -577,18 +1815,27 @@ async def handle_call_tool(name: str, arguments: dict):
 
 # ========== MAIN ==========
 
-async def main():
+async def main(transport="stdio", host="127.0.0.1", port=8000, capture=None, capture_redact=()):
     print("=" * 70, file=sys.stderr)
     print("🚀 CHALLENGE 2: DATA INTEGRATION MCP SERVER", file=sys.stderr)
     print("=" * 70, file=sys.stderr)
-    print(f"🤖 AI: {'Ollama llama3.2:3b' if OLLAMA_AVAILABLE else 'Fallback'}", file=sys.stderr)
-    print("📊 6 Tools:", file=sys.stderr)
+    print(f"🤖 AI: {'Ollama ' + LLM_TRANSLATOR.model if OLLAMA_AVAILABLE else 'Fallback'}", file=sys.stderr)
+    print("📊 15 Tools:", file=sys.stderr)
     print("  1. query_data - Query data from SQL, API, or files", file=sys.stderr)
     print("  2. list_sources - List available data sources", file=sys.stderr)
-    print("  3. execute_sql - Direct SQL queries", file=sys.stderr)
+    print("  3. execute_sql - Direct SQL queries (with params)", file=sys.stderr)
     print("  4. transform_data - Transform results (filter, sort, aggregate)", file=sys.stderr)
     print("  5. export_data - Export to JSON/CSV", file=sys.stderr)
     print("  6. integrate_data - Combine data from multiple sources", file=sys.stderr)
+    print("  7. batch_query - Batched parameterized SQL", file=sys.stderr)
+    print("  8. materialize_view - Incrementally maintained views", file=sys.stderr)
+    print("  9. federated_query - Parallel fan-out across registered databases", file=sys.stderr)
+    print("  10. ingest_data - Batched, resumable bulk loads", file=sys.stderr)
+    print("  11. changes_since - Delta sync with watermark tokens", file=sys.stderr)
+    print("  12. fetch_result - Page through server-side result handles", file=sys.stderr)
+    print("  13. approx_aggregate - Distinct counts, percentiles and samples from sketches", file=sys.stderr)
+    print("  14. search_data - Ranked full-text search over FTS5 indexes", file=sys.stderr)
+    print("  15. profile_tools - Sampled cProfile/tracemalloc capture of tool calls", file=sys.stderr)
     print("=" * 70, file=sys.stderr)
     print("📁 Data Sources:", file=sys.stderr)
     print("  • SQL: data/sample.db (users, orders tables)", file=sys.stderr)
@@ -596,6 +1843,36 @@ async def main():
     print("  • API: Mock REST API endpoint", file=sys.stderr)
     print("=" * 70, file=sys.stderr)
     
+    # A long-lived HTTP server starts its operator pool up front; a stdio server lives
+    # for one client, which may never send a large enough join/group-by
+    if transport == "http" and PARALLEL_MIN_ROWS is not None:
+        parallel_ops.warm_up(PARALLEL_WORKERS)
+    
+    # Load the model in the background so the first NL question skips the cold start
+    if OLLAMA_AVAILABLE:
+        threading.Thread(target=LLM_TRANSLATOR.warm_up, name="llm-warm-up", daemon=True).start()
+    
+    # Record every request for replay_traffic.py
+    if capture:
+        recorder = TrafficRecorder(capture, redact_keys=capture_redact)
+        recorder.install(server)
+        atexit.register(recorder.close)
+        print(f"📼 Capturing requests to {capture}" + (f" (redacting {', '.join(capture_redact)})" if capture_redact else ""),
+              file=sys.stderr)
+    
+    # Registered after RESULT_STORE.close, so the final snapshot runs first (atexit is LIFO)
+    atexit.register(WARM_SNAPSHOT.stop)
+    WARM_SNAPSHOT.start()
+    
+    if transport == "http":
+        # One warm process for many clients: streamable HTTP at /mcp, SSE at /sse
+        print(f"✅ Server running (http mode) on http://{host}:{port}/mcp (SSE: /sse, stats: /health)", file=sys.stderr)
+        try:
+            await serve_http(server, host, port, stats=server_stats)
+        except Exception as e:
+            print(f"Server error: {e}", file=sys.stderr)
+        return
+    
     try:
         async with stdio_server() as (read_stream, write_stream):
             print("✅ Server running (stdio mode)", file=sys.stderr)
@@ -613,7 +1890,17 @@ async def main():
         print(f"Server error: {e}", file=sys.stderr)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Data integration MCP server")
+    parser.add_argument("--transport", choices=["stdio", "http"], default=os.environ.get("MCP_TRANSPORT", "stdio"))
+    parser.add_argument("--host", default=os.environ.get("MCP_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("MCP_PORT", "8000")))
+    parser.add_argument("--capture", default=os.environ.get("MCP_CAPTURE"),
+                        help="append every incoming request to this NDJSON file")
+    parser.add_argument("--capture-redact", default=os.environ.get("MCP_CAPTURE_REDACT", ""),
+                        help="comma-separated tool arguments to hash in the capture (* for all)")
+    args = parser.parse_args()
+    redact = [key.strip() for key in args.capture_redact.split(",") if key.strip()]
     try:
-        asyncio.run(main())
+        asyncio.run(main(args.transport, args.host, args.port, args.capture, redact))
     except KeyboardInterrupt:
         print("\n✅ Server stopped", file=sys.stderr)
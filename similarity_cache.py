@@ -0,0 +1,223 @@
+# similarity_cache.py - Reuse generated SQL for paraphrased questions
+import heapq
+import math
+import re
+import threading
+from collections import OrderedDict
+
+SIMILARITY_THRESHOLD = 0.8
+MAX_ENTRIES = 100_000
+NGRAM = 3
+MAX_POSTINGS = 1_000   # grams shared by more entries than this only rescore, never seed candidates
+CANDIDATES = 20
+TYPO_MIN_LENGTH = 5
+
+FILLER_WORDS = {
+    "a", "an", "the", "me", "show", "list", "get", "give", "display", "find", "fetch",
+    "return", "what", "which", "who", "are", "is", "was", "were", "of", "from", "in",
+    "with", "for", "to", "there", "please", "all", "every", "any", "i", "want", "see",
+    "tell", "can", "you", "do", "does", "that", "those", "these", "based", "living", "located"
+}
+
+# ========== NORMALIZATION ==========
+
+def _stem(word):
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def _ngrams(word, n=NGRAM):
+    padded = f" {word} "
+    if len(padded) <= n:
+        return {padded}
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+
+def _is_typo(a, b):
+    """One edit (or swapped neighbours) apart, on words of TYPO_MIN_LENGTH+ letters with the same first letter.
+
+    Shared trigrams are not enough: "ascending"/"descending" or
+    "maximum"/"minimum" look alike but mean the opposite.
+    """
+    if min(len(a), len(b)) < TYPO_MIN_LENGTH or a[0] != b[0] or abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        diffs = [i for i in range(len(a)) if a[i] != b[i]]
+        return len(diffs) == 1 or (
+            len(diffs) == 2 and diffs[1] == diffs[0] + 1 and a[diffs[0]] == b[diffs[1]] and a[diffs[1]] == b[diffs[0]]
+        )
+    short, long_ = (a, b) if len(a) < len(b) else (b, a)
+    return any(long_[:i] + long_[i + 1:] == short for i in range(len(long_)))
+
+
+class SimilarityIndex:
+    """Char n-gram TF-IDF index over answered questions with an inverted index.
+
+    A lookup seeds candidates from the rarer grams of the question, rescores
+    the best ones with exact cosine similarity, and only returns SQL when the
+    score clears the threshold, the schema version matches, and both
+    questions mention the same content words and numbers.
+    """
+
+    def __init__(self, threshold=SIMILARITY_THRESHOLD, max_entries=MAX_ENTRIES, aliases=None):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.aliases = {k.lower(): v.lower() for k, v in (aliases or {}).items()}
+        self.entries = OrderedDict()   # entry id -> entry dict
+        self.by_key = {}               # (normalized words, schema version) -> entry id
+        self.postings = {}             # gram -> set(entry id)
+        self.next_id = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _words(self, question):
+        text = " " + " ".join(re.findall(r"[a-z0-9.]+", question.lower())) + " "
+        # Multi-word aliases first ("united states" -> "usa")
+        for alias in sorted(self.aliases, key=len, reverse=True):
+            if " " in alias:
+                text = text.replace(f" {alias} ", f" {self.aliases[alias]} ")
+        words = []
+        for word in text.split():
+            word = self.aliases.get(word, word)
+            if word not in FILLER_WORDS:
+                words.append(_stem(word))
+        return tuple(words)
+
+    def _grams(self, words):
+        grams = {}
+        for word in words:
+            for gram in _ngrams(word):
+                grams[gram] = grams.get(gram, 0) + 1
+        return grams
+
+    def _idf(self, gram):
+        df = len(self.postings.get(gram, ()))
+        return math.log((1 + len(self.entries)) / (1 + df)) + 1
+
+    def _cosine(self, q_grams, d_grams):
+        dot = 0.0
+        q_norm = 0.0
+        d_norm = 0.0
+        for gram, tf in q_grams.items():
+            w = tf * self._idf(gram)
+            q_norm += w * w
+            if gram in d_grams:
+                dot += w * d_grams[gram] * self._idf(gram)
+        for gram, tf in d_grams.items():
+            w = tf * self._idf(gram)
+            d_norm += w * w
+        if not dot:
+            return 0.0
+        return dot / math.sqrt(q_norm * d_norm)
+
+    def _compatible(self, words, other):
+        """Same numbers/identifiers, and every other word matches exactly or is a typo of one."""
+        numbers = {w for w in words if any(c.isdigit() for c in w)}
+        other_numbers = {w for w in other if any(c.isdigit() for c in w)}
+        if numbers != other_numbers:
+            return False
+        rest = set(words) - numbers
+        other_rest = set(other) - other_numbers
+        for left, right in ((rest - other_rest, other_rest), (other_rest - rest, rest)):
+            for word in left:
+                if not any(_is_typo(word, o) for o in right):
+                    return False
+        return True
+
+    def add(self, question, sql, schema_version=None):
+        """Store the SQL answering ``question`` under ``schema_version``."""
+        words = self._words(question)
+        if not words:
+            return
+        with self._lock:
+            key = (words, schema_version)
+            if key in self.by_key:
+                self.entries[self.by_key[key]]["sql"] = sql
+                return
+            entry_id = self.next_id
+            self.next_id += 1
+            grams = self._grams(words)
+            self.entries[entry_id] = {
+                "question": question, "words": words, "grams": grams,
+                "sql": sql, "schema_version": schema_version
+            }
+            self.by_key[key] = entry_id
+            for gram in grams:
+                self.postings.setdefault(gram, set()).add(entry_id)
+            while len(self.entries) > self.max_entries:
+                self._evict()
+
+    def _evict(self):
+        entry_id, entry = self.entries.popitem(last=False)
+        self.by_key.pop((entry["words"], entry["schema_version"]), None)
+        for gram in entry["grams"]:
+            posting = self.postings.get(gram)
+            if posting is not None:
+                posting.discard(entry_id)
+                if not posting:
+                    del self.postings[gram]
+
+    def lookup(self, question, schema_version=None):
+        """Return {"sql", "similarity", "matched_question"} or None."""
+        words = self._words(question)
+        with self._lock:
+            if not words or not self.entries:
+                self.misses += 1
+                return None
+            exact = self.by_key.get((words, schema_version))
+            if exact is not None:
+                self.hits += 1
+                entry = self.entries[exact]
+                return {"sql": entry["sql"], "similarity": 1.0, "matched_question": entry["question"]}
+
+            q_grams = self._grams(words)
+            # Seed candidates from the rarest grams; common grams add little and cost the most
+            ranked = sorted(q_grams, key=lambda g: len(self.postings.get(g, ())))
+            seeds = [g for g in ranked if 0 < len(self.postings.get(g, ())) <= MAX_POSTINGS]
+            if not seeds:
+                seeds = [g for g in ranked[:2] if g in self.postings]
+            scores = {}
+            for gram in seeds:
+                weight = self._idf(gram)
+                for entry_id in self.postings[gram]:
+                    scores[entry_id] = scores.get(entry_id, 0.0) + weight
+            best = heapq.nlargest(CANDIDATES, scores, key=scores.get)
+
+            result = None
+            for entry_id in best:
+                entry = self.entries[entry_id]
+                if entry["schema_version"] != schema_version:
+                    continue
+                similarity = self._cosine(q_grams, entry["grams"])
+                if similarity < self.threshold or not self._compatible(words, entry["words"]):
+                    continue
+                if result is None or similarity > result["similarity"]:
+                    result = {
+                        "sql": entry["sql"],
+                        "similarity": round(similarity, 4),
+                        "matched_question": entry["question"]
+                    }
+            if result:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return result
+
+    def export(self):
+        """(question, sql, schema_version) for every entry, oldest first; ``add`` rebuilds the rest."""
+        with self._lock:
+            return [(e["question"], e["sql"], e["schema_version"]) for e in self.entries.values()]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "grams": len(self.postings),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
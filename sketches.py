@@ -0,0 +1,461 @@
+# sketches.py - Mergeable constant-memory sketches: distinct counts, quantiles, samples
+import base64
+import hashlib
+import math
+import random
+import re
+
+HLL_PRECISION = 14          # 16,384 registers, ~0.8% standard error
+KLL_K = 200                 # ~1.3% rank error
+RESERVOIR_SIZE = 100
+DEFAULT_QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+
+NUMERIC_TEXT = re.compile(r"[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?")
+
+
+def _canonical(value):
+    """Hash key: 1, 1.0 and "1" are the same value (SQLite and CSV disagree on types)."""
+    kind = type(value)
+    if kind is int:
+        return f"number:{value}"
+    if kind is str:
+        text = value.strip()
+        if not NUMERIC_TEXT.fullmatch(text):
+            return f"str:{value}"
+        value = int(text) if text.lstrip("+-").isdigit() else float(text)
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f"number:{value!r}"
+    return f"{type(value).__name__}:{value}"
+
+
+def _hash64(value):
+    """Stable 64-bit hash (the same in every process, so sketch states merge)."""
+    data = _canonical(value).encode()
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "big")
+
+
+def _number(value):
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return None if isinstance(value, float) and math.isnan(value) else value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+# ========== HYPERLOGLOG ==========
+
+def _sigma(x):
+    """sum_k x^(2^k) 2^(k-1) + x, corrects for empty registers (x = share of zeros)."""
+    y, z = 1.0, x
+    while True:
+        x *= x
+        previous = z
+        z += x * y
+        y += y
+        if z == previous:
+            return z
+
+
+def _tau(x):
+    """Correction for saturated registers (x = share not saturated)."""
+    if x in (0.0, 1.0):
+        return 0.0
+    y, z = 1.0, 1 - x
+    while True:
+        x = math.sqrt(x)
+        previous = z
+        y *= 0.5
+        z -= (1 - x) ** 2 * y
+        if z == previous:
+            return z / 3
+
+
+class HyperLogLog:
+    """Distinct-count estimate in 2^p bytes of registers."""
+
+    def __init__(self, p=HLL_PRECISION):
+        if not 4 <= p <= 18:
+            raise ValueError("HyperLogLog precision must be between 4 and 18")
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(self.m)
+
+    def add(self, value):
+        h = _hash64(value)
+        index = h >> (64 - self.p)
+        rest = (h << self.p) & ((1 << 64) - 1)
+        rank = (64 - self.p + 1) if rest == 0 else (64 - rest.bit_length() + 1)
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        if other.p != self.p:
+            raise ValueError("Cannot merge HyperLogLog sketches with different precision")
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+        return self
+
+    def estimate(self):
+        """Ertl's improved estimator ("New cardinality estimation algorithms for
+        HyperLogLog sketches", 2017).
+
+        The classic raw estimate switches to linear counting below 2.5m and is
+        biased ~2% high around the switch (n ~ 2.5m), which pushed the true count
+        out of ``bounds_95``. This estimator corrects both ends of the register
+        histogram analytically, so it stays unbiased over the whole range
+        without HLL++'s empirical bias tables.
+        """
+        m = self.m
+        q = 64 - self.p
+        counts = [0] * (q + 2)
+        for r in self.registers:
+            counts[r] += 1
+        if counts[0] == m:
+            return 0.0
+        z = m * _tau(1 - counts[q + 1] / m)
+        for k in range(q, 0, -1):
+            z = 0.5 * (z + counts[k])
+        z += m * _sigma(counts[0] / m)
+        return m * m / (2 * math.log(2) * z)
+
+    @property
+    def relative_error(self):
+        return 1.04 / math.sqrt(self.m)
+
+    def result(self):
+        estimate = self.estimate()
+        error = self.relative_error
+        return {
+            "estimate": round(estimate),
+            "relative_std_error": round(error, 5),
+            # ~95% interval (2 standard errors)
+            "bounds_95": [round(estimate * (1 - 2 * error)), round(estimate * (1 + 2 * error))]
+        }
+
+    def to_state(self):
+        return {"type": "hll", "p": self.p, "registers": base64.b64encode(bytes(self.registers)).decode()}
+
+    @classmethod
+    def from_state(cls, state):
+        sketch = cls(state["p"])
+        sketch.registers = bytearray(base64.b64decode(state["registers"]))
+        return sketch
+
+# ========== KLL QUANTILES ==========
+
+class KLLSketch:
+    """KLL quantile sketch (Karnin, Lang, Liberty) over numbers.
+
+    Level h holds items of weight 2^h; when the sketch is full, the lowest
+    overfull level is sorted and every other item (random offset) moves up a
+    level. Space is O(k log(n/k)) and ranks are off by about ``rank_error``.
+    """
+
+    def __init__(self, k=KLL_K, seed=None):
+        self.k = k
+        self.levels = [[]]
+        self.n = 0
+        self.min = None
+        self.max = None
+        self.random = random.Random(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def add(self, value):
+        value = _number(value)
+        if value is None:
+            return
+        self.levels[0].append(value)
+        self.n += 1
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if len(self.levels[0]) >= self._capacity(0):
+            self._compress()
+
+    def _compress(self):
+        for level in range(len(self.levels)):
+            if len(self.levels[level]) >= self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append([])
+                items = sorted(self.levels[level])
+                keep = [items.pop()] if len(items) % 2 else []
+                offset = self.random.randint(0, 1)
+                self.levels[level + 1].extend(items[offset::2])
+                self.levels[level] = keep
+                return self._compress() if self._size() >= self._total_capacity() else None
+
+    def _size(self):
+        return sum(len(items) for items in self.levels)
+
+    def _total_capacity(self):
+        return sum(self._capacity(level) for level in range(len(self.levels)))
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for level, items in enumerate(other.levels):
+            self.levels[level].extend(items)
+        self.n += other.n
+        for bound, pick in (("min", min), ("max", max)):
+            values = [v for v in (getattr(self, bound), getattr(other, bound)) if v is not None]
+            setattr(self, bound, pick(values) if values else None)
+        while self._size() >= self._total_capacity():
+            before = self._size()
+            self._compress()
+            if self._size() == before:
+                break
+        return self
+
+    def quantiles(self, fractions):
+        weighted = sorted((value, 1 << level) for level, items in enumerate(self.levels) for value in items)
+        total = sum(weight for _, weight in weighted)
+        results = {}
+        for q in fractions:
+            if not weighted:
+                results[q] = None
+                continue
+            if q <= 0:
+                results[q] = self.min
+                continue
+            if q >= 1:
+                results[q] = self.max
+                continue
+            target = q * total
+            running = 0
+            for value, weight in weighted:
+                running += weight
+                if running >= target:
+                    results[q] = value
+                    break
+        return results
+
+    @property
+    def rank_error(self):
+        return 2.296 / self.k ** 0.9723   # DataSketches' empirical bound (99% confidence)
+
+    def result(self, fractions=DEFAULT_QUANTILES):
+        return {
+            "count": self.n,
+            "min": self.min,
+            "max": self.max,
+            "quantiles": {str(q): v for q, v in self.quantiles(fractions).items()},
+            # nothing compacted yet means the quantiles are exact
+            "rank_error": round(self.rank_error, 5) if self._size() < self.n else 0.0,
+            "retained_items": self._size()
+        }
+
+    def to_state(self):
+        return {"type": "kll", "k": self.k, "n": self.n, "min": self.min, "max": self.max, "levels": self.levels}
+
+    @classmethod
+    def from_state(cls, state):
+        sketch = cls(state["k"])
+        sketch.levels = [list(items) for items in state["levels"]] or [[]]
+        sketch.n, sketch.min, sketch.max = state["n"], state["min"], state["max"]
+        return sketch
+
+# ========== MOMENTS ==========
+
+class Moments:
+    """Exact count/sum/min/max/mean/variance in O(1) memory (Welford, mergeable)."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        value = _number(value)
+        if value is None:
+            return
+        self.count += 1
+        self.total += value
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        if other.count:
+            count = self.count + other.count
+            delta = other.mean - self.mean
+            self.m2 += other.m2 + delta * delta * self.count * other.count / count
+            self.mean += delta * other.count / count
+            self.count = count
+            self.total += other.total
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def result(self):
+        variance = self.m2 / (self.count - 1) if self.count > 1 else 0.0
+        return {
+            "count": self.count, "sum": self.total, "min": self.min, "max": self.max,
+            "avg": self.mean if self.count else None, "stddev": math.sqrt(variance)
+        }
+
+    def to_state(self):
+        return {"type": "moments", "count": self.count, "mean": self.mean, "m2": self.m2,
+                "sum": self.total, "min": self.min, "max": self.max}
+
+    @classmethod
+    def from_state(cls, state):
+        moments = cls()
+        moments.count, moments.mean, moments.m2 = state["count"], state["mean"], state["m2"]
+        moments.total, moments.min, moments.max = state["sum"], state["min"], state["max"]
+        return moments
+
+# ========== RESERVOIR ==========
+
+class Reservoir:
+    """Uniform sample of ``size`` items from a stream of unknown length (Algorithm R)."""
+
+    def __init__(self, size=RESERVOIR_SIZE, seed=None):
+        self.size = size
+        self.items = []
+        self.seen = 0
+        self.random = random.Random(seed)
+
+    def add(self, item):
+        self.seen += 1
+        if len(self.items) < self.size:
+            self.items.append(item)
+        else:
+            slot = self.random.randrange(self.seen)
+            if slot < self.size:
+                self.items[slot] = item
+
+    def merge(self, other):
+        """Sample of the union: items are weighted by how many stream rows they stand for."""
+        keyed = []
+        for reservoir in (self, other):
+            if reservoir.items:
+                weight = reservoir.seen / len(reservoir.items)
+                # Efraimidis-Spirakis: the largest u^(1/w) keys are a weighted sample
+                keyed.extend((self.random.random() ** (1 / weight), item) for item in reservoir.items)
+        keyed.sort(key=lambda pair: pair[0], reverse=True)
+        self.items = [item for _, item in keyed[:self.size]]
+        self.seen += other.seen
+        return self
+
+    def result(self):
+        return {"sample": self.items, "sample_size": len(self.items), "population": self.seen,
+                "sampling_rate": round(len(self.items) / self.seen, 6) if self.seen else None}
+
+    def to_state(self):
+        return {"type": "reservoir", "size": self.size, "seen": self.seen, "items": self.items}
+
+    @classmethod
+    def from_state(cls, state):
+        reservoir = cls(state["size"])
+        reservoir.seen, reservoir.items = state["seen"], list(state["items"])
+        return reservoir
+
+# ========== PROFILES ==========
+
+STATE_TYPES = {"hll": HyperLogLog, "kll": KLLSketch, "moments": Moments, "reservoir": Reservoir}
+
+
+def sketch_from_state(state):
+    return STATE_TYPES[state["type"]].from_state(state)
+
+
+class Profile:
+    """Sketches for several fields of one row stream, plus a row sample."""
+
+    def __init__(self, fields, precision=HLL_PRECISION, k=KLL_K, sample_size=RESERVOIR_SIZE, seed=None):
+        self.fields = list(fields)
+        self.rows = 0
+        self.distinct = {f: HyperLogLog(precision) for f in self.fields}
+        self.quantiles = {f: KLLSketch(k, seed) for f in self.fields}
+        self.moments = {f: Moments() for f in self.fields}
+        self.sample = Reservoir(sample_size, seed)
+
+    def add(self, row):
+        self.rows += 1
+        for field in self.fields:
+            value = row.get(field)
+            if value is None:
+                continue
+            self.distinct[field].add(value)
+            self.quantiles[field].add(value)
+            self.moments[field].add(value)
+        self.sample.add(row)
+
+    def update(self, rows):
+        for row in rows:
+            self.add(row)
+        return self
+
+    def merge(self, other):
+        if other.fields != self.fields:
+            raise ValueError("Cannot merge profiles over different fields")
+        self.rows += other.rows
+        for field in self.fields:
+            self.distinct[field].merge(other.distinct[field])
+            self.quantiles[field].merge(other.quantiles[field])
+            self.moments[field].merge(other.moments[field])
+        self.sample.merge(other.sample)
+        return self
+
+    def result(self, fractions=DEFAULT_QUANTILES):
+        return {
+            "rows": self.rows,
+            "fields": {
+                field: {
+                    "distinct": self.distinct[field].result(),
+                    "quantiles": self.quantiles[field].result(fractions),
+                    "stats": self.moments[field].result()
+                }
+                for field in self.fields
+            },
+            "sample": self.sample.result()
+        }
+
+    def to_state(self):
+        return {
+            "type": "profile", "fields": self.fields, "rows": self.rows,
+            "distinct": {f: s.to_state() for f, s in self.distinct.items()},
+            "quantiles": {f: s.to_state() for f, s in self.quantiles.items()},
+            "moments": {f: s.to_state() for f, s in self.moments.items()},
+            "sample": self.sample.to_state()
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        profile = cls(state["fields"])
+        profile.rows = state["rows"]
+        profile.distinct = {f: HyperLogLog.from_state(s) for f, s in state["distinct"].items()}
+        profile.quantiles = {f: KLLSketch.from_state(s) for f, s in state["quantiles"].items()}
+        profile.moments = {f: Moments.from_state(s) for f, s in state["moments"].items()}
+        profile.sample = Reservoir.from_state(state["sample"])
+        return profile
+
+
+def profile_rows(rows, fields=None, state=None, **options):
+    """Sketch an iterable of dict rows in one pass.
+
+    ``fields`` defaults to the columns of the first row; ``state`` is a
+    previous ``Profile.to_state()`` to merge into the result.
+    """
+    rows = iter(rows)
+    first = next(rows, None)
+    if fields is None:
+        fields = state["fields"] if state else list(first or {})
+    profile = Profile(fields, **options)
+    if first is not None:
+        profile.add(first)
+    profile.update(rows)
+    if state:
+        profile.merge(Profile.from_state(state))
+    return profile
@@ -0,0 +1,329 @@
+# spill_ops.py - Sort, join and group-by that spill to disk past a memory budget
+import heapq
+import json
+import os
+import pickle
+import sys
+import tempfile
+from contextlib import contextmanager
+
+MEMORY_BUDGET = 64 * 1024 * 1024
+SPILL_CHUNK = 1000      # records per pickle frame in a spill file (at most)
+MERGE_FAN_IN = 64       # runs merged at once (bounds open files)
+MAX_PARTITIONS = 256
+
+
+def row_bytes(row):
+    """Rough in-memory size of one row."""
+    values = row.values() if isinstance(row, dict) else row if isinstance(row, (list, tuple)) else ()
+    return sys.getsizeof(row) + sum(sys.getsizeof(v) for v in values)
+
+
+def hashable(value):
+    """Join/group key usable as a dict key; JSON lists/objects compare by content."""
+    if isinstance(value, (list, dict)):
+        return ("json", json.dumps(value, sort_keys=True, default=str))
+    return value
+
+# ========== SPILL FILES ==========
+
+class SpillFile:
+    """Append-only temp file of pickled records, read back in order."""
+
+    def __init__(self, directory, chunk=SPILL_CHUNK):
+        fd, self.path = tempfile.mkstemp(dir=directory, suffix=".spill")
+        self.file = os.fdopen(fd, "wb")
+        self.chunk = chunk
+        self.buffer = []
+        self.records = 0
+
+    def append(self, record):
+        self.buffer.append(record)
+        self.records += 1
+        if len(self.buffer) >= self.chunk:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            pickle.dump(self.buffer, self.file, protocol=pickle.HIGHEST_PROTOCOL)
+            self.buffer = []
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+    @property
+    def size(self):
+        return os.path.getsize(self.path)
+
+    def __iter__(self):
+        with open(self.path, "rb") as f:
+            while True:
+                try:
+                    chunk = pickle.load(f)
+                except EOFError:
+                    return
+                yield from chunk
+
+
+@contextmanager
+def spill_directory():
+    with tempfile.TemporaryDirectory(prefix="mcp-spill-") as directory:
+        yield directory
+
+
+def _new_stats(strategy, memory_bytes):
+    return {"strategy": strategy, "memory_budget": memory_bytes, "spill_files": 0, "spilled_bytes": 0}
+
+
+def _account(stats, files):
+    stats["spill_files"] += len(files)
+    stats["spilled_bytes"] += sum(f.size for f in files)
+
+# ========== SORT ==========
+
+def external_sort(records, key, reverse=False, memory_bytes=MEMORY_BUDGET, directory=None, stats=None):
+    """Yield ``records`` sorted by ``key``; runs over the budget are sorted and spilled.
+
+    Runs are merged with a stable k-way merge, so the order (ties included)
+    is the same as ``sorted(records, key=key, reverse=reverse)``.
+    """
+    runs = []
+    run = []
+    run_bytes = 0
+    chunk = SPILL_CHUNK
+    for record in records:
+        run.append(record)
+        run_bytes += row_bytes(record)
+        if run_bytes > memory_bytes:
+            # The merge holds one chunk per run: keep MERGE_FAN_IN chunks within the budget
+            chunk = max(1, min(SPILL_CHUNK, int(memory_bytes / MERGE_FAN_IN / (run_bytes / len(run)))))
+            runs.append(_spill_run(run, key, reverse, directory, chunk))
+            run, run_bytes = [], 0
+    if not runs:
+        yield from sorted(run, key=key, reverse=reverse)
+        return
+    if run:
+        runs.append(_spill_run(run, key, reverse, directory, chunk))
+    if stats is not None:
+        stats["runs"] = len(runs)
+        stats["merge_passes"] = 1
+        _account(stats, runs)
+    while len(runs) > MERGE_FAN_IN:
+        # Merging consecutive runs keeps ties in input order
+        runs = [_merge_runs(runs[i:i + MERGE_FAN_IN], key, reverse, directory, chunk)
+                for i in range(0, len(runs), MERGE_FAN_IN)]
+        if stats is not None:
+            stats["merge_passes"] += 1
+            _account(stats, runs)
+    yield from heapq.merge(*runs, key=key, reverse=reverse)
+
+
+def _merge_runs(runs, key, reverse, directory, chunk):
+    merged = SpillFile(directory, chunk)
+    for record in heapq.merge(*runs, key=key, reverse=reverse):
+        merged.append(record)
+    merged.close()
+    for run in runs:
+        os.remove(run.path)
+    return merged
+
+
+def _spill_run(run, key, reverse, directory, chunk):
+    spill = SpillFile(directory, chunk)
+    for record in sorted(run, key=key, reverse=reverse):
+        spill.append(record)
+    spill.close()
+    return spill
+
+
+def sort_rows(rows, key, reverse=False, memory_bytes=MEMORY_BUDGET):
+    """Return (sorted rows, execution stats); identical to ``sorted`` at any budget.
+
+    A list is already in memory and ``sorted`` only adds a list of
+    pointers to it, so it is never spilled (copying every row through
+    pickled runs would raise the peak, not cap it). Any other iterable is
+    read in runs of ``memory_bytes`` and the result is a lazy merge of the
+    spilled runs; consume it to the end (or close it) to remove them.
+    """
+    if isinstance(rows, list):
+        return sorted(rows, key=key, reverse=reverse), _new_stats("in_memory", memory_bytes)
+    stats = _new_stats("external_merge_sort", memory_bytes)
+    merged = _sorted_stream(rows, key, reverse, memory_bytes, stats)
+    next(merged)
+    if "runs" not in stats:
+        stats["strategy"] = "in_memory"
+    return merged, stats
+
+
+def _sorted_stream(rows, key, reverse, memory_bytes, stats):
+    with spill_directory() as directory:
+        merged = external_sort(rows, key, reverse, memory_bytes, directory, stats)
+        first = next(merged, _END)
+        yield   # every run is written (and ``stats`` filled in) before the caller reads a row
+        if first is not _END:
+            yield first
+            yield from merged
+
+
+_END = object()
+
+# ========== PARTITIONING ==========
+
+def _partition_count(total_bytes, memory_bytes):
+    return max(2, min(MAX_PARTITIONS, -(-total_bytes // max(1, memory_bytes)) * 2))
+
+
+def _partition(tagged, partitions, directory, key_of):
+    """Split (seq, ...) records into ``partitions`` spill files by hash of their key."""
+    files = [SpillFile(directory) for _ in range(partitions)]
+    for record in tagged:
+        files[hash(key_of(record)) % partitions].append(record)
+    for f in files:
+        f.close()
+    return files
+
+# ========== JOIN ==========
+
+def _prefixed(row, index, join_key):
+    return {f"dataset{index + 1}_{k}": v for k, v in row.items() if k != join_key}
+
+
+def _join_partition(tagged_rows, datasets_count, join_key, join_type, columns):
+    """Join one partition of (seq, dataset index, row) records; returns (seq, record) pairs."""
+    first_match = [dict() for _ in range(datasets_count)]   # per dataset: key -> first row
+    first_seen = {}                                          # key -> (seq, value) of first appearance
+    base_rows = []
+    for seq, index, row in tagged_rows:
+        if join_key not in row:
+            if join_type == "left" and index == 0:
+                base_rows.append((seq, row, None))
+            continue
+        key = hashable(row[join_key])
+        first_match[index].setdefault(key, row)
+        first_seen.setdefault(key, (seq, row[join_key]))
+        if join_type == "left" and index == 0:
+            base_rows.append((seq, row, key))
+
+    output = []
+    if join_type == "inner":
+        for key, (seq, value) in first_seen.items():
+            record = {join_key: value}
+            for index in range(datasets_count):
+                match = first_match[index].get(key)
+                if match is not None:
+                    record.update(_prefixed(match, index, join_key))
+            output.append((seq, record))
+    else:
+        for seq, base, key in base_rows:
+            record = dict(base)
+            for index in range(1, datasets_count):
+                match = first_match[index].get(key) if key is not None else None
+                if match is not None:
+                    record.update(_prefixed(match, index, join_key))
+                else:
+                    record.update({f"dataset{index + 1}_{c}": None for c in columns[index] if c != join_key})
+            output.append((seq, record))
+    return output
+
+
+def join_datasets(datasets, join_key, join_type="inner", memory_bytes=MEMORY_BUDGET):
+    """Hash join of row lists on ``join_key``; returns (rows, execution stats).
+
+    ``inner`` emits one record per join key (in order of first appearance)
+    with the first matching row of every dataset; ``left`` emits one record
+    per row of the first dataset. Over the budget the rows are hash
+    partitioned to disk (grace hash join) and each partition is joined
+    separately, then the records are put back in first-appearance order.
+    """
+    # Columns a left join fills with NULLs when a dataset has no match
+    columns = [list(rows[0].keys()) if rows and isinstance(rows[0], dict) else [] for rows in datasets]
+    tagged = ((seq, index, row)
+              for seq, (index, row) in enumerate((i, r) for i, rows in enumerate(datasets) for r in rows))
+    total_bytes = sum(row_bytes(r) for rows in datasets for r in rows)
+    if total_bytes <= memory_bytes:
+        joined = _join_partition(tagged, len(datasets), join_key, join_type, columns)
+        joined.sort(key=lambda pair: pair[0])
+        return [record for _, record in joined], _new_stats("in_memory", memory_bytes)
+
+    stats = _new_stats("grace_hash_join", memory_bytes)
+    partitions = _partition_count(total_bytes, memory_bytes)
+    stats["partitions"] = partitions
+    with spill_directory() as directory:
+        files = _partition(
+            tagged, partitions, directory,
+            lambda record: hashable(record[2].get(join_key)) if join_key in record[2] else None
+        )
+        _account(stats, files)
+        joined = SpillFile(directory)
+        for part in files:
+            for pair in _join_partition(part, len(datasets), join_key, join_type, columns):
+                joined.append(pair)
+        joined.close()
+        _account(stats, [joined])
+        ordered = external_sort(joined, key=lambda pair: pair[0], memory_bytes=memory_bytes,
+                                directory=directory, stats=stats)
+        return [record for _, record in ordered], stats
+
+# ========== GROUP BY ==========
+
+def aggregate(values, agg_type, row_count):
+    if agg_type == "sum":
+        return sum(values)
+    if agg_type == "avg":
+        return sum(values) / len(values) if values else 0
+    if agg_type == "count":
+        return row_count
+    if agg_type == "max":
+        return max(values) if values else 0
+    if agg_type == "min":
+        return min(values) if values else 0
+    raise ValueError(f"Unsupported aggregation: {agg_type}")
+
+
+def _group_partition(tagged_rows, group_by, field, agg_type):
+    groups = {}   # key -> [first seq, group values, field values, row count]
+    for seq, row in tagged_rows:
+        values = tuple(row.get(c) for c in group_by)
+        key = tuple(hashable(v) for v in values)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = [seq, values, [], 0]
+        group[3] += 1
+        if field in row:
+            group[2].append(row.get(field, 0))
+    output = []
+    for seq, values, field_values, count in groups.values():
+        record = dict(zip(group_by, values))
+        record.update({"aggregation_type": agg_type, "field": field,
+                       "result": aggregate(field_values, agg_type, count)})
+        output.append((seq, record))
+    return output
+
+
+def group_aggregate(rows, group_by, field, agg_type="sum", memory_bytes=MEMORY_BUDGET):
+    """Aggregate ``field`` per distinct ``group_by`` values; returns (rows, execution stats).
+
+    Groups come out in order of first appearance. Over the budget the rows
+    are hash partitioned to disk by group key and each partition is
+    aggregated on its own.
+    """
+    group_by = [group_by] if isinstance(group_by, str) else list(group_by)
+    tagged = enumerate(rows)
+    total_bytes = sum(row_bytes(r) for r in rows)
+    if total_bytes <= memory_bytes:
+        grouped = _group_partition(tagged, group_by, field, agg_type)
+        return [record for _, record in grouped], _new_stats("in_memory", memory_bytes)
+
+    stats = _new_stats("grace_hash_aggregate", memory_bytes)
+    partitions = _partition_count(total_bytes, memory_bytes)
+    stats["partitions"] = partitions
+    with spill_directory() as directory:
+        files = _partition(tagged, partitions, directory,
+                           lambda record: tuple(hashable(record[1].get(c)) for c in group_by))
+        _account(stats, files)
+        grouped = []
+        for part in files:
+            grouped.extend(_group_partition(part, group_by, field, agg_type))
+    grouped.sort(key=lambda pair: pair[0])
+    return [record for _, record in grouped], stats
@@ -0,0 +1,252 @@
+# sql_guard.py - Read-only and cost checks for generated SQL
+import re
+import sqlite3
+
+DEFAULT_LIMIT = 1000
+LARGE_TABLE_ROWS = 100_000
+MAX_ESTIMATED_ROWS = 5_000_000
+INDEX_EQ_ROWS = 10  # SQLite's own guess for an equality lookup without sqlite_stat1
+
+READ_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION}
+if hasattr(sqlite3, "SQLITE_RECURSIVE"):
+    READ_ACTIONS.add(sqlite3.SQLITE_RECURSIVE)
+
+SUBQUERY_PREFIXES = ("MATERIALIZE", "CO-ROUTINE", "LIST SUBQUERY", "SCALAR SUBQUERY",
+                     "CORRELATED", "MULTI-INDEX OR", "INDEX ")
+
+
+class QueryRejected(ValueError):
+    """Raised when a statement is not a read or is too expensive to run."""
+
+    def __init__(self, message, details=None):
+        super().__init__(message)
+        self.details = details or {}
+
+# ========== PARSING ==========
+
+_TOKEN = re.compile(
+    r"""(?P<ws>\s+)|(?P<comment>--[^\n]*|/\*.*?\*/)|(?P<string>'(?:[^']|'')*')"""
+    r"""|(?P<ident>"(?:[^"]|"")*"|`[^`]*`|\[[^\]]*\])|(?P<word>[A-Za-z_][\w$]*)"""
+    r"""|(?P<number>\d+(?:\.\d*)?)|(?P<punct>.)""",
+    re.S
+)
+
+
+def tokenize(sql):
+    """Split SQL into (kind, text) tokens, dropping whitespace and comments."""
+    return [(m.lastgroup, m.group()) for m in _TOKEN.finditer(sql)
+            if m.lastgroup not in ("ws", "comment")]
+
+
+def tokenize_spans(sql):
+    """Like ``tokenize`` but as (kind, text, start, end) so callers can slice the SQL."""
+    return [(m.lastgroup, m.group(), m.start(), m.end()) for m in _TOKEN.finditer(sql)
+            if m.lastgroup not in ("ws", "comment")]
+
+
+def split_statement(sql):
+    """Return (statement text, tokens) for the single statement in ``sql``.
+
+    Trailing semicolons and comments are dropped so clauses can be appended.
+    """
+    matches = [m for m in _TOKEN.finditer(sql) if m.lastgroup not in ("ws", "comment")]
+    while matches and matches[-1].group() == ";":
+        matches.pop()
+    if not matches:
+        raise QueryRejected("Empty SQL statement")
+    if any(m.group() == ";" for m in matches):
+        raise QueryRejected("Only one SQL statement is allowed")
+    tokens = [(m.lastgroup, m.group()) for m in matches]
+    return sql[matches[0].start():matches[-1].end()], tokens
+
+
+def has_top_level_limit(tokens):
+    depth = 0
+    for kind, text in tokens:
+        if text == "(":
+            depth += 1
+        elif text == ")":
+            depth -= 1
+        elif depth == 0 and kind == "word" and text.upper() == "LIMIT":
+            return True
+    return False
+
+
+def ends_with_values(tokens):
+    """True when the last top-level SELECT/VALUES core is a VALUES list, which takes no LIMIT."""
+    depth = 0
+    last = None
+    for kind, text in tokens:
+        if text == "(":
+            depth += 1
+        elif text == ")":
+            depth -= 1
+        elif depth == 0 and kind == "word" and text.upper() in ("SELECT", "VALUES"):
+            last = text.upper()
+    return last == "VALUES"
+
+
+ALIAS_STOP_WORDS = {
+    "WHERE", "JOIN", "ON", "USING", "GROUP", "ORDER", "LIMIT", "LEFT", "RIGHT", "INNER", "OUTER",
+    "CROSS", "NATURAL", "FULL", "UNION", "EXCEPT", "INTERSECT", "HAVING", "WINDOW", "INDEXED", "NOT"
+}
+
+
+def table_aliases(tokens):
+    """Map alias (and bare name) -> table for FROM/JOIN items."""
+    aliases = {}
+    words = [(kind, text.strip('"`[]')) for kind, text in tokens]
+    i = 0
+    while i < len(words):
+        kind, text = words[i]
+        i += 1
+        if kind != "word" or text.upper() not in ("FROM", "JOIN"):
+            continue
+        # FROM a [AS] x, b [AS] y ... / JOIN c [AS] z
+        while i < len(words) and words[i][0] in ("word", "ident"):
+            table = alias = words[i][1]
+            i += 1
+            if i < len(words) and words[i][1].upper() == "AS":
+                i += 1
+            if i < len(words) and words[i][0] in ("word", "ident") and words[i][1].upper() not in ALIAS_STOP_WORDS:
+                alias = words[i][1]
+                i += 1
+            aliases[alias] = table
+            aliases.setdefault(table, table)
+            if i < len(words) and words[i][1] == ",":
+                i += 1
+            else:
+                break
+    return aliases
+
+# ========== GUARD ==========
+
+def _table_rows(conn, table, cache):
+    if table not in cache:
+        try:
+            # MAX(rowid) is an O(log n) upper bound for rowid tables
+            cache[table] = conn.execute(f'SELECT MAX(rowid) FROM "{table}"').fetchone()[0] or 0
+        except sqlite3.Error:
+            try:
+                cache[table] = conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+            except sqlite3.Error:
+                cache[table] = 0
+    return cache[table]
+
+
+def _estimate(plan, conn, aliases, rows_cache):
+    """Walk an EXPLAIN QUERY PLAN tree; return (estimated rows, warnings, cartesian levels)."""
+    children = {}
+    for node_id, parent, _, detail in plan:
+        children.setdefault(parent, []).append((node_id, detail))
+    materialized = {}
+    warnings = []
+    cartesian = []
+
+    def loop_factor(detail):
+        words = detail.split()
+        name = words[1] if len(words) > 1 else ""
+        if detail.startswith("SCAN CONSTANT ROW"):
+            return 1, None
+        table = aliases.get(name, name)
+        if name in materialized or table in materialized:
+            rows = materialized.get(name, materialized.get(table))
+            return (rows, table) if detail.startswith("SCAN") else (min(rows, INDEX_EQ_ROWS), None)
+        rows = _table_rows(conn, table, rows_cache)
+        if detail.startswith("SCAN"):
+            return rows, table
+        if "=?" in detail and ("PRIMARY KEY" in detail or "rowid=?" in detail):
+            return 1, None
+        if ">" in detail or "<" in detail:
+            return max(1, rows // 4), None
+        return min(rows, INDEX_EQ_ROWS), None
+
+    def walk(node):
+        product = 1
+        level_scans = []
+        compound = 0
+        for child_id, detail in children.get(node, []):
+            if detail.startswith(("MATERIALIZE", "CO-ROUTINE")):
+                materialized[detail.split()[1]] = max(1, walk(child_id))
+            elif detail.startswith(("LEFT-MOST SUBQUERY", "UNION", "EXCEPT", "INTERSECT")):
+                compound += walk(child_id)
+            elif detail.startswith("COMPOUND QUERY"):
+                compound += walk(child_id)
+            elif detail.startswith(("SCAN", "SEARCH")):
+                factor, scanned = loop_factor(detail)
+                product *= max(1, factor)
+                if scanned:
+                    level_scans.append((scanned, factor))
+                    if factor >= LARGE_TABLE_ROWS:
+                        warnings.append(f"Full scan of large table {scanned} (~{factor:,} rows)")
+                walk(child_id)
+            elif detail.startswith(SUBQUERY_PREFIXES):
+                walk(child_id)
+        if len(level_scans) > 1:
+            cartesian.append(level_scans)
+        if compound:
+            return compound + (product if level_scans else 0)
+        return product
+
+    return walk(0), warnings, cartesian
+
+
+def guard_query(conn, sql, default_limit=DEFAULT_LIMIT, max_rows=MAX_ESTIMATED_ROWS):
+    """Check a generated statement before it runs.
+
+    Rejects anything that is not a single read-only SELECT/WITH statement or
+    whose plan nests full scans past ``max_rows``. Returns the SQL to run
+    (with a LIMIT added when missing), the query plan and a row estimate.
+    """
+    statement, tokens = split_statement(sql)
+    first = tokens[0][1].upper()
+    if first not in ("SELECT", "WITH", "VALUES"):
+        raise QueryRejected(f"Only read queries are allowed (got {first})", {"sql": sql})
+
+    def authorizer(action, arg1, arg2, db_name, trigger):
+        return sqlite3.SQLITE_OK if action in READ_ACTIONS else sqlite3.SQLITE_DENY
+
+    conn.set_authorizer(authorizer)
+    try:
+        plan = conn.execute(f"EXPLAIN QUERY PLAN {statement}").fetchall()
+    except sqlite3.DatabaseError as e:
+        if "not authorized" in str(e):
+            raise QueryRejected("Statement performs a non-read operation", {"sql": sql})
+        raise
+    finally:
+        conn.set_authorizer(None)
+
+    plan = [tuple(row) for row in plan]
+    rows_cache = {}
+    estimate, warnings, cartesian = _estimate(plan, conn, table_aliases(tokens), rows_cache)
+    plan_details = [row[3] for row in plan]
+    for level in cartesian:
+        product = 1
+        for _, rows in level:
+            product *= max(1, rows)
+        tables = " x ".join(f"{t} (~{r:,})" for t, r in level)
+        if product > max_rows:
+            raise QueryRejected(
+                f"Cartesian product of full scans is too expensive: {tables}",
+                {"sql": sql, "plan": plan_details, "estimated_rows": product}
+            )
+        warnings.append(f"Nested full scans: {tables}")
+
+    limited = statement
+    limit_added = False
+    if default_limit and not has_top_level_limit(tokens):
+        if ends_with_values(tokens):
+            # "VALUES (1), (2) LIMIT n" is a syntax error; a subquery keeps the column1.. names
+            limited = f"SELECT * FROM ({statement}) LIMIT {int(default_limit)}"
+        else:
+            limited = f"{statement} LIMIT {int(default_limit)}"
+        limit_added = True
+
+    return {
+        "sql": limited,
+        "limit_added": limit_added,
+        "plan": plan_details,
+        "estimated_rows_scanned": estimate,
+        "estimated_rows": min(estimate, default_limit) if limit_added else estimate,
+        "warnings": warnings
+    }
@@ -0,0 +1,98 @@
+# test_llm_translate.py - SQL extraction, prompt pruning and early stop with a fake streaming model
+import sqlite3
+import time
+
+from intent_matcher import load_schema
+from llm_translate import Translator, TranslationError, build_prompt, extract_sql
+
+OUTPUTS = {
+    "```sql\nSELECT * FROM users WHERE country = 'USA'\n```\nThis query lists": "SELECT * FROM users WHERE country = 'USA'",
+    "Here is a query to select them:\n\nSELECT name FROM users;\nIt returns names.": "SELECT name FROM users",
+    "```\nSELECT 'a;b' AS x FROM users;\n```": "SELECT 'a;b' AS x FROM users",
+    "```SQL\nWITH t AS (SELECT 1 AS n) SELECT n FROM t\n```": "WITH t AS (SELECT 1 AS n) SELECT n FROM t",
+    "SELECT COUNT(*) FROM orders\n\nThe count of orders.": "SELECT COUNT(*) FROM orders",
+    "SELECT name\nFROM users\n\nWHERE x = 1\n\nWhere x is the flag.": "SELECT name\nFROM users\n\nWHERE x = 1",
+    "select name from users\n\nwhere x = 1": "select name from users\n\nwhere x = 1",
+}
+
+
+def fake_generate(text, delay=0.002):
+    """Stand-in for ollama.generate that streams ``text`` a few characters at a time."""
+    served = {"chunks": 0}
+
+    def generate(model, prompt, stream=False, options=None, keep_alive=None):
+        served["prompt"] = prompt
+        if not stream:
+            return {"response": "", "done": True}
+
+        def chunks():
+            for i in range(0, len(text), 4):
+                time.sleep(delay)
+                served["chunks"] += 1
+                yield {"response": text[i:i + 4], "done": i + 4 >= len(text)}
+        return chunks()
+    return generate, served
+
+
+def sample_schema():
+    conn = sqlite3.connect(":memory:")
+    conn.executescript("""
+        CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT, email TEXT, country TEXT);
+        CREATE TABLE orders (id INTEGER PRIMARY KEY, user_id INTEGER, product TEXT, amount REAL);
+        CREATE TABLE audit_log (id INTEGER PRIMARY KEY, action TEXT, created_at DATETIME);
+        CREATE TABLE warehouses (id INTEGER PRIMARY KEY, city TEXT, capacity INTEGER);
+        INSERT INTO users VALUES (1, 'John', 'j@x.com', 'USA'), (2, 'Jane', 'jane@x.com', 'UK');
+        INSERT INTO orders VALUES (1, 1, 'Laptop', 999.0);
+    """)
+    return load_schema(conn)
+
+
+def test_extract_sql():
+    print("🧪 SQL extraction from model output")
+    for output, expected in OUTPUTS.items():
+        assert extract_sql(output, final=True)[0] == expected, output
+    # Still streaming: an open string literal or fence is not a complete statement
+    assert extract_sql("```sql\nSELECT * FROM users WHERE name = 'a;")[1] is False
+    assert extract_sql("no query here", final=True)[0] is None
+    # A blank line only ends the statement once the next word shows it is prose
+    assert extract_sql("SELECT name\nFROM users\n\nWHERE x=1") == ("SELECT name\nFROM users\n\nWHERE x=1", False)
+    assert extract_sql("SELECT name\nFROM users\n\nWHE")[1] is False
+    print(f"  ✅ {len(OUTPUTS)} output shapes")
+
+
+def test_pruned_prompt():
+    print("🧪 Schema-pruned prompts")
+    schema = sample_schema()
+    prompt, tables = build_prompt(schema, "total order amount for customers in the USA")
+    assert tables[0] in ("orders", "users") and set(tables) == {"orders", "users"}, tables
+    assert "audit_log" not in prompt and "warehouses" not in prompt
+    assert "orders.user_id references users.id" in prompt and "'USA'" in prompt
+    full, all_tables = build_prompt(schema, "something unrelated")
+    assert len(all_tables) == 4
+    print(f"  ✅ {len(prompt)} chars vs {len(full)} with every table")
+
+
+def test_early_stop():
+    print("🧪 Streaming early stop")
+    text = "```sql\nSELECT name FROM users WHERE country = 'UK';\n```\n" + "Explanation of the query. " * 40
+    generate, served = fake_generate(text)
+    translator = Translator(generate=generate)
+    translator.warm_up()
+    sql, timings = translator.translate("names of users in the UK", sample_schema())
+    assert sql == "SELECT name FROM users WHERE country = 'UK'"
+    assert timings["early_stop"] and served["chunks"] < len(text) // 4 // 5
+    assert timings["ttft_ms"] <= timings["total_ms"]
+    try:
+        Translator(generate=fake_generate("I cannot answer that.")[0]).translate("hi", sample_schema())
+    except TranslationError:
+        pass
+    else:
+        raise AssertionError("accepted output without SQL")
+    print(f"  ✅ stopped after {served['chunks']} chunks, ttft {timings['ttft_ms']} ms, total {timings['total_ms']} ms")
+
+
+if __name__ == "__main__":
+    test_extract_sql()
+    test_pruned_prompt()
+    test_early_stop()
+    print("\n✅ All LLM translation tests passed")
@@ -0,0 +1,107 @@
+# test_predicates.py - Compiled filters must keep the same rows in Python and in SQLite
+import random
+import sqlite3
+import time
+
+import predicates
+from predicates import PredicateError, compile_predicate
+
+random.seed(11)
+
+ROWS = [
+    {"id": i, "name": random.choice(["John Doe", "Jane Smith", "Bob O'Neil", "alice", None]),
+     "age": random.choice([None, *range(10, 80)]), "country": random.choice(["USA", "UK", "Canada", None]),
+     "amount": round(random.uniform(-50, 1500), 2), "active": random.choice([0, 1])}
+    for i in range(1, 2001)
+]
+
+EXPRESSIONS = [
+    "age > 18",
+    "age >= 18 and country in ('USA', 'UK')",
+    "not age > 18",
+    "not (country = 'UK' or age < 20)",
+    "country not in ('USA', 'Canada')",
+    "age between 20 and 30 or amount < -10",
+    "age not between 20 and 30",
+    "name is null or country is not null",
+    "name like 'j%'",
+    "name not like '%o%'",
+    "name ~ '^J.*h$'",
+    "name matches 'Neil' and amount <= 100.5",
+    "name contains 'O''N'",
+    "id <> 5 and id != 6 and id < 10",
+    "active = true and \"country\" == 'USA'",
+    "country in ('UK', null)",
+    "age < '9'",
+    "id in ('5', '6') or amount between '100' and '200.5'",
+]
+
+
+def sqlite_table():
+    conn = sqlite3.connect(":memory:")
+    predicates.install(conn)
+    conn.execute("CREATE TABLE t (id INTEGER, name TEXT, age INTEGER, country TEXT, amount REAL, active INTEGER)")
+    conn.executemany("INSERT INTO t VALUES (:id, :name, :age, :country, :amount, :active)", ROWS)
+    return conn
+
+
+def test_python_matches_sql():
+    print("🧪 Python closures vs SQL pushdown")
+    conn = sqlite_table()
+    for expression in EXPRESSIONS:
+        predicate = compile_predicate(expression)
+        where, params = predicate.sql()
+        expected = [row[0] for row in conn.execute(f"SELECT id FROM t WHERE {where} ORDER BY id", params)]
+        assert [row["id"] for row in predicate.filter(ROWS)] == expected, expression
+    print(f"  ✅ {len(EXPRESSIONS)} expressions keep identical rows")
+
+
+def test_named_params():
+    print("🧪 Pushdown into a query with named params")
+    conn = sqlite_table()
+    query = "SELECT * FROM t WHERE amount > :a AND id <= :top"
+    for expression in EXPRESSIONS:
+        predicate = compile_predicate(expression)
+        where, params = predicate.sql(named=True)
+        rows = conn.execute(f"SELECT id FROM ({query}) WHERE {where} ORDER BY id", {"a": 10, "top": 1500, **params})
+        expected = [row["id"] for row in predicate.filter(ROWS) if row["amount"] > 10 and row["id"] <= 1500]
+        assert [row[0] for row in rows] == expected, expression
+    print(f"  ✅ {len(EXPRESSIONS)} expressions bound as :_where_N next to the query's own names")
+
+
+def test_typed_comparisons_on_strings():
+    print("🧪 CSV-style string values")
+    csv_rows = [{k: "" if v is None else str(v) for k, v in row.items()} for row in ROWS]
+    predicate = compile_predicate("amount > 100 and id between 1 and 500")
+    expected = [r["id"] for r in ROWS if r["amount"] > 100 and 1 <= r["id"] <= 500]
+    assert [int(r["id"]) for r in predicate.filter(csv_rows)] == expected
+    # A quoted number compares as a number, as SQLite's column affinity does
+    assert compile_predicate("age < '9'").filter([{"age": 10}, {"age": 8}, {"age": "7"}]) == [{"age": 8}, {"age": "7"}]
+    legacy = predicates.from_condition("amount", ">", 100)
+    assert len(legacy.filter(csv_rows)) == sum(1 for r in ROWS if r["amount"] > 100)
+    print(f"  ✅ numeric literals compare numerically ({len(expected)} rows)")
+
+
+def test_cache_and_errors():
+    print("🧪 Predicate cache and parse errors")
+    first = compile_predicate("age > 40 and country = 'UK'")
+    assert compile_predicate("  age > 40 and country = 'UK'") is first
+    for bad in ["age >", "(age > 1", "age ~ '('", "age in 1", "", "and = 1"]:
+        try:
+            compile_predicate(bad)
+        except PredicateError:
+            continue
+        raise AssertionError(f"accepted {bad!r}")
+    start = time.perf_counter()
+    for _ in range(50):
+        first.filter(ROWS)
+    rate = 50 * len(ROWS) / (time.perf_counter() - start)
+    print(f"  ✅ cache {predicates.PREDICATE_CACHE.stats()['hit_rate']:.0%} hit rate, {rate:,.0f} rows/sec filtered")
+
+
+if __name__ == "__main__":
+    test_python_matches_sql()
+    test_named_params()
+    test_typed_comparisons_on_strings()
+    test_cache_and_errors()
+    print("\n✅ All predicate tests passed")
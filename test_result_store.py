@@ -0,0 +1,48 @@
+# test_result_store.py - Spilled result handles must page without reading the whole result
+import pickle
+import tempfile
+
+import result_store
+from result_store import ResultStore
+
+ROWS = [{"id": i, "name": f"User {i}", "amount": i * 1.5} for i in range(12_345)]
+
+
+def test_spilled_pages_match():
+    print("🧪 Paging a spilled result")
+    store = ResultStore(max_memory_bytes=1, spill_dir=tempfile.mkdtemp())
+    handle = store.put(ROWS)
+    assert store.describe(handle)["location"] == "disk"
+    assert store.get(handle) == ROWS
+    chunk = result_store.SPILL_CHUNK_ROWS
+    for offset, limit in [(0, 100), (chunk - 1, 2), (chunk, chunk), (12_300, 100), (20_000, 10), (0, 20_000)]:
+        assert store.page(handle, offset, limit) == ROWS[offset:offset + limit], (offset, limit)
+    empty = store.put([])
+    assert store.get(empty) == [] and store.page(empty, 0, 10) == []
+    store.close()
+    print(f"  ✅ pages identical to slicing the rows ({chunk} rows per chunk)")
+
+
+def test_page_reads_only_its_chunks():
+    print("🧪 A page unpickles only the chunks it covers")
+    store = ResultStore(max_memory_bytes=1, spill_dir=tempfile.mkdtemp())
+    handle = store.put(ROWS)
+    loads = []
+    original = pickle.load
+    result_store.pickle.load = lambda f: loads.append(1) or original(f)
+    try:
+        store.page(handle, 5_000, 100)
+        assert len(loads) == 1, loads
+        del loads[:]
+        store.page(handle, result_store.SPILL_CHUNK_ROWS - 50, 100)
+        assert len(loads) == 2, loads
+    finally:
+        result_store.pickle.load = original
+    store.close()
+    print("  ✅ one chunk for an aligned page, two across a boundary")
+
+
+if __name__ == "__main__":
+    test_spilled_pages_match()
+    test_page_reads_only_its_chunks()
+    print("\n✅ All result store tests passed")
@@ -0,0 +1,46 @@
+# test_similarity_cache.py - Paraphrases may reuse SQL; questions with a different meaning must not
+from similarity_cache import SimilarityIndex
+
+ALIASES = {"american": "usa", "united states": "usa"}
+
+
+def index_with(pairs):
+    index = SimilarityIndex(aliases=ALIASES)
+    for question, sql in pairs:
+        index.add(question, sql, schema_version=1)
+    return index
+
+
+def test_opposites_do_not_match():
+    print("🧪 Opposite words never share SQL")
+    index = index_with([
+        ("users sorted descending by signup", "SELECT * FROM users ORDER BY signup_date DESC"),
+        ("maximum order amount per user", "SELECT user_id, MAX(amount) FROM orders GROUP BY user_id"),
+        ("max amount of orders", "SELECT MAX(amount) FROM orders"),
+    ])
+    for question in ["users sorted ascending by signup", "minimum order amount per user", "min amount of orders"]:
+        assert index.lookup(question, 1) is None, question
+    print("  ✅ asc/desc and min/max rejected")
+
+
+def test_paraphrases_and_typos_match():
+    print("🧪 Paraphrases, aliases and typos reuse SQL")
+    sql = "SELECT * FROM users WHERE country = 'USA'"
+    index = index_with([("show me all users from the USA", sql)])
+    for question in ["list users from the united states", "users from usa please"]:
+        match = index.lookup(question, 1)
+        assert match and match["sql"] == sql, question
+    assert index.lookup("show me all users from the USA", 2) is None
+    monthly = "SELECT strftime('%Y-%m', order_date), SUM(amount) FROM orders GROUP BY 1"
+    index.add("total order amount for customers in the USA grouped by month", monthly, schema_version=1)
+    for question in ["total order amount for custmers in the USA grouped by month",
+                     "total order amount for cutsomers in the USA grouped by month"]:
+        match = index.lookup(question, 1)
+        assert match and match["sql"] == monthly, question
+    print("  ✅ filler words, aliases and typos still hit")
+
+
+if __name__ == "__main__":
+    test_opposites_do_not_match()
+    test_paraphrases_and_typos_match()
+    print("\n✅ All similarity cache tests passed")
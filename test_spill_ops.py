@@ -0,0 +1,101 @@
+# test_spill_ops.py - Spilled sort/join/group-by must match the in-memory results
+import random
+import tracemalloc
+
+from spill_ops import group_aggregate, join_datasets, sort_rows
+
+TINY_BUDGET = 4 * 1024   # a few dozen rows, forces spilling
+random.seed(7)
+
+ORDERS = [
+    {"id": i, "user_id": random.randint(1, 300), "product": random.choice(["Laptop", "Mouse", "Monitor", None]),
+     "amount": round(random.uniform(5, 1500), 2)}
+    for i in range(1, 5001)
+]
+USERS = [{"id": i, "name": f"User {i}", "country": random.choice(["USA", "UK", "Canada"])} for i in range(1, 401)]
+SCORES = [{"id": random.randint(1, 500), "score": random.random()} for _ in range(800)]
+
+
+def test_sort_spills_and_matches():
+    print("🧪 External merge sort")
+    key = lambda row: row.get("amount", 0)
+    for reverse in (False, True):
+        expected, memory = sort_rows(ORDERS, key, reverse, memory_bytes=TINY_BUDGET)
+        spilled, stats = sort_rows(iter(ORDERS), key, reverse, memory_bytes=TINY_BUDGET)
+        # A list is already in memory: sorted() beats copying it through spill files
+        assert memory["strategy"] == "in_memory"
+        assert stats["strategy"] == "external_merge_sort" and stats["runs"] > 1
+        assert list(spilled) == expected == sorted(ORDERS, key=key, reverse=reverse)
+    # Ties keep input order, as sorted() does
+    key = lambda row: row.get("user_id", 0)
+    assert list(sort_rows(iter(ORDERS), key, memory_bytes=TINY_BUDGET)[0]) == sorted(ORDERS, key=key)
+    # A stream that fits the budget is sorted without spilling
+    small, small_stats = sort_rows(iter(ORDERS[:10]), key, memory_bytes=TINY_BUDGET)
+    assert small_stats["strategy"] == "in_memory" and list(small) == sorted(ORDERS[:10], key=key)
+    print(f"  ✅ {stats['runs']} runs, {stats['spilled_bytes']:,} bytes spilled, same order as sorted()")
+
+
+def test_sort_stream_caps_memory():
+    print("🧪 Spilled sort keeps the peak near the budget")
+    budget = 256 * 1024
+    rows = lambda: ({"id": i, "amount": (i * 7919) % 100_003, "note": "x" * 40} for i in range(100_000))
+    key = lambda row: row["amount"]
+    tracemalloc.start()
+    stream, stats = sort_rows(rows(), key, memory_bytes=budget)
+    checksum = sum(row["id"] for row in stream)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert checksum == sum(range(100_000)) and stats["runs"] > 1
+    assert peak < 8 * budget, peak
+    print(f"  ✅ {stats['runs']} runs, peak {peak / 1e6:.1f} MB for a {stats['spilled_bytes'] / 1e6:.1f} MB sort")
+
+
+def test_join_spills_and_matches():
+    print("🧪 Grace hash join")
+    for join_type in ("inner", "left"):
+        datasets = [USERS, SCORES, [{"id": o["user_id"], "amount": o["amount"]} for o in ORDERS]]
+        expected, memory = join_datasets(datasets, "id", join_type)
+        spilled, stats = join_datasets(datasets, "id", join_type, memory_bytes=TINY_BUDGET)
+        assert memory["strategy"] == "in_memory"
+        assert stats["strategy"] == "grace_hash_join" and stats["partitions"] > 1
+        assert spilled == expected
+        print(f"  ✅ {join_type}: {len(spilled)} records over {stats['partitions']} partitions")
+
+    # Inner: one record per key (first appearance order) with each dataset's first match
+    joined, _ = join_datasets([USERS, SCORES], "id", "inner", memory_bytes=TINY_BUDGET)
+    first_score = {}
+    for row in SCORES:
+        first_score.setdefault(row["id"], row)
+    assert len(joined) == len({r["id"] for r in USERS} | set(first_score))
+    for record in joined[:50]:
+        if record["id"] in first_score:
+            assert record["dataset2_score"] == first_score[record["id"]]["score"]
+    # Left: one record per base row, NULLs when there is no match
+    joined, _ = join_datasets([USERS, SCORES], "id", "left", memory_bytes=TINY_BUDGET)
+    assert [r["name"] for r in joined] == [u["name"] for u in USERS]
+    assert all(r["dataset2_score"] is None for r in joined if r["id"] not in first_score)
+    print("  ✅ matches the integrate_data join semantics")
+
+
+def test_group_by_spills_and_matches():
+    print("🧪 Grace hash group-by")
+    for agg_type in ("sum", "avg", "count", "max", "min"):
+        expected, _ = group_aggregate(ORDERS, ["user_id", "product"], "amount", agg_type)
+        spilled, stats = group_aggregate(ORDERS, ["user_id", "product"], "amount", agg_type,
+                                         memory_bytes=TINY_BUDGET)
+        assert stats["strategy"] == "grace_hash_aggregate"
+        assert spilled == expected
+    totals = {}
+    for row in ORDERS:
+        totals[row["product"]] = totals.get(row["product"], 0) + row["amount"]
+    grouped, _ = group_aggregate(ORDERS, "product", "amount", "sum", memory_bytes=TINY_BUDGET)
+    assert {r["product"]: round(r["result"], 6) for r in grouped} == {k: round(v, 6) for k, v in totals.items()}
+    print(f"  ✅ {len(expected)} groups, identical for sum/avg/count/max/min")
+
+
+if __name__ == "__main__":
+    test_sort_spills_and_matches()
+    test_sort_stream_caps_memory()
+    test_join_spills_and_matches()
+    test_group_by_spills_and_matches()
+    print("\n✅ All spill tests passed")
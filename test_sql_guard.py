@@ -0,0 +1,50 @@
+# test_sql_guard.py - The guard must add LIMITs that SQLite accepts and still reject writes
+import sqlite3
+
+from sql_guard import QueryRejected, guard_query
+
+
+def sample_db():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT)")
+    conn.executemany("INSERT INTO users (name) VALUES (?)", [("a",), ("b",), ("c",)])
+    return conn
+
+
+def test_auto_limit_runs():
+    print("🧪 Auto-LIMIT keeps valid reads valid")
+    conn = sample_db()
+    cases = {
+        "VALUES (1), (2)": [(1,), (2,)],
+        "VALUES (1, 'x'), (2, 'y');": [(1, "x"), (2, "y")],
+        "WITH t AS (SELECT 1) VALUES (3)": [(3,)],
+        "SELECT 1 UNION ALL VALUES (2)": [(1,), (2,)],
+        "VALUES (1) UNION ALL SELECT id FROM users WHERE id = 1": [(1,), (1,)],
+        "SELECT id FROM users WHERE id IN (VALUES (1), (2)) ORDER BY id": [(1,), (2,)],
+    }
+    for sql, expected in cases.items():
+        guard = guard_query(conn, sql, default_limit=10)
+        assert guard["limit_added"], sql
+        assert conn.execute(guard["sql"]).fetchall() == expected, guard["sql"]
+    guard = guard_query(conn, "VALUES (1), (2), (3)", default_limit=2)
+    assert [d[0] for d in conn.execute(guard["sql"]).description] == ["column1"]
+    assert len(conn.execute(guard["sql"]).fetchall()) == 2
+    print(f"  ✅ {len(cases) + 1} statements run with the added LIMIT")
+
+
+def test_rejects_writes():
+    print("🧪 Writes are rejected")
+    conn = sample_db()
+    for sql in ["DELETE FROM users", "SELECT 1; DROP TABLE users", "INSERT INTO users (name) VALUES ('x')"]:
+        try:
+            guard_query(conn, sql)
+        except QueryRejected:
+            continue
+        raise AssertionError(f"accepted {sql!r}")
+    print("  ✅ non-read statements rejected")
+
+
+if __name__ == "__main__":
+    test_auto_limit_runs()
+    test_rejects_writes()
+    print("\n✅ All SQL guard tests passed")
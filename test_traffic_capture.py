@@ -0,0 +1,57 @@
+# test_traffic_capture.py - Response digests must ignore per-run values but still catch real changes
+import json
+
+from sketches import DEFAULT_QUANTILES, profile_rows
+from traffic_capture import digest
+
+
+def tool_response(payload):
+    return {"content": [{"type": "text", "text": json.dumps(payload, indent=2)}]}
+
+
+def approx_response(rows):
+    sketch = profile_rows(rows)
+    profile = sketch.result(DEFAULT_QUANTILES)
+    profile["state"] = sketch.to_state()
+    return tool_response({"operation": "approx",
+                          "result": [{"field": f, **s} for f, s in profile["fields"].items()],
+                          "execution": {"rows": profile["rows"], "sample": profile["sample"],
+                                        "state": profile["state"], "elapsed_ms": 1.0}})
+
+
+def test_unseeded_sketches():
+    print("🧪 Unseeded approx results digest the same")
+    rows = [{"x": i, "name": f"n{i % 50}"} for i in range(5000)]
+    digests = {digest(approx_response(rows)) for _ in range(3)}
+    assert len(digests) == 1, digests
+    assert digest(approx_response(rows[:-1])) not in digests
+    print("  ✅ sample and quantiles ignored, row counts and distinct counts still compared")
+
+
+def test_handle_ids_in_messages():
+    print("🧪 Handle ids inside error messages are masked")
+    def error(handle):
+        return {"content": [{"type": "text", "text": json.dumps({"error": f"Unknown or expired result handle: {handle}"})}],
+                "isError": True}
+    assert digest(error("res_0123456789abcdef")) == digest(error("res_fedcba9876543210"))
+    assert digest(error("res_0123456789abcdef")) != digest(error("res_0123"))
+    print("  ✅ res_<16 hex> ids masked")
+
+
+def test_rows_compared_verbatim():
+    print("🧪 Result rows keep columns that share a volatile key name")
+    def rows(state):
+        return tool_response({"result": [{"id": 1, "state": state, "profile": "admin"}], "row_count": 1,
+                              "execution": {"elapsed_ms": 1.0, "state": "done"}})
+    assert digest(rows("CA")) != digest(rows("NY"))
+    preview = {"result_handle": "res_0123456789abcdef", "row_count": 1, "preview": [{"state": "CA"}]}
+    assert digest(tool_response(preview)) != digest(tool_response({**preview, "preview": [{"state": "NY"}]}))
+    assert digest(tool_response({**preview, "expires_in_s": 10})) == digest(tool_response(preview))
+    print("  ✅ row values compared, envelope and execution fields still ignored")
+
+
+if __name__ == "__main__":
+    test_unseeded_sketches()
+    test_handle_ids_in_messages()
+    test_rows_compared_verbatim()
+    print("\n✅ All traffic capture tests passed")
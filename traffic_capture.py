@@ -0,0 +1,188 @@
+# traffic_capture.py - Record incoming MCP requests to NDJSON for replay_traffic.py
+import hashlib
+import json
+import re
+import threading
+import time
+import weakref
+
+# Response fields that change from run to run (timings, fresh handles, cache counters and
+# the randomized parts of approx sketches: reservoir sample, KLL quantiles and saved state)
+VOLATILE_KEYS = {
+    "elapsed_ms", "index_rebuild_ms", "rows_per_sec", "expires_in_s", "retry_after_s",
+    "result_handle", "handle", "hit_rate", "statement_cache", "started_at", "updated_at",
+    "profile", "llm", "request_id", "sample", "quantiles", "state"
+}
+# Keys holding result rows: user columns may share a volatile name ({"state": "CA"}),
+# so rows are compared verbatim
+ROW_KEYS = {"result", "preview"}
+# Randomized parts of the per-field summary rows an approx transform returns
+SKETCH_ROW_KEYS = {"quantiles"}
+# Result handle ids quoted inside messages such as "Unknown or expired result handle: res_..."
+HANDLE_ID = re.compile(r"res_[0-9a-f]{16}")
+REDACTED = "$redacted"
+
+
+def normalize(value, volatile=VOLATILE_KEYS):
+    """Response with JSON-in-text expanded, volatile fields dropped and handle ids masked, for comparing runs.
+
+    Volatile keys are dropped from the envelope and metadata (``execution``,
+    cache stats, ...) but never from result rows under ``ROW_KEYS``.
+    """
+    if isinstance(value, dict):
+        drop = SKETCH_ROW_KEYS if value.get("operation") == "approx" else ()
+        return {
+            k: _rows(v, drop) if k in ROW_KEYS else normalize(v, volatile)
+            for k, v in value.items() if k not in volatile
+        }
+    if isinstance(value, list):
+        return [normalize(v, volatile) for v in value]
+    if isinstance(value, str) and value[:1] in ("{", "["):
+        try:
+            return normalize(json.loads(value), volatile)
+        except ValueError:
+            pass
+    if isinstance(value, str):
+        return HANDLE_ID.sub("res_<handle>", value)
+    return value
+
+
+def _rows(value, drop):
+    if not drop or not isinstance(value, list):
+        return value
+    return [{k: v for k, v in row.items() if k not in drop} if isinstance(row, dict) else row for row in value]
+
+
+def digest(value, volatile=VOLATILE_KEYS):
+    text = json.dumps(normalize(value, volatile), sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+def result_handles(value):
+    """Every ``result_handle`` in a response, so a replay can map recorded handles to new ones."""
+    found = []
+    if isinstance(value, dict):
+        for k, v in value.items():
+            if k == "result_handle" and isinstance(v, str):
+                found.append(v)
+            else:
+                found.extend(result_handles(v))
+    elif isinstance(value, list):
+        for v in value:
+            found.extend(result_handles(v))
+    elif isinstance(value, str) and value[:1] in ("{", "["):
+        try:
+            found.extend(result_handles(json.loads(value)))
+        except ValueError:
+            pass
+    # The SDK echoes a dict result as structuredContent and as text; keep each handle once
+    return list(dict.fromkeys(found))
+
+
+def is_error(result):
+    """Tool errors are flagged on the result, or inside the dict our tools return."""
+    structured = result.get("structuredContent") or {}
+    return bool(result.get("isError") or structured.get("isError"))
+
+
+def redact(arguments, keys):
+    """Replace the values of ``keys`` (or every argument for "*") with a stable hash."""
+    if not keys or not isinstance(arguments, dict):
+        return arguments
+    return {
+        k: {REDACTED: hashlib.sha256(json.dumps(v, sort_keys=True, default=str).encode()).hexdigest()[:16]}
+        if "*" in keys or k in keys else v
+        for k, v in arguments.items()
+    }
+
+
+class TrafficRecorder:
+    """Appends one NDJSON line per JSON-RPC request handled by a low-level MCP ``Server``.
+
+    ``install`` wraps every registered request handler, so stdio and HTTP
+    sessions are captured alike. Each line holds the wall-clock time, the
+    offset since capture started, a per-process session label, the method
+    and params (arguments in ``redact_keys`` hashed), the server-side
+    latency and a digest of the normalized response.
+    """
+
+    def __init__(self, path, redact_keys=()):
+        self.path = path
+        self.redact_keys = set(redact_keys)
+        self.started = time.time()
+        self.records = 0
+        self._sessions = weakref.WeakKeyDictionary()
+        self._session_count = 0
+        self._lock = threading.Lock()
+        self._file = open(path, "a", buffering=1)
+
+    def install(self, server):
+        for request_type, handler in list(server.request_handlers.items()):
+            server.request_handlers[request_type] = self._wrap(server, handler)
+
+    def _wrap(self, server, handler):
+        async def recorded(request):
+            if request is None:
+                # The server calls its own tools/list handler to cache tool schemas
+                return await handler(request)
+            started = time.time()
+            start = time.perf_counter()
+            result, error = None, None
+            try:
+                result = await handler(request)
+                return result
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                raise
+            finally:
+                try:
+                    self.write(server, request, result, error, started, (time.perf_counter() - start) * 1000)
+                except Exception:
+                    pass  # capture must never break a request
+        return recorded
+
+    def _session_label(self, server):
+        try:
+            context = server.request_context
+        except LookupError:
+            return None, None
+        with self._lock:
+            label = self._sessions.get(context.session)
+            if label is None:
+                self._session_count += 1
+                label = self._sessions[context.session] = f"s{self._session_count}"
+        return label, context.request_id
+
+    def write(self, server, request, result, error, started, elapsed_ms):
+        request_json = request.model_dump(mode="json", by_alias=True, exclude_none=True)
+        params = request_json.get("params", {})
+        if request_json["method"] == "tools/call":
+            params["arguments"] = redact(params.get("arguments") or {}, self.redact_keys)
+        session, request_id = self._session_label(server)
+        record = {
+            "ts": round(started, 6),
+            "offset_s": round(started - self.started, 6),
+            "session": session,
+            "id": request_id,
+            "method": request_json["method"],
+            "params": params,
+            "elapsed_ms": round(elapsed_ms, 3)
+        }
+        if error:
+            record["exception"] = error
+        else:
+            response = getattr(result, "root", result)
+            response_json = response.model_dump(mode="json", by_alias=True, exclude_none=True)
+            record["response"] = {
+                "digest": digest(response_json),
+                "is_error": is_error(response_json),
+                "handles": result_handles(response_json)
+            }
+        line = json.dumps(record, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self.records += 1
+
+    def close(self):
+        with self._lock:
+            self._file.close()
@@ -0,0 +1,178 @@
+# warm_snapshot.py - Versioned on-disk snapshot of server caches for warm restarts
+import os
+import pickle
+import sys
+import threading
+import time
+
+SNAPSHOT_FORMAT = 1
+SNAPSHOT_INTERVAL_S = 300
+# Pickled state is only read back by the interpreter line that wrote it
+SNAPSHOT_VERSION = f"{SNAPSHOT_FORMAT}/py{sys.version_info[0]}.{sys.version_info[1]}"
+
+
+def db_fingerprint(path):
+    """Version of a SQLite file that survives restarts.
+
+    ``PRAGMA data_version`` is per connection and starts over in a new
+    process, so this reads the header's schema cookie and file change
+    counter (bumped by every committed write in rollback-journal mode) and
+    adds the WAL file's size/mtime for WAL databases.
+    """
+    try:
+        with open(path, "rb") as f:
+            header = f.read(100)
+    except OSError:
+        return None
+    wal = path + "-wal"
+    wal_stat = os.stat(wal) if os.path.exists(wal) else None
+    return (
+        int.from_bytes(header[40:44], "big"),
+        int.from_bytes(header[24:28], "big"),
+        (wal_stat.st_size, wal_stat.st_mtime_ns) if wal_stat else None
+    )
+
+
+def file_version(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class WarmSnapshot:
+    """Cache state written to one versioned file and read back lazily.
+
+    Each cache registers a section with an ``export`` callable. ``write``
+    pickles every section separately and swaps the file in atomically;
+    ``take(name)`` unpickles one section the first time it is asked for
+    (later calls return None), so a cache only pays for its own state
+    when it is first used. Validating entries is up to the caller, which
+    reports the outcome with ``record``.
+    """
+
+    def __init__(self, path, interval_s=SNAPSHOT_INTERVAL_S, version=SNAPSHOT_VERSION):
+        self.path = path
+        self.interval_s = interval_s
+        self.version = version
+        self.exports = {}
+        self._blobs = None
+        self._taken = set()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.writes = 0
+        self.last_write = None
+        self.last_write_ms = None
+        self.loaded_from = None
+        self.restored = {}
+        self.rejected = {}
+
+    def register(self, name, export):
+        self.exports[name] = export
+
+    # ========== READING ==========
+
+    def _read(self):
+        """Section blobs from disk (once); a missing, corrupt or foreign snapshot is ignored."""
+        if self._blobs is not None:
+            return self._blobs
+        self._blobs = {}
+        try:
+            with open(self.path, "rb") as f:
+                snapshot = pickle.load(f)
+        except FileNotFoundError:
+            return self._blobs
+        except Exception as e:
+            print(f"⚠️ Ignoring unreadable warm snapshot {self.path}: {e}", file=sys.stderr)
+            return self._blobs
+        if not isinstance(snapshot, dict) or snapshot.get("version") != self.version:
+            print(f"⚠️ Ignoring warm snapshot with version {snapshot.get('version') if isinstance(snapshot, dict) else '?'}",
+                  file=sys.stderr)
+            return self._blobs
+        self._blobs = snapshot["sections"]
+        self.loaded_from = snapshot["created"]
+        return self._blobs
+
+    def take(self, name):
+        """State saved for section ``name``, or None (no snapshot, or already taken)."""
+        with self._lock:
+            if name in self._taken:
+                return None
+            self._taken.add(name)
+            blob = self._read().pop(name, None)
+        if blob is None:
+            return None
+        try:
+            return pickle.loads(blob)
+        except Exception as e:
+            print(f"⚠️ Ignoring warm snapshot section {name}: {e}", file=sys.stderr)
+            return None
+
+    def record(self, name, restored, rejected=0):
+        self.restored[name] = self.restored.get(name, 0) + restored
+        self.rejected[name] = self.rejected.get(name, 0) + rejected
+
+    # ========== WRITING ==========
+
+    def write(self):
+        """Export every section and atomically replace the snapshot file."""
+        with self._write_lock:
+            start = time.perf_counter()
+            with self._lock:
+                # A section nobody has taken yet was never restored, so its saved state
+                # is still the best there is; carry it over instead of exporting a cold cache
+                sections = {name: blob for name, blob in self._read().items() if name not in self._taken}
+            for name, export in self.exports.items():
+                if name in sections:
+                    continue
+                try:
+                    sections[name] = pickle.dumps(export(), protocol=pickle.HIGHEST_PROTOCOL)
+                except Exception as e:
+                    print(f"⚠️ Warm snapshot skipped section {name}: {e}", file=sys.stderr)
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump({"version": self.version, "created": time.time(), "sections": sections}, f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+            self.writes += 1
+            self.last_write = time.time()
+            self.last_write_ms = round((time.perf_counter() - start) * 1000, 2)
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            try:
+                self.write()
+            except Exception as e:
+                print(f"⚠️ Warm snapshot write failed: {e}", file=sys.stderr)
+
+    def start(self):
+        """Write periodically from a daemon thread (when ``interval_s`` > 0)."""
+        if self.interval_s and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="warm-snapshot", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the periodic writer and write a final snapshot."""
+        self._stop.set()
+        try:
+            self.write()
+        except Exception as e:
+            print(f"⚠️ Warm snapshot write failed: {e}", file=sys.stderr)
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "version": self.version,
+            "loaded_from": self.loaded_from,
+            "writes": self.writes,
+            "last_write": self.last_write,
+            "last_write_ms": self.last_write_ms,
+            "interval_s": self.interval_s,
+            "restored": dict(self.restored),
+            "rejected": dict(self.rejected)
+        }